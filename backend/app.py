@@ -1,12 +1,23 @@
+import os
 from flask import Flask, jsonify
 from flask_cors import CORS 
 from backend.config import Config 
-from backend.database import db
+from backend.database import db, configure_database
+from backend.cache import response_cache
+from backend.auth import token_auth
+from backend.instrumentation import instrumentation
+from backend.sharding import shard_router
+from backend.write_queue import write_queue
+from backend import search
+from backend.commands import register_commands
 from .models import User 
 from backend.routes.auth_routes import auth_bp 
 from backend.routes.transactions_routes import transactions_bp 
 from backend.routes.budget_routes import budget_bp
 from backend.routes.report_routes import report_bp
+from backend.routes.dashboard_routes import dashboard_bp
+from backend.routes.category_routes import category_bp
+from backend.routes.sync_routes import sync_bp
 
 def create_app():
     app = Flask(__name__)
@@ -14,10 +25,21 @@ def create_app():
     CORS(app) 
 
     db.init_app(app)
+    search.init_app(app) # before configure_database opens the first connections
+    configure_database(app)
+    response_cache.init_app(app)
+    token_auth.init_app(app)
+    instrumentation.init_app(app)
+    shard_router.init_app(app)
+    write_queue.init_app(app)
     app.register_blueprint(auth_bp) 
     app.register_blueprint(transactions_bp) 
     app.register_blueprint(budget_bp)
     app.register_blueprint(report_bp)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(category_bp)
+    app.register_blueprint(sync_bp)
+    register_commands(app)
 
 
     @app.route('/')
@@ -27,8 +49,11 @@ def create_app():
     return app
 
 if __name__ == '__main__':
+    os.environ.setdefault('FLASK_DEBUG', '1') # debug before create_app, which checks SECRET_KEY outside debug
     app = create_app() # Create the Flask application instance
 
     with app.app_context():
-        db.create_all()
+        db.create_all() # A new development database; existing ones are upgraded with `flask migrate-*`
+        with db.engine.begin() as conn:
+            search.create_index(conn)
     app.run(debug=True)
@@ -0,0 +1,242 @@
+import asyncio
+from urllib.parse import parse_qsl
+from asgiref.wsgi import WsgiToAsgi
+from flask_cors.core import get_cors_options, get_cors_headers
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import parse_etags, quote_etag
+from backend.app import create_app
+from backend.auth import token_auth
+from backend.cache import response_cache
+from backend.database import apply_sqlite_pragmas
+from backend.instrumentation import instrumentation
+from backend.models import Transaction, Budget
+from backend.sharding import shard_router, DEFAULT_SHARD
+from backend.serializers import TRANSACTION_JSON, BUDGET_JSON, page_body
+from backend.services import apply_transaction_filters, apply_keyset, encode_cursor, period_date_range, parse_limit, \
+    missing_timestamps_statement, MISSING_TIMESTAMPS
+from backend import rollups
+from backend.routes.transactions_routes import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, format_summary
+from backend.routes.report_routes import format_spending_patterns, format_category_distribution
+from backend.routes.dashboard_routes import dashboard_window, format_dashboard
+
+# ASGI entry point, served next to the WSGI app:
+#
+#     uvicorn --factory backend.asgi:create_asgi_app
+#
+# The read-heavy GET endpoints (transactions listing, summary, reports, dashboard,
+# budgets) run as coroutines on an async SQLAlchemy engine, so one process keeps
+# many slow aggregates in flight instead of parking a worker thread on each.
+# Every other request, including all writes, streaming and exports, is handed to
+# the regular Flask app through a WSGI adapter. Both paths build their SQL and
+# JSON with the same helpers and share the response cache (keys and ETags), so
+# the frontend sees identical responses whichever path served them, with the
+# same CORS headers, and /metrics counts them under the Flask endpoint names.
+# The calls that may block (token verification reloading the revocation list,
+# the shard lookup, the response cache with Redis) run in worker threads so the
+# event loop never waits on them.
+#
+# Needs the optional packages asgiref, greenlet and the async driver for the
+# database: aiosqlite (SQLite) or asyncpg (PostgreSQL).
+
+CORS_ORIGIN = "http://localhost:3000"
+
+
+class AsyncReadApp:
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.engine = create_async_engine(flask_app.config['ASYNC_DATABASE_URI'],
+                                          **flask_app.config['ASYNC_ENGINE_OPTIONS'])
+        # One engine per shard; user data is read from the requesting user's shard
+        self.engines = {DEFAULT_SHARD: self.engine}
+        for key, url in flask_app.config.get('ASYNC_SHARD_URIS', {}).items():
+            self.engines[key] = create_async_engine(url, **flask_app.config['ASYNC_ENGINE_OPTIONS'])
+        pragmas = flask_app.config.get('SQLITE_PRAGMAS') or {}
+        for engine in self.engines.values():
+            if pragmas and engine.dialect.name == 'sqlite':
+                # The WSGI app already switched the database to WAL; readers only tune their connection
+                apply_sqlite_pragmas(engine.sync_engine, {k: v for k, v in pragmas.items() if k != 'journal_mode'})
+            instrumentation.instrument_engine(engine.sync_engine)
+        self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+        # The options of the routes' @cross_origin(origins=CORS_ORIGIN)
+        self.cors_options = get_cors_options(flask_app, {'origins': CORS_ORIGIN})
+
+        # path -> (handler, Flask endpoint, whether it is cached, query params that send the request to Flask)
+        self.routes = {
+            '/api/transactions/': (self.list_transactions, 'transactions.get_transactions', False, ('stream',)),
+            '/api/transactions/summary': (self.summary, 'transactions.get_dashboard_summary', True, ()),
+            '/api/reports/spending-patterns': (self.spending_patterns, 'reports.get_spending_patterns', True, ()),
+            '/api/reports/category-distribution': (self.category_distribution, 'reports.get_category_distribution', True, ()),
+            '/api/dashboard': (self.dashboard, 'dashboard.get_dashboard', True, ()),
+            '/api/budgets/': (self.list_budgets, 'budget.get_budgets', False, ('progress',)),
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        route = self.routes.get(scope['path']) if scope['type'] == 'http' and scope['method'] == 'GET' else None
+        args = MultiDict(parse_qsl(scope['query_string'].decode(), keep_blank_values=True)) if route else None
+        if route is None or any(name in args for name in route[3]):
+            return await self.wsgi(scope, receive, send)
+
+        handler, endpoint, cached, _ = route
+        metrics = instrumentation.start_async_request(endpoint)
+        headers = Headers([(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']])
+        status = 500
+        body = None
+        try:
+            status, body, extra_headers = await self.respond(handler, endpoint if cached else None, args, headers)
+        finally:
+            instrumentation.finish_async_request(metrics, 'GET', status, len(body or b''))
+
+        response_headers = [(name.encode(), value.encode()) for name, value in extra_headers.items()]
+        if body is not None:
+            response_headers.append((b'content-type', b'application/json'))
+        response_headers.append((b'content-length', str(len(body or b'')).encode()))
+        for name, value in get_cors_headers(self.cors_options, headers, 'GET').items():
+            response_headers.append((name.lower().encode('latin-1'), value.encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': body or b''})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in self.engines.values():
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def _prepare(self, token, endpoint, args, if_none_match):
+        """
+        The blocking part of a request, run in a worker thread: verifies the token
+        (which may reload the revocation list), looks up the user's shard and, for a
+        cached endpoint, its cached response. Returns (user_id, shard, cache key,
+        cached body, whether the client's ETag is current).
+        """
+        with self.flask_app.app_context():
+            user_id = token_auth.verify_token(token)
+            if not user_id:
+                return None, None, None, None, False
+            shard = shard_router.lookup(user_id)[0]
+        if endpoint is None or response_cache.backend is None:
+            return user_id, shard, None, None, False
+        key = response_cache.make_key(user_id, endpoint, args)
+        if key in parse_etags(if_none_match):
+            return user_id, shard, key, None, True
+        return user_id, shard, key, response_cache.backend.get(key), False
+
+    async def respond(self, handler, endpoint, args, headers):
+        """Auth, then the response cache (if `endpoint` is given), then the handler. Returns (status, body, headers)."""
+        authorization = headers.get('authorization', '')
+        token = authorization[len('Bearer '):].strip() if authorization.startswith('Bearer ') else None
+        user_id, shard, key, body, not_modified = await asyncio.to_thread(
+            self._prepare, token, endpoint, args, headers.get('if-none-match')
+        )
+        if not user_id:
+            return 401, self.dumps({"message": "Authentication required"}), {}
+
+        cache_headers = {'etag': quote_etag(key), 'cache-control': 'private, no-cache'} if key is not None else {}
+        if not_modified:
+            return 304, None, cache_headers
+        if body is not None:
+            return 200, body, cache_headers
+
+        async with self.sessions(bind=self.engines[shard]) as session:
+            status, data = await handler(session, user_id, args)
+        body = data if isinstance(data, bytes) else self.dumps(data)
+        if status != 200:
+            return status, body, {}
+        if key is not None:
+            await asyncio.to_thread(response_cache.backend.set, key, body)
+        return status, body, cache_headers
+
+    def dumps(self, data):
+        # Flask's own JSON provider, so bodies match jsonify byte for byte
+        return self.flask_app.json.response(data).get_data()
+
+    # --- Handlers: (session, user_id, args) -> (status, payload or encoded JSON bytes) ---
+
+    async def list_transactions(self, session, user_id, args):
+        """Full list or keyset page, as GET /api/transactions/ (streaming stays on the WSGI app)."""
+        query = select(*TRANSACTION_JSON.columns).where(Transaction.user_id == user_id)
+        try:
+            query = apply_transaction_filters(query, args)
+        except ValueError as e:
+            return 400, {"message": f"Invalid filter: {str(e)}"}
+        try:
+            limit = parse_limit(args.get('limit'))
+            if args.get('cursor'):
+                query = apply_keyset(query, args['cursor'])
+        except ValueError as e:
+            return 400, {"message": str(e)}
+        query = query.order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+
+        if limit is None and 'cursor' not in args:
+            rows = (await session.execute(query)).all()
+            return 200, TRANSACTION_JSON.encode(rows) + b'\n'
+
+        if (await session.execute(missing_timestamps_statement(user_id))).scalar():
+            return 500, {"message": MISSING_TIMESTAMPS}
+        limit = min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+        rows = (await session.execute(query.limit(limit + 1))).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+        return 200, page_body('transactions', TRANSACTION_JSON.encode(rows), next_cursor) + b'\n'
+
+    async def summary(self, session, user_id, args):
+        try:
+            rows = (await session.execute(rollups.totals_statement(user_id))).all()
+            return 200, format_summary({type_: total for type_, total in rows})
+        except Exception as e:
+            return 500, {"message": f"Error calculating summary: {str(e)}"}
+
+    async def _expense_window_sums(self, session, user_id, args, by):
+        start_date, end_date = period_date_range(args.get('period', '6months'))
+        statements = rollups.window_sum_statements(user_id, 'expense', start_date, end_date, by)
+        return rollups.merge_window_sums([(await session.execute(stmt)).all() for stmt in statements], by)
+
+    async def spending_patterns(self, session, user_id, args):
+        try:
+            sums = await self._expense_window_sums(session, user_id, args, 'month')
+            return 200, format_spending_patterns(sums)
+        except Exception as e:
+            return 500, {"message": f"Error generating spending patterns: {str(e)}"}
+
+    async def category_distribution(self, session, user_id, args):
+        try:
+            sums = await self._expense_window_sums(session, user_id, args, 'category')
+            return 200, format_category_distribution(sums)
+        except Exception as e:
+            return 500, {"message": f"Error generating category distribution: {str(e)}"}
+
+    async def dashboard(self, session, user_id, args):
+        try:
+            start_date, end_date = dashboard_window(args)
+        except ValueError as e:
+            return 400, {"message": str(e)}
+        try:
+            rows = (await session.execute(rollups.dashboard_statement(user_id, start_date, end_date))).all()
+            return 200, format_dashboard(rows, start_date, end_date)
+        except Exception as e:
+            return 500, {"message": f"Error building dashboard: {str(e)}"}
+
+    async def list_budgets(self, session, user_id, args):
+        """GET /api/budgets/ without ?progress (progress stays on the WSGI app)."""
+        rows = (await session.execute(
+            select(*BUDGET_JSON.columns).where(Budget.user_id == user_id).order_by(Budget.start_date.desc())
+        )).all()
+        return 200, BUDGET_JSON.encode(rows) + b'\n'
+
+
+def create_asgi_app(flask_app=None):
+    """ASGI application wrapping `flask_app` (by default a fresh `create_app()`)."""
+    return AsyncReadApp(flask_app or create_app())
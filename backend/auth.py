@@ -0,0 +1,147 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import request
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+# Token authentication shared by every blueprint.
+#
+# Tokens are signed with the app's SECRET_KEY, which must be set outside debug and
+# testing (the built-in development key would let anyone forge tokens), and carry the user id and a random
+# token id (jti), so verifying one needs no database lookup. Tokens that already
+# verified are kept in an LRU cache to skip the HMAC check on repeat requests.
+# Logout revokes a token: its jti is stored in RevokedToken and mirrored in an
+# in-process set that each worker refreshes from the database every few seconds.
+#
+# Password hashing is deliberately slow, so it runs in a small bounded thread
+# pool. At most AUTH_HASH_MAX_PENDING hashes may be queued or running; beyond
+# that new logins fail immediately with AuthBusyError (a 503) instead of waiting
+# for a slot and tying up API workers.
+
+
+class AuthBusyError(Exception):
+    """Raised when the password hashing pool is saturated."""
+
+
+class TokenAuth:
+
+    def __init__(self, app=None):
+        self.serializer = None
+        self.max_age = 7 * 24 * 3600
+        self.cache_size = 10000
+        self.verified = OrderedDict() # token -> (user_id, jti, expires_at)
+        self.revoked = set()
+        self.revoked_loaded_at = 0.0
+        self.revocation_refresh = 30
+        self.lock = threading.Lock()
+        self.pool = None
+        self.slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        from backend.config import DEFAULT_SECRET_KEY
+        if app.config['SECRET_KEY'] == DEFAULT_SECRET_KEY and not (app.debug or app.testing):
+            raise RuntimeError("SECRET_KEY is not set; refusing to sign tokens with the development default")
+        self.serializer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='auth-token')
+        self.max_age = app.config.get('AUTH_TOKEN_MAX_AGE', self.max_age)
+        self.cache_size = app.config.get('AUTH_TOKEN_CACHE_SIZE', self.cache_size)
+        self.revocation_refresh = app.config.get('AUTH_REVOCATION_REFRESH', self.revocation_refresh)
+        workers = app.config.get('AUTH_HASH_WORKERS', 2)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self.slots = threading.BoundedSemaphore(app.config.get('AUTH_HASH_MAX_PENDING', 16))
+
+    # --- Tokens ---
+
+    def issue_token(self, user_id):
+        return self.serializer.dumps({'uid': user_id, 'jti': secrets.token_hex(8)})
+
+    def _refresh_revoked(self):
+        from backend.models import RevokedToken
+
+        if time.monotonic() - self.revoked_loaded_at < self.revocation_refresh:
+            return
+        now = datetime.utcnow()
+        jtis = {jti for (jti,) in RevokedToken.query.filter(RevokedToken.expires_at > now)
+                .with_entities(RevokedToken.jti)}
+        with self.lock:
+            self.revoked = jtis
+            self.revoked_loaded_at = time.monotonic()
+
+    def verify_token(self, token):
+        """Returns the user id for a valid, unexpired, unrevoked token, else None."""
+        if not token or self.serializer is None:
+            return None
+        self._refresh_revoked()
+        now = time.time()
+
+        with self.lock:
+            entry = self.verified.get(token)
+            if entry is not None:
+                user_id, jti, expires_at = entry
+                if expires_at > now and jti not in self.revoked:
+                    self.verified.move_to_end(token)
+                    return user_id
+                del self.verified[token]
+                return None
+
+        try:
+            payload, issued_at = self.serializer.loads(token, max_age=self.max_age, return_timestamp=True)
+            user_id, jti = int(payload['uid']), payload['jti']
+        except (BadSignature, SignatureExpired, KeyError, TypeError, ValueError):
+            return None
+        if jti in self.revoked:
+            return None
+
+        with self.lock:
+            self.verified[token] = (user_id, jti, issued_at.timestamp() + self.max_age)
+            while len(self.verified) > self.cache_size:
+                self.verified.popitem(last=False)
+        return user_id
+
+    def revoke_token(self, token):
+        """Revokes a token for every worker. Does not commit; the caller does."""
+        from backend.database import db
+        from backend.models import RevokedToken
+
+        try:
+            payload, issued_at = self.serializer.loads(token, return_timestamp=True)
+        except BadSignature:
+            return False
+        expires_at = datetime.utcfromtimestamp(issued_at.timestamp() + self.max_age)
+        db.session.merge(RevokedToken(jti=payload['jti'], expires_at=expires_at))
+        with self.lock:
+            self.revoked.add(payload['jti'])
+            self.verified.pop(token, None)
+        return True
+
+    # --- Password hashing ---
+
+    def run_hash(self, fn, *args):
+        """Runs a password hash function in the bounded pool and waits for its result."""
+        if self.pool is None:
+            return fn(*args)
+        if not self.slots.acquire(blocking=False):
+            raise AuthBusyError("Too many concurrent logins, please retry")
+        try:
+            return self.pool.submit(fn, *args).result()
+        finally:
+            self.slots.release()
+
+
+token_auth = TokenAuth()
+
+
+def request_token():
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        return header[len('Bearer '):].strip()
+    return None
+
+
+def get_current_user_id():
+    """The authenticated user's id from the request's bearer token, or None."""
+    return token_auth.verify_token(request_token())
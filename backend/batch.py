@@ -0,0 +1,228 @@
+from datetime import date
+from sqlalchemy import delete, extract, func, select, update
+from backend.database import db
+from backend.models import Transaction, Budget
+from backend.services import parse_date, transaction_filter_conditions
+from backend.money import to_cents
+from backend import rollups, timeseries, sync
+
+# Set-based bulk update/delete behind /api/transactions/batch and /api/budgets/batch.
+#
+# A batch selects rows either by id ({"ids": [...]}) or by filter ({"filter":
+# {...}}) and applies one operation to all of them with a single UPDATE or DELETE
+# statement. Derived data is adjusted without loading the rows: one grouped query
+# over the selection gives its rollup buckets (and, when amounts, dates or types
+# change, its daily flows), from which the buckets before and after the change
+# follow directly. Every statement runs in the caller's transaction, so a batch is
+# all-or-nothing: unknown ids, invalid values or rows changing underneath raise
+# before anything is committed.
+
+OPERATIONS = ('update', 'delete')
+MAX_IDS = 10000
+
+
+class BatchConflictError(Exception):
+    """Raised when the selected rows changed while the batch ran; retrying is safe."""
+
+
+class MissingIdsError(LookupError):
+
+    def __init__(self, ids):
+        super().__init__(f"{len(ids)} of the requested rows were not found or not authorized")
+        self.ids = ids
+
+
+def _required(value, name):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError(f"'{name}' must be a non-empty string")
+    return value
+
+
+def parse_request(data, fields, filter_keys):
+    """
+    Validates a batch body. Returns (operation, ids or None, filter dict or None, changes),
+    with `changes` parsed into column values by `fields` (a {name: parser} dict).
+    Raises ValueError on malformed input.
+    """
+    operation = data.get('operation')
+    if operation not in OPERATIONS:
+        raise ValueError(f"'operation' must be one of: {', '.join(OPERATIONS)}")
+    if ('ids' in data) == ('filter' in data):
+        raise ValueError("Give either 'ids' or 'filter'")
+
+    ids = filters = None
+    if 'ids' in data:
+        ids = data['ids']
+        if not isinstance(ids, list) or not ids or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise ValueError("'ids' must be a non-empty list of integers")
+        ids = sorted(set(ids))
+        if len(ids) > MAX_IDS:
+            raise ValueError(f"At most {MAX_IDS} ids per batch; use a filter for more")
+    else:
+        filters = data['filter']
+        if not isinstance(filters, dict) or not any(filters.values()):
+            raise ValueError("'filter' needs at least one condition")
+        unknown = set(filters) - set(filter_keys)
+        if unknown:
+            raise ValueError(f"Unknown filter: {', '.join(sorted(unknown))}")
+        if not all(isinstance(value, str) for value in filters.values() if value):
+            raise ValueError("Filter values must be strings")
+
+    changes = {}
+    if operation == 'update':
+        values = data.get('set')
+        if not isinstance(values, dict) or not values:
+            raise ValueError("'set' must give the fields to update")
+        unknown = set(values) - set(fields)
+        if unknown:
+            raise ValueError(f"Cannot set: {', '.join(sorted(unknown))}")
+        for name, value in values.items():
+            try:
+                changes.update(fields[name](value))
+            except TypeError:
+                raise ValueError(f"Invalid value for '{name}'")
+    return operation, ids, filters, changes
+
+
+def _expect(selected, ids, id_column, conditions):
+    """Raises MissingIdsError if ids were requested and not all of them matched."""
+    if ids is not None and selected != len(ids):
+        found = set(db.session.execute(select(id_column).where(*conditions)).scalars())
+        raise MissingIdsError([i for i in ids if i not in found])
+
+
+def _execute(statement, selected):
+    affected = db.session.execute(statement, execution_options={'synchronize_session': False}).rowcount
+    if affected != selected:
+        raise BatchConflictError("The selected rows changed while the batch ran; please retry")
+    return affected
+
+
+# --- Transactions ---
+
+TRANSACTION_FILTERS = ('start_date', 'end_date', 'type', 'category', 'min_amount', 'max_amount', 'description')
+TRANSACTION_FIELDS = {
+    'description': lambda v: {'description': _required(v, 'description')},
+    'category': lambda v: {'category': _required(v, 'category')},
+    'type': lambda v: {'type': _required(v, 'type')},
+    'amount': lambda v: {'amount_cents': to_cents(v)},
+    'date': lambda v: {'date': parse_date(v)},
+}
+
+
+def transaction_conditions(user_id, ids, filters):
+    """The WHERE clause of a batch; filters are the listing filters plus `description` (substring)."""
+    conditions = [Transaction.user_id == user_id]
+    if ids is not None:
+        conditions.append(Transaction.id.in_(ids))
+    else:
+        conditions.extend(transaction_filter_conditions(filters))
+        if filters.get('description'):
+            # Case-insensitive substring match; % and _ in the text are literal
+            text = str(filters['description']).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            conditions.append(Transaction.description.ilike(f'%{text}%', escape='\\'))
+    return conditions
+
+
+def buckets_statement(conditions):
+    """The selection's rollup buckets: (year, month, type, category, cents, rows)."""
+    year, month = extract('year', Transaction.date), extract('month', Transaction.date)
+    return (select(year, month, Transaction.type, Transaction.category,
+                   func.sum(Transaction.amount_cents), func.count(Transaction.id))
+            .where(*conditions).group_by(year, month, Transaction.type, Transaction.category))
+
+
+def apply_transactions(user_id, operation, ids, conditions, changes):
+    """Runs a transaction batch on db.session without committing. Returns the affected row count."""
+    buckets = db.session.execute(buckets_statement(conditions)).all()
+    selected = sum(count for *_, count in buckets)
+    _expect(selected, ids, Transaction.id, conditions)
+    if not selected:
+        return 0
+
+    moves_flow = operation == 'delete' or {'amount_cents', 'date', 'type'} & set(changes)
+    days = db.session.execute(
+        select(Transaction.date, Transaction.type, func.sum(Transaction.amount_cents), func.count(Transaction.id))
+        .where(*conditions).group_by(Transaction.date, Transaction.type)
+    ).all() if moves_flow else []
+
+    if operation == 'delete':
+        sync.record_deletes('transaction', user_id, *conditions)
+        statement = delete(Transaction).where(*conditions)
+    else:
+        statement = update(Transaction).where(*conditions).values(**changes, change_seq=sync.seq(user_id))
+    affected = _execute(statement, selected)
+
+    # Each bucket of the selection leaves its old key and, for updates, arrives at its new one
+    new_amount = changes.get('amount_cents')
+    new_month = changes['date'].replace(day=1) if 'date' in changes else None
+    deltas = {}
+    for y, m, type_, category, total, count in buckets:
+        moves = [((date(int(y), int(m), 1), type_, category), -total, -count)]
+        if operation == 'update':
+            moves.append(((new_month or date(int(y), int(m), 1), changes.get('type', type_),
+                           changes.get('category', category)),
+                          new_amount * count if new_amount is not None else total, count))
+        for key, amount, count_delta in moves:
+            old_total, old_count = deltas.get(key, (0, 0))
+            deltas[key] = (old_total + amount, old_count + count_delta)
+    rollups.apply_deltas(user_id, deltas)
+
+    for day, type_, total, count in days:
+        timeseries.record_delta(user_id, day, type_, -total)
+        if operation == 'update':
+            timeseries.record_delta(user_id, changes.get('date', day), changes.get('type', type_),
+                                    new_amount * count if new_amount is not None else total)
+    return affected
+
+
+# --- Budgets ---
+
+BUDGET_FILTERS = ('category', 'start_date', 'end_date')
+BUDGET_FIELDS = {
+    'category': lambda v: {'category': _required(v, 'category')},
+    'amount': lambda v: {'amount_cents': to_cents(v)},
+    'start_date': lambda v: {'start_date': parse_date(v)},
+    'end_date': lambda v: {'end_date': parse_date(v)},
+}
+
+
+def budget_conditions(user_id, ids, filters):
+    """Filters: category, and start_date/end_date selecting budgets whose window overlaps them."""
+    conditions = [Budget.user_id == user_id]
+    if ids is not None:
+        conditions.append(Budget.id.in_(ids))
+        return conditions
+    if filters.get('category'):
+        conditions.append(Budget.category == filters['category'])
+    if filters.get('start_date'):
+        conditions.append(Budget.end_date >= parse_date(filters['start_date']))
+    if filters.get('end_date'):
+        conditions.append(Budget.start_date <= parse_date(filters['end_date']))
+    return conditions
+
+
+def apply_budgets(user_id, operation, ids, conditions, changes):
+    """Runs a budget batch on db.session without committing. Returns the affected row count."""
+    selected = db.session.execute(select(func.count(Budget.id)).where(*conditions)).scalar()
+    _expect(selected, ids, Budget.id, conditions)
+    if not selected:
+        return 0
+
+    if operation == 'update':
+        start, end = changes.get('start_date'), changes.get('end_date')
+        if start and end:
+            invalid = start > end
+        elif start or end:
+            # Only one end of the window moves; check it against the rows' other end
+            check = Budget.end_date < start if start else Budget.start_date > end
+            invalid = db.session.execute(select(func.count(Budget.id)).where(*conditions, check)).scalar() > 0
+        else:
+            invalid = False
+        if invalid:
+            raise ValueError("Start date cannot be after end date")
+        statement = update(Budget).where(*conditions).values(**changes, change_seq=sync.seq(user_id))
+    else:
+        sync.record_deletes('budget', user_id, *conditions)
+        statement = delete(Budget).where(*conditions)
+    return _execute(statement, selected)
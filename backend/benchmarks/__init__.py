@@ -0,0 +1,11 @@
+# Load tests and benchmarks for the API blueprints.
+#
+#     python -m backend.benchmarks run --transactions 100000 --output baseline.json
+#     python -m backend.benchmarks compare baseline.json candidate.json
+#
+# `run` builds the app with `create_app` on a temporary SQLite database (or an
+# existing one passed with --db), seeds synthetic users, then drives every
+# endpoint through the Flask test client, or through a live server with --url
+# and a pool of concurrent HTTP workers. Per endpoint it records throughput,
+# p50/p95/p99 latency, peak RSS and SQL statements per request, and writes them
+# to a JSON baseline that `compare` diffs against another run.
@@ -0,0 +1,133 @@
+import fnmatch
+import json
+import os
+import secrets
+import tempfile
+import time
+import click
+
+# CLI for the benchmark suite: python -m backend.benchmarks --help
+#
+# backend.config reads DATABASE_URL and the cache settings when first imported,
+# so every command sets the environment before importing the app. Runs without a
+# SECRET_KEY get a random one, as the app refuses the development default.
+
+
+def _make_app(db_path, cache):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(db_path)
+    os.environ.setdefault('SECRET_KEY', secrets.token_hex(32))
+    if not cache:
+        os.environ['RESPONSE_CACHE_BACKEND'] = 'none'
+    from backend.app import create_app
+
+    return create_app()
+
+
+def _seed(app, users, transactions, years, seed):
+    from backend.benchmarks.seed import seed as seed_data
+
+    started = time.perf_counter()
+    with app.app_context():
+        seed_data(users, transactions, years, seed,
+                  progress=lambda n: click.echo(f"  seeded {n} transactions", err=True) if n % 100000 == 0 else None)
+    return time.perf_counter() - started
+
+
+def _seeding_options(command):
+    command = click.option('--users', default=10, show_default=True, help='Synthetic users to create.')(command)
+    command = click.option('--transactions', default=100000, show_default=True,
+                           help='Transactions in total, split evenly between users (1k to 10M).')(command)
+    command = click.option('--years', default=3, show_default=True, help='Years of history to spread dates over.')(command)
+    command = click.option('--seed', 'seed_value', default=0, show_default=True, help='Random seed.')(command)
+    return command
+
+
+@click.group()
+def cli():
+    """Seed synthetic data, benchmark every endpoint and compare baselines."""
+
+
+@cli.command('seed')
+@click.option('--db', 'db_path', required=True, help='SQLite file to create or add to.')
+@_seeding_options
+def seed_command(db_path, users, transactions, years, seed_value):
+    """Seeds a database that `run --db` (or a live server) can reuse."""
+    app = _make_app(db_path, cache=False)
+    seconds = _seed(app, users, transactions, years, seed_value)
+    click.echo(f"Seeded {users} users and {transactions} transactions in {seconds:.1f}s")
+
+
+@cli.command('run')
+@click.option('--db', 'db_path', default=None, help='Use an already seeded SQLite file instead of a temporary one.')
+@_seeding_options
+@click.option('--iterations', default=50, show_default=True, help='Timed requests per endpoint.')
+@click.option('--warmup', default=3, show_default=True, help='Untimed requests per endpoint first.')
+@click.option('--endpoints', 'patterns', multiple=True, help="Only endpoints matching this glob, e.g. 'reports.*'.")
+@click.option('--url', default=None, help='Load-test a live server (e.g. http://127.0.0.1:5000) instead.')
+@click.option('--concurrency', default=8, show_default=True, help='Concurrent HTTP workers with --url.')
+@click.option('--cache/--no-cache', default=False, show_default=True, help='Keep the response cache on.')
+@click.option('--output', default=None, help='Baseline JSON to write (default: benchmarks-<commit>.json).')
+def run_command(db_path, users, transactions, years, seed_value, iterations, warmup, patterns, url, concurrency,
+                cache, output):
+    """Benchmarks the endpoints and writes a JSON baseline."""
+    from backend.benchmarks import runner
+    from backend.benchmarks.scenarios import SCENARIOS
+    from backend.benchmarks.seed import seeded_users
+    from backend.database import db
+
+    scenarios = [s for s in SCENARIOS if not patterns or any(fnmatch.fnmatch(s.name, p) for p in patterns)]
+    temporary = db_path is None
+    if temporary:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='pfm-bench-'), 'bench.db')
+    app = _make_app(db_path, cache)
+
+    seed_seconds = None
+    with app.app_context():
+        db.create_all()
+        users_in_db = seeded_users()
+    if not users_in_db:
+        seed_seconds = _seed(app, users, transactions, years, seed_value)
+        with app.app_context():
+            users_in_db = seeded_users()
+
+    def report(name, stats):
+        click.echo(f"{name:34} p50 {stats['p50_ms']:>9.2f}ms  p95 {stats['p95_ms']:>9.2f}ms  "
+                   f"p99 {stats['p99_ms']:>9.2f}ms  {stats['throughput_rps']:>8.1f} req/s  "
+                   f"queries {stats['queries_per_request'] if stats['queries_per_request'] is not None else '-':>6}  "
+                   f"errors {stats['errors']}")
+
+    if url:
+        results = runner.run_http(url, scenarios, users_in_db, iterations, warmup, concurrency, progress=report)
+    else:
+        with app.app_context():
+            engines = list(db.engines.values())
+        results = runner.run_test_client(app, scenarios, users_in_db, iterations, warmup, engines, progress=report)
+
+    output = output or f"benchmarks-{runner.git_commit() or 'local'}.json"
+    runner.write_baseline(output, results, mode='http' if url else 'test_client', url=url,
+                          concurrency=concurrency if url else 1, iterations=iterations, warmup=warmup, cache=cache,
+                          dataset={'users': len(users_in_db), 'transactions': transactions if seed_seconds else None,
+                                   'years': years, 'seed': seed_value, 'seed_seconds': seed_seconds,
+                                   'database': None if temporary else os.path.abspath(db_path)})
+    click.echo(f"Wrote {output}")
+
+
+@cli.command('compare')
+@click.argument('base', type=click.File())
+@click.argument('new', type=click.File())
+@click.option('--threshold', default=0.2, show_default=True, help='Allowed relative latency growth.')
+def compare_command(base, new, threshold):
+    """Compares two baselines; exits non-zero if any endpoint regressed."""
+    from backend.benchmarks.runner import compare
+
+    regressed = False
+    for name, metric, old, current, change, worse in compare(json.load(base), json.load(new), threshold):
+        click.echo(f"{'REGRESSED' if worse else 'ok       '} {name:34} {metric:20} {old:>10} -> {current:>10} "
+                   f"({change:+.1%})")
+        regressed = regressed or worse
+    if regressed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    cli()
@@ -0,0 +1,234 @@
+import json
+import math
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+from sqlalchemy import event
+from backend.benchmarks.scenarios import Context
+from backend.benchmarks.seed import PASSWORD
+
+# Drives scenarios and turns raw timings into per-endpoint statistics.
+#
+# With the Flask test client requests run one at a time in this process, so SQL
+# statements can be counted with an engine event and latency excludes network
+# overhead. With --url, a thread pool sends real HTTP requests to a live server;
+# query counts and RSS then belong to the server process and are reported as null.
+
+
+class QueryCounter:
+    """Counts SQL statements sent to the database by the given engines."""
+
+    def __init__(self, engines):
+        self.engines = list(engines)
+        self.count = 0
+        for engine in self.engines:
+            event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args):
+        self.count += 1
+
+    def close(self):
+        for engine in self.engines:
+            event.remove(engine, 'before_cursor_execute', self._count)
+
+
+class HTTPResponse:
+
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        self.data = data
+
+    def get_data(self):
+        return self.data
+
+    def get_json(self):
+        return json.loads(self.data)
+
+
+class HTTPClient:
+    """Minimal client with the test client's `open()` signature, for a live server."""
+
+    def __init__(self, base_url, timeout=120):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def open(self, path, method='GET', headers=None, query_string=None, **kwargs):
+        url = self.base_url + path + ('?' + urlencode(query_string) if query_string else '')
+        headers = dict(headers or {})
+        body = None
+        if kwargs.get('json') is not None:
+            body = json.dumps(kwargs['json']).encode()
+            headers['Content-Type'] = 'application/json'
+        try:
+            with urlopen(Request(url, data=body, method=method, headers=headers), timeout=self.timeout) as response:
+                return HTTPResponse(response.status, response.read())
+        except HTTPError as e:
+            return HTTPResponse(e.code, e.read())
+
+
+def send(client, spec):
+    """Issues one request and reads the whole body (streamed responses included)."""
+    response = client.open(spec['path'], method=spec['method'], headers=spec.get('headers'),
+                           query_string=spec.get('query_string'), json=spec.get('json'), data=spec.get('data'))
+    response.get_data()
+    return response
+
+
+def login_users(client, users):
+    """[(user_id, email)] -> [(user_id, email, token)] by logging each user in."""
+    logged_in = []
+    for user_id, email in users:
+        response = client.open('/api/auth/login', method='POST', json={'email': email, 'password': PASSWORD})
+        if response.status_code != 200:
+            raise RuntimeError(f"Could not log in {email}: {response.status_code} {response.get_data()[:200]}")
+        logged_in.append((user_id, email, response.get_json()['token']))
+    return logged_in
+
+
+# --- Statistics ---
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(math.ceil(pct / 100 * len(sorted_values)), 1) - 1]
+
+
+def peak_rss_mb():
+    """High-water resident set size of this process, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1) # bytes on macOS, KB elsewhere
+
+
+def summarize(latencies, seconds, errors, queries=None, rss=None):
+    ordered = sorted(latencies)
+    ms = lambda value: None if value is None else round(value * 1000, 3)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'throughput_rps': round(len(ordered) / seconds, 1) if seconds else None,
+        'mean_ms': ms(sum(ordered) / len(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 50)),
+        'p95_ms': ms(percentile(ordered, 95)),
+        'p99_ms': ms(percentile(ordered, 99)),
+        'queries_per_request': round(queries / len(ordered), 2) if queries is not None and ordered else None,
+        'peak_rss_mb': rss,
+    }
+
+
+# --- Runners ---
+
+def run_test_client(app, scenarios, users, iterations, warmup=3, engines=(), progress=None):
+    """Runs each scenario `iterations` times in-process. Returns {name: stats}."""
+    client = app.test_client()
+    ctx = Context(client, login_users(client, users))
+    counter = QueryCounter(engines)
+    results = {}
+    try:
+        for scenario in scenarios:
+            for _ in range(warmup):
+                send(client, scenario.make(ctx))
+            latencies, errors, queries = [], 0, 0
+            for _ in range(iterations):
+                spec = scenario.make(ctx) # Untimed setup requests happen here
+                counter.count = 0
+                started = time.perf_counter()
+                response = send(client, spec)
+                latencies.append(time.perf_counter() - started)
+                queries += counter.count
+                errors += response.status_code >= 400
+            # Requests run back to back, so throughput is the inverse of the mean latency
+            results[scenario.name] = summarize(latencies, sum(latencies), errors, queries, peak_rss_mb())
+            if progress:
+                progress(scenario.name, results[scenario.name])
+    finally:
+        counter.close()
+    return results
+
+
+def run_http(base_url, scenarios, users, iterations, warmup=3, concurrency=8, progress=None):
+    """Runs each scenario `iterations` times against a live server from `concurrency` threads."""
+    users = login_users(HTTPClient(base_url), users)
+    results = {}
+    for scenario in scenarios:
+        if not scenario.http:
+            continue
+
+        def worker(index, count):
+            # Each worker has its own context and starts on a different user
+            ctx = Context(HTTPClient(base_url), users[index % len(users):] + users[:index % len(users)])
+            for _ in range(warmup):
+                send(ctx.client, scenario.make(ctx))
+            latencies, errors = [], 0
+            for _ in range(count):
+                spec = scenario.make(ctx)
+                started = time.perf_counter()
+                response = send(ctx.client, spec)
+                latencies.append(time.perf_counter() - started)
+                errors += response.status_code >= 400
+            return latencies, errors
+
+        shares = [iterations // concurrency + (1 if i < iterations % concurrency else 0) for i in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(worker, range(concurrency), shares))
+        seconds = time.perf_counter() - started # includes warmup and setup requests
+        latencies = [value for worker_latencies, _ in outcomes for value in worker_latencies]
+        results[scenario.name] = summarize(latencies, seconds, sum(errors for _, errors in outcomes))
+        if progress:
+            progress(scenario.name, results[scenario.name])
+    return results
+
+
+# --- Baselines ---
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_baseline(path, results, **meta):
+    baseline = {
+        'meta': {
+            'commit': git_commit(),
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            **meta,
+        },
+        'endpoints': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+    return baseline
+
+
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'queries_per_request')
+
+
+def compare(base, new, threshold=0.2):
+    """
+    Compares two baselines endpoint by endpoint. Returns rows of
+    (endpoint, metric, base value, new value, relative change, regressed); a metric
+    regresses when it grows by more than `threshold` (queries: by any amount).
+    """
+    rows = []
+    for name in sorted(set(base['endpoints']) & set(new['endpoints'])):
+        for metric in COMPARED_METRICS:
+            old, current = base['endpoints'][name].get(metric), new['endpoints'][name].get(metric)
+            if old is None or current is None:
+                continue
+            change = (current - old) / old if old else (0.0 if current == old else math.inf)
+            limit = 0 if metric == 'queries_per_request' else threshold
+            rows.append((name, metric, old, current, change, change > limit))
+    return rows
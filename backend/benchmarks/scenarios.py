@@ -0,0 +1,227 @@
+import io
+import uuid
+from datetime import date, timedelta
+from collections import namedtuple
+from backend.benchmarks.seed import EXPENSE_CATEGORIES, PASSWORD
+
+# One scenario per endpoint. `make(ctx)` returns the request to time as a dict of
+# Flask test client `open()` arguments; it may first issue untimed setup requests
+# through ctx.client (e.g. create the transaction a DELETE will remove).
+# Scenarios with http=False upload files and only run against the test client.
+
+Scenario = namedtuple('Scenario', 'name make http', defaults=(True,))
+
+
+class Context:
+    """Shared state for a run: the client, logged-in benchmark users and scratch rows."""
+
+    def __init__(self, client, users):
+        self.client = client
+        self.users = users # [(user_id, email, token)]
+        self.turn = 0
+        self.scratch = {}
+
+    def user(self):
+        """The next benchmark user, round robin, so requests spread over everyone's data."""
+        self.turn += 1
+        return self.users[self.turn % len(self.users)]
+
+    def headers(self, user):
+        return {'Authorization': f"Bearer {user[2]}"}
+
+
+def authed(method, path, **kwargs):
+    def make(ctx):
+        return {'method': method, 'path': path, 'headers': ctx.headers(ctx.user()), **kwargs}
+    return make
+
+
+def _new_transaction(ctx, user):
+    response = ctx.client.open('/api/transactions/', method='POST', headers=ctx.headers(user), json={
+        'description': 'benchmark scratch', 'amount': '12.34', 'type': 'expense',
+        'category': EXPENSE_CATEGORIES[0], 'date': date.today().isoformat()
+    })
+    return response.get_json()['transaction']['id']
+
+
+def _new_budget(ctx, user):
+    response = ctx.client.open('/api/budgets/', method='POST', headers=ctx.headers(user), json={
+        'category': EXPENSE_CATEGORIES[0], 'amount': '250.00',
+        'start_date': date.today().replace(day=1).isoformat(), 'end_date': date.today().isoformat()
+    })
+    return response.get_json()['budget']['id']
+
+
+def _scratch(ctx, kind, create):
+    """A row per (kind, user) created once and reused by the update scenarios."""
+    user = ctx.user()
+    if (kind, user[0]) not in ctx.scratch:
+        ctx.scratch[(kind, user[0])] = create(ctx, user)
+    return user, ctx.scratch[(kind, user[0])]
+
+
+# --- auth_routes ---
+
+def register(ctx):
+    return {'method': 'POST', 'path': '/api/auth/register',
+            'json': {'email': f"load-{uuid.uuid4().hex}@example.com", 'password': PASSWORD}}
+
+
+def login(ctx):
+    return {'method': 'POST', 'path': '/api/auth/login', 'json': {'email': ctx.user()[1], 'password': PASSWORD}}
+
+
+def logout(ctx):
+    token = ctx.client.open('/api/auth/login', method='POST',
+                            json={'email': ctx.user()[1], 'password': PASSWORD}).get_json()['token']
+    return {'method': 'POST', 'path': '/api/auth/logout', 'headers': {'Authorization': f"Bearer {token}"}}
+
+
+# --- transactions_routes ---
+
+def add_transaction(ctx):
+    return {'method': 'POST', 'path': '/api/transactions/', 'headers': ctx.headers(ctx.user()), 'json': {
+        'description': 'benchmark', 'amount': '9.99', 'type': 'expense',
+        'category': EXPENSE_CATEGORIES[1], 'date': date.today().isoformat()
+    }}
+
+
+def add_uncategorized_transaction(ctx):
+    return {'method': 'POST', 'path': '/api/transactions/', 'headers': ctx.headers(ctx.user()), 'json': {
+        'description': f"{EXPENSE_CATEGORIES[1]} {uuid.uuid4().hex[:6]}", 'amount': '9.99', 'type': 'expense',
+        'date': date.today().isoformat()
+    }}
+
+
+def update_transaction(ctx):
+    user, transaction_id = _scratch(ctx, 'transaction', _new_transaction)
+    return {'method': 'PUT', 'path': f"/api/transactions/{transaction_id}", 'headers': ctx.headers(user),
+            'json': {'description': 'benchmark scratch', 'amount': '12.34'}}
+
+
+def delete_transaction(ctx):
+    user = ctx.user()
+    transaction_id = _new_transaction(ctx, user)
+    return {'method': 'DELETE', 'path': f"/api/transactions/{transaction_id}", 'headers': ctx.headers(user)}
+
+
+def batch_recategorize(ctx):
+    return {'method': 'POST', 'path': '/api/transactions/batch', 'headers': ctx.headers(ctx.user()), 'json': {
+        'operation': 'update', 'filter': last_30_days(), 'set': {'category': EXPENSE_CATEGORIES[0]}
+    }}
+
+
+def batch_delete(ctx):
+    user = ctx.user()
+    ids = [_new_transaction(ctx, user) for _ in range(10)]
+    return {'method': 'POST', 'path': '/api/transactions/batch', 'headers': ctx.headers(user),
+            'json': {'operation': 'delete', 'ids': ids}}
+
+
+def import_statement(ctx):
+    today = date.today()
+    lines = ['date,description,amount,type,category']
+    lines += [f"{(today - timedelta(days=i)).isoformat()},import {uuid.uuid4().hex[:8]},{i + 1}.50,expense,Dining"
+              for i in range(100)]
+    return {'method': 'POST', 'path': '/api/transactions/import', 'headers': ctx.headers(ctx.user()),
+            'data': {'file': (io.BytesIO('\n'.join(lines).encode()), 'statement.csv')}}
+
+
+def last_30_days():
+    today = date.today()
+    return {'start_date': (today - timedelta(days=30)).isoformat(), 'end_date': today.isoformat()}
+
+
+# --- budget_routes ---
+
+def add_budget(ctx):
+    return {'method': 'POST', 'path': '/api/budgets/', 'headers': ctx.headers(ctx.user()), 'json': {
+        'category': EXPENSE_CATEGORIES[3], 'amount': '100.00',
+        'start_date': date.today().replace(day=1).isoformat(), 'end_date': date.today().isoformat()
+    }}
+
+
+def update_budget(ctx):
+    user, budget_id = _scratch(ctx, 'budget', _new_budget)
+    return {'method': 'PUT', 'path': f"/api/budgets/{budget_id}", 'headers': ctx.headers(user),
+            'json': {'amount': '250.00'}}
+
+
+def delete_budget(ctx):
+    user = ctx.user()
+    budget_id = _new_budget(ctx, user)
+    return {'method': 'DELETE', 'path': f"/api/budgets/{budget_id}", 'headers': ctx.headers(user)}
+
+
+def batch_update_budgets(ctx):
+    return {'method': 'POST', 'path': '/api/budgets/batch', 'headers': ctx.headers(ctx.user()), 'json': {
+        'operation': 'update', 'filter': {'category': EXPENSE_CATEGORIES[0]}, 'set': {'amount': '250.00'}
+    }}
+
+
+# --- sync_routes ---
+
+def _sync_token(ctx, user):
+    return ctx.client.open('/api/sync', headers=ctx.headers(user)).get_json()['token']
+
+
+def sync_delta(ctx):
+    user, token = _scratch(ctx, 'sync_token', _sync_token)
+    return {'method': 'GET', 'path': '/api/sync', 'headers': ctx.headers(user), 'query_string': {'since': token}}
+
+
+# --- category_routes ---
+
+def suggest_categories(ctx):
+    descriptions = [f"{EXPENSE_CATEGORIES[i % len(EXPENSE_CATEGORIES)]} {i}" for i in range(100)]
+    return {'method': 'POST', 'path': '/api/categories/suggest', 'headers': ctx.headers(ctx.user()),
+            'json': {'descriptions': descriptions}}
+
+
+SCENARIOS = [
+    Scenario('auth.register', register),
+    Scenario('auth.login', login),
+    Scenario('auth.logout', logout),
+
+    Scenario('transactions.list_all', authed('GET', '/api/transactions/')),
+    Scenario('transactions.list_page', authed('GET', '/api/transactions/', query_string={'limit': 50})),
+    Scenario('transactions.list_filtered', authed('GET', '/api/transactions/', query_string={
+        'limit': 50, 'type': 'expense', 'category': EXPENSE_CATEGORIES[2]})),
+    Scenario('transactions.stream_ndjson', authed('GET', '/api/transactions/', query_string={
+        'stream': 'ndjson', 'limit': 1000})),
+    Scenario('transactions.search', authed('GET', '/api/transactions/search', query_string={
+        'q': EXPENSE_CATEGORIES[0][:3].lower()})),
+    Scenario('transactions.search_filtered', authed('GET', '/api/transactions/search', query_string={
+        'q': EXPENSE_CATEGORIES[2], 'min_amount': '20', **last_30_days()})),
+    Scenario('transactions.export_csv', authed('GET', '/api/transactions/export', query_string=last_30_days())),
+    Scenario('transactions.summary', authed('GET', '/api/transactions/summary')),
+    Scenario('transactions.add', add_transaction),
+    Scenario('transactions.add_uncategorized', add_uncategorized_transaction),
+    Scenario('transactions.update', update_transaction),
+    Scenario('transactions.delete', delete_transaction),
+    Scenario('transactions.batch_recategorize', batch_recategorize),
+    Scenario('transactions.batch_delete', batch_delete),
+    Scenario('transactions.import_csv', import_statement, http=False),
+
+    Scenario('budgets.list', authed('GET', '/api/budgets/')),
+    Scenario('budgets.list_progress', authed('GET', '/api/budgets/', query_string={'progress': 1})),
+    Scenario('budgets.progress', authed('GET', '/api/budgets/progress')),
+    Scenario('budgets.add', add_budget),
+    Scenario('budgets.update', update_budget),
+    Scenario('budgets.delete', delete_budget),
+    Scenario('budgets.batch_update', batch_update_budgets),
+    Scenario('budgets.export_csv', authed('GET', '/api/budgets/export')),
+
+    Scenario('categories.rules', authed('GET', '/api/categories/rules')),
+    Scenario('categories.suggest', suggest_categories),
+
+    Scenario('sync.full', authed('GET', '/api/sync')),
+    Scenario('sync.delta', sync_delta),
+
+    Scenario('reports.spending_patterns', authed('GET', '/api/reports/spending-patterns', query_string={'period': '1year'})),
+    Scenario('reports.category_distribution', authed('GET', '/api/reports/category-distribution', query_string={'period': '1year'})),
+    Scenario('reports.timeseries_month', authed('GET', '/api/reports/timeseries')),
+    Scenario('reports.timeseries_day', authed('GET', '/api/reports/timeseries', query_string={
+        'granularity': 'day', 'type': 'expense', 'start': last_30_days()['start_date']})),
+    Scenario('reports.dashboard', authed('GET', '/api/dashboard', query_string={'period': '1year'})),
+]
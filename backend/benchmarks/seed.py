@@ -0,0 +1,115 @@
+import random
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from sqlalchemy import insert
+from backend.database import db
+from backend.models import User, Transaction, Budget
+from backend import rollups
+
+# Synthetic data for benchmarks.
+#
+# Categories follow a Zipf-like skew (a few categories hold most expenses, as in
+# real statements), dates are spread uniformly over several years and expense
+# amounts are log-normal. Rows go in through Core executemany in batches, so
+# seeding millions of transactions keeps memory flat; the monthly rollups are
+# rebuilt once at the end. The same `seed` value always produces the same data.
+
+EXPENSE_CATEGORIES = ['Groceries', 'Rent', 'Dining', 'Transport', 'Utilities', 'Shopping',
+                      'Entertainment', 'Health', 'Travel', 'Education', 'Gifts', 'Insurance']
+INCOME_CATEGORIES = ['Salary', 'Freelance', 'Interest']
+INCOME_SHARE = 0.1 # Fraction of transactions that are income
+BUDGETED_CATEGORIES = 4 # Monthly budgets for each user's most common categories
+BATCH_SIZE = 10000
+EMAIL_TEMPLATE = 'bench-{}@example.com'
+PASSWORD = 'benchmark'
+
+
+def _cumulative_zipf(n, exponent=1.1):
+    return list(accumulate(1 / rank ** exponent for rank in range(1, n + 1)))
+
+
+def synthetic_transactions(user_id, count, years, rng, end_date):
+    """Yields `count` transaction rows (dicts for Core insert) dated within `years` years up to end_date."""
+    span = max(int(years * 365), 1)
+    cum_weights = _cumulative_zipf(len(EXPENSE_CATEGORIES))
+    for i in range(count):
+        day = end_date - timedelta(days=rng.randrange(span))
+        if rng.random() < INCOME_SHARE:
+            type_, category = 'income', rng.choice(INCOME_CATEGORIES)
+            amount_cents = rng.randint(50000, 500000)
+        else:
+            type_, category = 'expense', rng.choices(EXPENSE_CATEGORIES, cum_weights=cum_weights)[0]
+            amount_cents = max(int(rng.lognormvariate(7.5, 1.0)), 1) # median about $18
+        yield {
+            'user_id': user_id,
+            'description': f"{category} {i}",
+            'amount_cents': amount_cents,
+            'type': type_,
+            'category': category,
+            'date': day,
+            'timestamp': datetime.combine(day, datetime.min.time()) + timedelta(seconds=rng.randrange(86400)),
+        }
+
+
+def _budgets(user_id, end_date):
+    """Monthly budgets for the last 12 months of the most common expense categories."""
+    budgets = []
+    for category in EXPENSE_CATEGORIES[:BUDGETED_CATEGORIES]:
+        year, month = end_date.year, end_date.month
+        for _ in range(12):
+            start = date(year, month, 1)
+            end = (date(year + month // 12, month % 12 + 1, 1)) - timedelta(days=1)
+            budgets.append({'user_id': user_id, 'category': category, 'amount_cents': 50000,
+                            'start_date': start, 'end_date': end, 'timestamp': datetime.utcnow()})
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return budgets
+
+
+def seed(users=10, transactions=100000, years=3, seed=0, end_date=None, progress=None):
+    """
+    Creates `users` users (EMAIL_TEMPLATE / PASSWORD) sharing `transactions` transactions
+    evenly, plus monthly budgets, then rebuilds the rollups. Needs an app context.
+    Returns the new user ids.
+    """
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    db.create_all()
+
+    # Hash the shared password once; hashing is deliberately slow
+    template = User(email='template')
+    template.set_password(PASSWORD)
+    first = db.session.query(db.func.count(User.id)).scalar()
+    db.session.execute(insert(User.__table__), [
+        {'email': EMAIL_TEMPLATE.format(first + i), 'password_hash': template.password_hash} for i in range(users)
+    ])
+    db.session.commit()
+    user_ids = [uid for (uid,) in db.session.query(User.id).filter(
+        User.email.in_([EMAIL_TEMPLATE.format(first + i) for i in range(users)])).order_by(User.id)]
+
+    inserted = 0
+    for n, user_id in enumerate(user_ids):
+        count = transactions // users + (1 if n < transactions % users else 0)
+        batch = []
+        for row in synthetic_transactions(user_id, count, years, rng, end_date):
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                db.session.execute(insert(Transaction.__table__), batch)
+                db.session.commit()
+                inserted += len(batch)
+                batch = []
+                if progress:
+                    progress(inserted)
+        if batch:
+            db.session.execute(insert(Transaction.__table__), batch)
+            inserted += len(batch)
+        db.session.execute(insert(Budget.__table__), _budgets(user_id, end_date))
+        db.session.commit()
+
+    rollups.rebuild()
+    return user_ids
+
+
+def seeded_users():
+    """Ids and emails of benchmark users already in the database."""
+    return db.session.query(User.id, User.email).filter(
+        User.email.like(EMAIL_TEMPLATE.format('%'))).order_by(User.id).all()
@@ -0,0 +1,102 @@
+from bisect import bisect_left, bisect_right
+from sqlalchemy import select, func
+from backend.database import db
+from backend.models import Transaction
+from backend.money import cents_to_float
+
+# Spend-vs-budget for all of a user's budgets in one sweep.
+#
+# One query returns the user's daily expense totals per category over the span of
+# all budgets, already sorted by (category, date). Each category's days become a
+# prefix-sum array, and every budget window [start_date, end_date] is answered
+# with two bisections. Cost is O((budgets + days) log days) whatever the overlap
+# between budgets, instead of one SUM query per budget.
+
+DEFAULT_ALERT_THRESHOLD = 0.8 # Warn once 80% of a budget is spent
+
+
+def _daily_expense_prefix_sums(user_id, budgets):
+    """{category: (sorted dates, prefix sums in cents)} covering every budget window."""
+    categories = {b.category for b in budgets}
+    rows = db.session.execute(select(
+        Transaction.category, Transaction.date, func.sum(Transaction.amount_cents)
+    ).where(
+        Transaction.user_id == user_id,
+        Transaction.type == 'expense',
+        Transaction.date >= min(b.start_date for b in budgets),
+        Transaction.date <= max(b.end_date for b in budgets),
+        Transaction.category.in_(categories)
+    ).group_by(Transaction.category, Transaction.date).order_by(Transaction.category, Transaction.date))
+
+    series = {}
+    for category, day, total in rows:
+        dates, prefix = series.setdefault(category, ([], [0]))
+        dates.append(day)
+        prefix.append(prefix[-1] + total)
+    return series
+
+
+def _overlaps(budgets):
+    """{budget_id: [ids of same-category budgets whose windows overlap it]} via a sorted sweep."""
+    overlaps = {b.id: [] for b in budgets}
+    by_category = {}
+    for b in sorted(budgets, key=lambda b: (b.category, b.start_date, b.id)):
+        by_category.setdefault(b.category, []).append(b)
+    for group in by_category.values():
+        active = []
+        for b in group:
+            active = [a for a in active if a.end_date >= b.start_date]
+            for a in active:
+                overlaps[a.id].append(b.id)
+                overlaps[b.id].append(a.id)
+            active.append(b)
+    return overlaps
+
+
+def _status(spent, amount, threshold):
+    if spent > amount:
+        return 'over'
+    if amount and spent >= amount * threshold:
+        return 'warning'
+    return 'ok'
+
+
+def budget_progress(user_id, budgets, alert_threshold=DEFAULT_ALERT_THRESHOLD):
+    """
+    Returns one dict per budget: its to_dict() plus spent, remaining, percent_used,
+    status ('ok', 'warning' or 'over') and overlapping_budget_ids. An expense that
+    falls inside several overlapping budgets of its category counts toward each.
+    """
+    if not budgets:
+        return []
+    series = _daily_expense_prefix_sums(user_id, budgets)
+    overlaps = _overlaps(budgets)
+
+    progress = []
+    for b in budgets:
+        dates, prefix = series.get(b.category, ([], [0]))
+        spent = prefix[bisect_right(dates, b.end_date)] - prefix[bisect_left(dates, b.start_date)]
+        entry = b.to_dict()
+        entry.update({
+            'spent': cents_to_float(spent),
+            'remaining': cents_to_float(b.amount_cents - spent),
+            'percent_used': round(spent * 100 / b.amount_cents, 1) if b.amount_cents else None,
+            'status': _status(spent, b.amount_cents, alert_threshold),
+            'overlapping_budget_ids': sorted(overlaps[b.id]),
+        })
+        progress.append(entry)
+    return progress
+
+
+def alerts(progress):
+    """Alert messages for budgets that are over or close to their limit."""
+    messages = []
+    for entry in progress:
+        if entry['status'] == 'over':
+            text = f"Over budget for {entry['category']}: spent {entry['spent']:.2f} of {entry['amount']:.2f}"
+        elif entry['status'] == 'warning':
+            text = f"{entry['percent_used']}% of the {entry['category']} budget used"
+        else:
+            continue
+        messages.append({'budget_id': entry['id'], 'status': entry['status'], 'message': text})
+    return messages
@@ -0,0 +1,200 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from flask import request, make_response
+
+# Per-user versioned response cache.
+#
+# Every cached response is keyed by (user, endpoint, normalized query params,
+# user data version, today's date). Mutations call `bump_version(user_id)` after
+# they commit, which makes all of that user's entries unreachable at once; stale
+# entries then age out of the LRU. Because the ETag is derived from the same key,
+# a client re-polling with If-None-Match gets a 304 without any database access.
+#
+# Versions are only shared between workers by the Redis backend. The in-process
+# backend keeps one version map per worker, so a write served by one worker does
+# not invalidate what the others cached (or the ETags they hand out). With it,
+# keys also carry a time slot of RESPONSE_CACHE_VERSION_MAX_AGE seconds, which
+# bounds how long another worker can keep answering from stale data or with 304.
+#
+# Backends also keep named counters, separate from the user data versions, for
+# other per-process caches that need a shared invalidation signal.
+
+
+class LRUCacheBackend:
+    """In-process cache with a max entry count (LRU eviction) and a per-entry TTL."""
+
+    shared = False # versions and counters are per worker
+
+    def __init__(self, max_entries=1024, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_version(self, user_id):
+        # Versions are never evicted: losing one could resurrect stale entries
+        with self.lock:
+            return self.versions.get(user_id, 0)
+
+    def bump_version(self, user_id):
+        with self.lock:
+            self.versions[user_id] = self.versions.get(user_id, 0) + 1
+
+    def get_counter(self, name):
+        with self.lock:
+            return self.counters.get(name, 0)
+
+    def bump_counter(self, name):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.versions.clear()
+            self.counters.clear()
+
+
+class RedisCacheBackend:
+    """Shared cache for multi-worker deployments. Needs the optional `redis` package."""
+
+    shared = True
+
+    def __init__(self, url, ttl=300, prefix='pfm:cache:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        return self.client.get(self.prefix + key)
+
+    def set(self, key, value):
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def get_version(self, user_id):
+        return int(self.client.get(f"{self.prefix}version:{user_id}") or 0)
+
+    def bump_version(self, user_id):
+        self.client.incr(f"{self.prefix}version:{user_id}")
+
+    def get_counter(self, name):
+        return int(self.client.get(f"{self.prefix}counter:{name}") or 0)
+
+    def bump_counter(self, name):
+        self.client.incr(f"{self.prefix}counter:{name}")
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class ResponseCache:
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.version_max_age = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app, backend=None):
+        """
+        Picks the backend from RESPONSE_CACHE_BACKEND: 'memory' (default), 'redis'
+        (using RESPONSE_CACHE_URL) or 'none'. An explicit backend object wins.
+        """
+        if backend is None:
+            kind = app.config.get('RESPONSE_CACHE_BACKEND', 'memory')
+            ttl = app.config.get('RESPONSE_CACHE_TTL', 300)
+            if kind == 'redis':
+                backend = RedisCacheBackend(app.config['RESPONSE_CACHE_URL'], ttl=ttl)
+            elif kind == 'memory':
+                backend = LRUCacheBackend(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024), ttl=ttl)
+        self.backend = backend
+        shared = getattr(backend, 'shared', False)
+        self.version_max_age = 0 if shared else app.config.get('RESPONSE_CACHE_VERSION_MAX_AGE', 30)
+
+    def bump_version(self, user_id):
+        """Invalidates every cached response of a user. Call after the mutation commits."""
+        if self.backend is not None:
+            self.backend.bump_version(user_id)
+
+    def get_version(self, user_id):
+        """The user's data version (shared by all workers with Redis), or None without a backend."""
+        return self.backend.get_version(user_id) if self.backend is not None else None
+
+    def get_counter(self, name):
+        """A named counter, kept apart from the data versions, or None without a backend."""
+        return self.backend.get_counter(name) if self.backend is not None else None
+
+    def bump_counter(self, name):
+        if self.backend is not None:
+            self.backend.bump_counter(name)
+
+    def make_key(self, user_id, endpoint, args):
+        """Key (and ETag) for one user's view of `endpoint` with the query params `args` (a MultiDict)."""
+        params = '&'.join(f"{k}={v}" for k, v in sorted(args.items(multi=True)))
+        version = self.backend.get_version(user_id)
+        slot = int(time.time() // self.version_max_age) if self.version_max_age else 0
+        raw = f"{user_id}|{endpoint}|{params}|{version}|{slot}|{datetime.utcnow().date()}"
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def cache_key(self, user_id):
+        return self.make_key(user_id, request.endpoint, request.args)
+
+    def cached(self, get_user_id):
+        """Decorator for GET JSON views whose result depends only on the user's data and query params."""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                user_id = get_user_id()
+                if self.backend is None or not user_id:
+                    return view(*args, **kwargs)
+
+                key = self.cache_key(user_id)
+                if key in request.if_none_match:
+                    response = make_response('', 304)
+                else:
+                    body = self.backend.get(key)
+                    if body is not None:
+                        response = make_response(body, 200)
+                        response.mimetype = 'application/json'
+                    else:
+                        response = make_response(view(*args, **kwargs))
+                        if response.status_code != 200:
+                            return response
+                        self.backend.set(key, response.get_data())
+                response.set_etag(key)
+                # Let clients keep the body but always revalidate with If-None-Match
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+            return wrapper
+        return decorator
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,241 @@
+import math
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from sqlalchemy import select, update
+from backend.database import db
+from backend.models import Transaction, CategoryRule
+from backend.search import words
+from backend.cache import response_cache
+from backend import rollups, sync
+
+# Automatic categorization of transactions from their description.
+#
+# A user's categorizer tries, in order:
+# 1. their own rules (CategoryRule): a phrase such as "whole foods" and the
+#    category it implies, matched on whole words anywhere in the description;
+# 2. learned rules: the wording of descriptions (digits dropped, so "NETFLIX.COM
+#    8443" and "Netflix.com 1121" agree) that they categorized the same way at
+#    least LEARNED_MIN_SUPPORT times;
+# 3. a multinomial naive Bayes model over description words trained on their
+#    recent history, used when it is at least MIN_CONFIDENCE sure.
+# User rules are compiled into one word trie, so a description costs one walk per
+# word position however many rules there are; learned rules are a single dict
+# lookup, and the model only touches the categories its known words occurred in.
+# Categorizers are built from the database on first use and cached per process
+# for CATEGORIZER_TTL seconds, tagged with the user's rules version, a named
+# counter in the response cache backend that rule changes bump. With the Redis
+# backend every worker sees the bump and rebuilds on next use; with the
+# in-process backend (or none) only the worker that changed the rules does, and
+# the others may keep applying the old rules for up to CATEGORIZER_TTL.
+
+UNCATEGORIZED = 'Uncategorized'
+CATEGORIZER_TTL = 300 # seconds a user's categorizer is reused before retraining
+CACHE_SIZE = 1000 # users whose categorizers are kept in memory
+TRAINING_ROWS = 20000 # most recent categorized transactions the learned parts use
+LEARNED_MIN_SUPPORT = 2
+LEARNED_MIN_PURITY = 0.9 # share of a wording's rows that must agree on its category
+MIN_CONFIDENCE = 0.6
+RECATEGORIZE_CHUNK_SIZE = 5000
+
+_END = None # trie key holding the rule that ends at a node; words are never None
+
+
+def _alpha(tokens):
+    return tuple(token for token in tokens if token.isalpha())
+
+
+class Categorizer:
+
+    def __init__(self, rules=(), examples=()):
+        """`rules` is [(pattern, category, priority)], `examples` [(description, category)]."""
+        # Word trie of user rules; ties go to higher priority, then longer phrases, then earlier rules
+        self.trie = {}
+        for order, (pattern, category, priority) in enumerate(rules):
+            tokens = words(pattern)
+            if not tokens:
+                continue
+            node = self.trie
+            for token in tokens:
+                node = node.setdefault(token, {})
+            rank = (priority, len(tokens), -order)
+            if _END not in node or rank > node[_END][0]:
+                node[_END] = (rank, category)
+
+        phrases = defaultdict(Counter)
+        token_counts = defaultdict(Counter)
+        documents, token_totals = Counter(), Counter()
+        for description, category in examples:
+            tokens = _alpha(words(description))
+            phrases[tokens][category] += 1
+            documents[category] += 1
+            for token in tokens:
+                token_counts[token][category] += 1
+            token_totals[category] += len(tokens)
+
+        self.learned = {}
+        for tokens, counts in phrases.items():
+            category, count = counts.most_common(1)[0]
+            if tokens and count >= LEARNED_MIN_SUPPORT and count >= LEARNED_MIN_PURITY * sum(counts.values()):
+                self.learned[tokens] = category
+
+        # Laplace-smoothed naive Bayes. log P(t|c) = log(n_tc + 1) - log(N_c + V), so a
+        # category's score is its prior, minus log(N_c + V) per known word, plus
+        # log(n_tc + 1) for just the categories each word was seen with
+        total = sum(documents.values())
+        vocabulary = len(token_counts)
+        self.categories = list(documents)
+        index = {c: i for i, c in enumerate(self.categories)}
+        self.prior = [math.log(documents[c] / total) for c in self.categories]
+        self.per_word = [-math.log(token_totals[c] + vocabulary) for c in self.categories]
+        self.weights = {token: [(index[c], math.log(n + 1)) for c, n in counts.items()]
+                        for token, counts in token_counts.items()}
+
+    def match_rule(self, tokens):
+        best = None
+        trie = self.trie
+        for start, token in enumerate(tokens):
+            node = trie.get(token)
+            if node is None: # most positions start no rule
+                continue
+            position = start
+            while node is not None:
+                hit = node.get(_END)
+                if hit is not None and (best is None or hit[0] > best[0]):
+                    best = hit
+                position += 1
+                node = node.get(tokens[position]) if position < len(tokens) else None
+        return best[1] if best else None
+
+    def predict(self, tokens):
+        """(category, probability) from the model, or None when no word is known."""
+        known = [self.weights[token] for token in tokens if token in self.weights]
+        if not known:
+            return None
+        count = len(known)
+        scores = [prior + count * per_word for prior, per_word in zip(self.prior, self.per_word)]
+        for weights in known:
+            for i, weight in weights:
+                scores[i] += weight
+        top = max(scores)
+        exp = math.exp
+        return self.categories[scores.index(top)], 1 / sum(exp(score - top) for score in scores)
+
+    def categorize(self, description, rules_only=False):
+        """(category, source, confidence) for a description, or None if nothing is confident enough."""
+        tokens = words(description)
+        if self.trie:
+            category = self.match_rule(tokens)
+            if category is not None:
+                return category, 'rule', 1.0
+        if rules_only:
+            return None
+        alpha = _alpha(tokens)
+        category = self.learned.get(alpha)
+        if category is not None:
+            return category, 'learned', 1.0
+        prediction = self.predict(alpha)
+        if prediction is not None and prediction[1] >= MIN_CONFIDENCE:
+            return prediction[0], 'model', round(prediction[1], 3)
+        return None
+
+
+# --- Per-user categorizers ---
+
+_cache = OrderedDict() # user_id -> (built_at, rules version, Categorizer)
+_lock = threading.Lock()
+
+
+def _rules_version(user_id):
+    return response_cache.get_counter(f"category-rules:{user_id}")
+
+
+def build(user_id):
+    """A user's categorizer from their rules and recent history. Needs an app context."""
+    rules = db.session.execute(
+        select(CategoryRule.pattern, CategoryRule.category, CategoryRule.priority)
+        .where(CategoryRule.user_id == user_id).order_by(CategoryRule.id)
+    ).all()
+    examples = db.session.execute(
+        select(Transaction.description, Transaction.category)
+        .where(Transaction.user_id == user_id, Transaction.category != UNCATEGORIZED)
+        .order_by(Transaction.id.desc()).limit(TRAINING_ROWS)
+    ).all()
+    return Categorizer(rules, examples)
+
+
+def for_user(user_id):
+    """The user's cached categorizer, rebuilt when older than CATEGORIZER_TTL or their rules changed."""
+    now = time.monotonic()
+    version = _rules_version(user_id)
+    with _lock:
+        entry = _cache.get(user_id)
+    if entry is not None and now - entry[0] < CATEGORIZER_TTL and entry[1] == version:
+        return entry[2]
+    categorizer = build(user_id)
+    with _lock:
+        _cache[user_id] = (now, version, categorizer)
+        _cache.move_to_end(user_id)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return categorizer
+
+
+def invalidate(user_id):
+    """Drops the user's categorizers after a rule change. Call after the change commits."""
+    response_cache.bump_counter(f"category-rules:{user_id}")
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+def categorize(user_id, description):
+    """(category, source, confidence) for one description, falling back to (UNCATEGORIZED, None, None)."""
+    return for_user(user_id).categorize(description) or (UNCATEGORIZED, None, None)
+
+
+# --- Batch re-categorization ---
+
+def recategorize(user_id, include_categorized=False, dry_run=False, chunk_size=RECATEGORIZE_CHUNK_SIZE):
+    """
+    Assigns categories to the user's uncategorized transactions, chunk_size rows
+    per commit. With include_categorized, rows that already have a
+    category are also moved when one of the user's own rules says otherwise.
+    Rollups are adjusted per chunk. Returns counts of scanned and changed rows by source.
+    """
+    categorizer = build(user_id)
+    result = {'scanned': 0, 'changed': 0, 'rule': 0, 'learned': 0, 'model': 0}
+    # Ids first (from the user's index alone), then each chunk of rows by primary key
+    ids = select(Transaction.id).where(Transaction.user_id == user_id)
+    if not include_categorized:
+        ids = ids.where(Transaction.category == UNCATEGORIZED)
+    ids = db.session.execute(ids.order_by(Transaction.id)).scalars().all()
+    columns = (Transaction.id, Transaction.description, Transaction.category, Transaction.type,
+               Transaction.date, Transaction.amount_cents)
+
+    for start in range(0, len(ids), chunk_size):
+        rows = db.session.execute(select(*columns).where(Transaction.id.in_(ids[start:start + chunk_size]))).all()
+        result['scanned'] += len(rows)
+
+        changes, deltas = [], {}
+        for row in rows:
+            found = categorizer.categorize(row.description, rules_only=row.category != UNCATEGORIZED)
+            if found is None or found[0] == row.category:
+                continue
+            category, source, _ = found
+            changes.append({'id': row.id, 'category': category})
+            result[source] += 1
+            month = row.date.replace(day=1)
+            for bucket, sign in (((month, row.type, row.category), -1), ((month, row.type, category), +1)):
+                total, count = deltas.get(bucket, (0, 0))
+                deltas[bucket] = (total + sign * row.amount_cents, count + sign)
+        result['changed'] += len(changes)
+        if changes and not dry_run:
+            change_seq = sync.seq(user_id)
+            for change in changes:
+                change['change_seq'] = change_seq
+            db.session.execute(update(Transaction), changes)
+            for (month, type_, category), (total, count) in deltas.items():
+                if count or total:
+                    rollups.apply_delta(user_id, month, type_, category, total, count)
+            db.session.commit()
+    return result
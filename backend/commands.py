@@ -0,0 +1,260 @@
+import click
+from backend.database import db
+from backend.cache import response_cache
+from backend.sharding import shard_router
+from backend import search
+from backend.money import format_cents
+
+# Maintenance commands, run with:  flask --app backend.app:create_app <command>
+
+def _shards_for(user_id=None):
+    """The shard holding `user_id`, or every shard."""
+    return [shard_router.lookup(user_id)[0]] if user_id is not None else shard_router.shards
+
+
+def register_commands(app):
+
+    @app.cli.command('create-indexes')
+    def create_indexes():
+        """Creates any model indexes missing from an existing database (and every shard)."""
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=db.engine, checkfirst=True)
+                click.echo(f"ok  {index.name}")
+        with db.engine.begin() as conn:
+            search.create_index(conn)
+        click.echo("ok  transaction search index")
+        shard_router.create_tables()
+
+    @app.cli.command('check-query-plans')
+    @click.option('--user-id', default=1, help='User ID to bind into the explained queries.')
+    def check_query_plans_command(user_id):
+        """Explains each endpoint query and exits non-zero if any of them scans a table."""
+        from backend.query_plans import check_query_plans
+
+        failed = False
+        with shard_router.for_user(user_id):
+            plans = check_query_plans(user_id)
+        for name, (plan, ok) in plans.items():
+            click.echo(f"{'ok  ' if ok else 'SCAN'} {name}")
+            for line in plan:
+                click.echo(f"       {line}")
+            failed = failed or not ok
+        if failed:
+            raise SystemExit(1)
+
+    @app.cli.group('rollups')
+    def rollups_group():
+        """Maintain the monthly transaction rollups."""
+
+    @rollups_group.command('rebuild')
+    @click.option('--user-id', type=int, default=None, help='Only rebuild this user.')
+    def rollups_rebuild(user_id):
+        """Recomputes the rollups from raw transactions (backfill)."""
+        from backend import rollups
+
+        db.create_all() # Adds the rollup table to databases that predate it
+        drifted = count = 0
+        for shard in _shards_for(user_id):
+            with shard_router.use(shard):
+                drifted += len(rollups.verify(user_id))
+                count += rollups.rebuild(user_id)
+        click.echo(f"Rebuilt {count} rollup buckets ({drifted} had drifted).")
+
+    @rollups_group.command('verify')
+    @click.option('--user-id', type=int, default=None, help='Only verify this user.')
+    def rollups_verify(user_id):
+        """Reports rollup buckets that differ from raw transactions; exits non-zero on drift."""
+        from backend import rollups
+
+        drift = []
+        for shard in _shards_for(user_id):
+            with shard_router.use(shard):
+                drift.extend(rollups.verify(user_id))
+        for key, (have_total, have_count), (want_total, want_count) in drift:
+            click.echo(f"DRIFT {key}: stored {format_cents(have_total)} ({have_count} rows), "
+                       f"expected {format_cents(want_total)} ({want_count} rows)")
+        if drift:
+            raise SystemExit(1)
+        click.echo("Rollups match transactions.")
+
+    @app.cli.group('insights')
+    def insights_group():
+        """Precompute the spending insights served by /api/reports/insights."""
+
+    @insights_group.command('compute')
+    @click.option('--user-id', type=int, default=None, help='Only compute this user.')
+    @click.option('--workers', type=int, default=None, help='Worker processes (default: one per CPU).')
+    def insights_compute(user_id, workers):
+        """Scores every user's spending in a process pool and stores the results."""
+        from backend import insights
+
+        if not insights.numpy_available():
+            raise click.ClickException("Insights require numpy: pip install numpy")
+        db.create_all() # Adds the insights table to databases that predate it
+        count = insights.compute_all([user_id] if user_id else None, workers)
+        click.echo(f"Computed insights for {count} users.")
+
+    @app.cli.group('search')
+    def search_group():
+        """Maintain the transaction full-text search index."""
+
+    @search_group.command('rebuild')
+    def search_rebuild():
+        """Creates the search index where it is missing and reindexes every transaction."""
+        for shard in shard_router.shards:
+            with shard_router.engine(shard).begin() as conn:
+                search.create_index(conn, rebuild=True)
+            click.echo(f"Reindexed transactions on {shard}.")
+
+    @app.cli.group('categorize')
+    def categorize_group():
+        """Automatic transaction categorization."""
+
+    @categorize_group.command('run')
+    @click.option('--user-id', type=int, default=None, help='Only recategorize this user.')
+    @click.option('--all', 'include_categorized', is_flag=True,
+                  help="Also move categorized transactions a user's rules disagree with.")
+    @click.option('--dry-run', is_flag=True, help='Count the changes without saving them.')
+    def categorize_run(user_id, include_categorized, dry_run):
+        """Categorizes every user's 'Uncategorized' transactions with their rules and history."""
+        from backend import categorization
+        from backend.models import User
+
+        db.create_all() # Adds the rule table to databases that predate it
+        user_ids = [user_id] if user_id else db.session.execute(db.select(User.id).order_by(User.id)).scalars().all()
+        totals = {'scanned': 0, 'changed': 0, 'rule': 0, 'learned': 0, 'model': 0}
+        for uid in user_ids:
+            with shard_router.for_user(uid):
+                result = categorization.recategorize(uid, include_categorized, dry_run)
+            if result['changed'] and not dry_run:
+                response_cache.bump_version(uid)
+            for key, value in result.items():
+                totals[key] += value
+        click.echo(f"{'Would change' if dry_run else 'Changed'} {totals['changed']} of {totals['scanned']} "
+                   f"transactions ({totals['rule']} by rule, {totals['learned']} learned, {totals['model']} by model).")
+
+    @app.cli.group('shards')
+    def shards_group():
+        """Inspect and rebalance user-sharded storage (SHARD_DATABASE_URLS)."""
+
+    @shards_group.command('init')
+    def shards_init():
+        """Creates the user tables on every shard."""
+        db.create_all()
+        shard_router.create_tables()
+        click.echo(f"Initialized {len(shard_router.shards)} shards: {', '.join(shard_router.shards)}")
+
+    @shards_group.command('status')
+    def shards_status():
+        """Users per shard, and how many are not on their ring shard."""
+        for shard, count in shard_router.user_counts().items():
+            click.echo(f"{shard:12} {count} users")
+        click.echo(f"{len(shard_router.misplaced())} users to move on rebalance")
+
+    def report_move(move):
+        user_id, source, target, copied, renumbered = move
+        click.echo(f"user {user_id}: {source} -> {target}, {copied} rows"
+                   + (f" ({renumbered} given new ids)" if renumbered else ""))
+
+    @shards_group.command('move')
+    @click.argument('user_id', type=int)
+    @click.argument('shard')
+    @click.option('--grace', type=float, default=None,
+                  help='Seconds to wait for workers to see the change (default: SHARD_ASSIGNMENT_TTL).')
+    def shards_move(user_id, shard, grace):
+        """Moves one user's data to SHARD while the app keeps serving."""
+        try:
+            moved = shard_router.move_users([(user_id, shard)], grace, progress=report_move)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        if not moved:
+            click.echo(f"user {user_id} is already on {shard}")
+
+    @shards_group.command('rebalance')
+    @click.option('--dry-run', is_flag=True, help='List the moves without making them.')
+    @click.option('--grace', type=float, default=None,
+                  help='Seconds to wait for workers to see each change (default: SHARD_ASSIGNMENT_TTL).')
+    def shards_rebalance(dry_run, grace):
+        """Moves every user that is not on their ring shard, e.g. after adding a shard."""
+        if dry_run:
+            for user_id, source, target in shard_router.misplaced():
+                click.echo(f"user {user_id}: {source} -> {target}")
+            return
+        moved = shard_router.rebalance(grace, progress=report_move)
+        click.echo(f"Moved {len(moved)} users.")
+
+    @app.cli.command('import-transactions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--user-id', type=int, required=True, help='User to import the statement for.')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'ofx', 'qif']), default=None,
+                  help='Statement format (default: from the file extension).')
+    @click.option('--dry-run', is_flag=True, help='Validate and count duplicates without writing.')
+    def import_transactions_command(path, user_id, fmt, dry_run):
+        """Bulk-imports a CSV/OFX/QIF bank statement."""
+        from backend import importers
+
+        fmt = fmt or importers.detect_format(path)
+        with open(path, encoding='utf-8-sig', errors='replace', newline='') as stream, \
+                shard_router.for_user(user_id):
+            result = importers.import_transactions(user_id, stream, fmt, dry_run)
+        if result['imported'] and not dry_run:
+            response_cache.bump_version(user_id)
+        click.echo(f"{result['rows']} rows: {result['imported']} imported, {result['duplicates']} duplicates "
+                   f"({result['duplicates_in_file']} repeated within the file), "
+                   f"{result['error_count']} errors in {result['elapsed_seconds']}s "
+                   f"({result['rows_per_second']} rows/s)")
+        for error in result['errors']:
+            click.echo(f"  row {error['row']}: {error['message']}")
+
+    @app.cli.command('migrate-money')
+    def migrate_money():
+        """Converts float amounts in an existing database to integer cents."""
+        from backend.migrations import migrate_money_to_cents
+
+        migrated = migrate_money_to_cents()
+        for table, count in migrated.items():
+            click.echo(f"{table}: converted {count} rows to amount_cents")
+        if not migrated:
+            click.echo("Nothing to migrate.")
+
+    @app.cli.command('migrate-timestamps')
+    def migrate_timestamps():
+        """Backfills missing transaction timestamps, which keyset paging needs, on every shard."""
+        from backend.migrations import backfill_transaction_timestamps
+
+        for shard in shard_router.shards:
+            filled = backfill_transaction_timestamps(shard_router.engine(shard))
+            click.echo(f"{shard}: backfilled {filled} transaction timestamps")
+
+    @app.cli.command('migrate-sync')
+    def migrate_sync():
+        """Adds the change-tracking columns and tables behind /api/sync to every shard."""
+        from backend.migrations import add_change_seq
+
+        for shard in shard_router.shards:
+            altered = add_change_seq(shard_router.engine(shard))
+            click.echo(f"{shard}: added change_seq to {', '.join(altered) or 'no tables'}")
+        db.create_all()
+        shard_router.create_tables()
+
+    @app.cli.group('sync')
+    def sync_group():
+        """Maintain the /api/sync change feed."""
+
+    @sync_group.command('prune')
+    @click.option('--days', type=int, default=None, help='Keep tombstones this many days (default: 90).')
+    def sync_prune(days):
+        """Drops old delete tombstones; clients with older tokens get a full resync."""
+        from datetime import datetime, timedelta
+        from backend import sync
+
+        older_than = datetime.utcnow() - timedelta(days=days if days is not None else sync.TOMBSTONE_RETENTION_DAYS)
+        dropped = users = 0
+        for shard in shard_router.shards:
+            with shard_router.use(shard):
+                count, user_ids = sync.prune(older_than)
+                db.session.commit()
+            dropped += count
+            users += len(user_ids)
+        click.echo(f"Dropped {dropped} tombstones of {users} users.")
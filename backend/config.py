@@ -1,7 +1,126 @@
 import os
 
+DATABASE_URL = os.environ.get('DATABASE_URL') or \
+               'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'site.db')
+
+# 'default' keeps SQLAlchemy's stock engine settings; 'production' enables WAL and
+# tuned pragmas on SQLite, sized pools, and a read-only engine for GET requests.
+DB_PROFILE = os.environ.get('DB_PROFILE', 'default')
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30)) # seconds to wait for a pooled connection
+DB_BUSY_TIMEOUT = int(os.environ.get('DB_BUSY_TIMEOUT', 5)) # seconds SQLite waits on a locked database
+# Extra databases for user-sharded storage, comma-separated. Each user's transactions,
+# budgets, rollups and insights live on one shard (the primary counts as one);
+# accounts stay on the primary. See backend/sharding.py
+SHARD_DATABASE_URLS = [url.strip() for url in os.environ.get('SHARD_DATABASE_URLS', '').split(',') if url.strip()]
+# Optional read replica (e.g. a Postgres standby); without one, production reads use
+# a read-only connection to the primary database
+READ_DATABASE_URL = os.environ.get('READ_DATABASE_URL')
+
+
+def _engine_options(url, pool_size):
+    if DB_PROFILE != 'production':
+        return {}
+    options = {'pool_size': pool_size, 'max_overflow': DB_MAX_OVERFLOW, 'pool_timeout': DB_POOL_TIMEOUT}
+    if url.startswith('sqlite'):
+        options['connect_args'] = {'timeout': DB_BUSY_TIMEOUT, 'check_same_thread': False}
+    else:
+        options.update({'pool_pre_ping': True, 'pool_recycle': 1800})
+    return options
+
+
+def _read_url(url):
+    """URL of the read-only engine, or None when reads should stay on the primary."""
+    if READ_DATABASE_URL:
+        return READ_DATABASE_URL
+    if DB_PROFILE != 'production' or url in ('sqlite://', 'sqlite:///:memory:'):
+        return None
+    if url.startswith('sqlite:///'):
+        return 'sqlite:///file:' + url[len('sqlite:///'):] + '?mode=ro&uri=true'
+    return url
+
+
+def _async_url(url):
+    """Same database through an asyncio driver (aiosqlite / asyncpg), for the ASGI read path."""
+    scheme, sep, rest = url.partition('://')
+    driver = {'sqlite': 'sqlite+aiosqlite', 'postgresql': 'postgresql+asyncpg',
+              'postgres': 'postgresql+asyncpg'}.get(scheme.split('+')[0])
+    return driver + sep + rest if driver else url
+
+
+def _binds(url):
+    read_url = _read_url(url)
+    if read_url is None:
+        return {}
+    return {'read': {'url': read_url, **_engine_options(read_url, DB_READ_POOL_SIZE)}}
+
+
+def _shard_binds():
+    return {f'shard{i}': {'url': url, **_engine_options(url, DB_POOL_SIZE)}
+            for i, url in enumerate(SHARD_DATABASE_URLS, 1)}
+
+
+DEFAULT_SECRET_KEY = 'a_very_secret_and_random_string_here' # development only; refused outside debug/testing
+
+
 class Config:
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'a_very_secret_and_random_string_here'
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
-                              'sqlite:///' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'site.db')
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SECRET_KEY = os.environ.get('SECRET_KEY') or DEFAULT_SECRET_KEY
+    SQLALCHEMY_DATABASE_URI = DATABASE_URL
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(DATABASE_URL, DB_POOL_SIZE)
+    SQLALCHEMY_BINDS = {**_binds(DATABASE_URL), **_shard_binds()}
+
+    # User sharding; bind keys in ring order. Adding a URL at the end keeps existing names stable
+    SHARD_BINDS = list(_shard_binds())
+    SHARD_VIRTUAL_NODES = int(os.environ.get('SHARD_VIRTUAL_NODES', 64)) # ring points per shard
+    SHARD_ASSIGNMENT_TTL = float(os.environ.get('SHARD_ASSIGNMENT_TTL', 5)) # seconds a worker caches a user's shard
+    SHARD_LOOKUP_CACHE_SIZE = int(os.environ.get('SHARD_LOOKUP_CACHE_SIZE', 10000)) # user -> shard entries a worker caches
+
+    # Async engine behind the ASGI entry point (backend/asgi.py). It only serves reads,
+    # so it uses the read bind when there is one
+    ASYNC_DATABASE_URI = _async_url(_read_url(DATABASE_URL) or DATABASE_URL)
+    ASYNC_ENGINE_OPTIONS = _engine_options(_read_url(DATABASE_URL) or DATABASE_URL, DB_READ_POOL_SIZE)
+    ASYNC_SHARD_URIS = {key: _async_url(bind['url']) for key, bind in _shard_binds().items()}
+
+    # Applied to every new SQLite connection in the production profile
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL', # Safe with WAL; fsync at checkpoints instead of every commit
+        'cache_size': -64000, # KiB, i.e. 64 MB page cache per connection
+        'mmap_size': 268435456, # 256 MB memory-mapped I/O
+        'busy_timeout': DB_BUSY_TIMEOUT * 1000, # ms
+        'temp_store': 'MEMORY',
+    } if DB_PROFILE == 'production' else {}
+
+    # Auth tokens and password hashing
+    AUTH_TOKEN_MAX_AGE = int(os.environ.get('AUTH_TOKEN_MAX_AGE', 7 * 24 * 3600)) # seconds
+    AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000)) # verified tokens kept in memory
+    AUTH_REVOCATION_REFRESH = int(os.environ.get('AUTH_REVOCATION_REFRESH', 30)) # seconds between revocation reloads
+    AUTH_HASH_WORKERS = int(os.environ.get('AUTH_HASH_WORKERS', 2)) # concurrent password hashes
+    AUTH_HASH_MAX_PENDING = int(os.environ.get('AUTH_HASH_MAX_PENDING', 16)) # queued + running hashes
+
+    # Request/SQL instrumentation served at /metrics
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_SLOW_QUERY_MS = int(os.environ.get('METRICS_SLOW_QUERY_MS', 100)) # statements slower than this are logged
+    METRICS_N_PLUS_ONE_THRESHOLD = int(os.environ.get('METRICS_N_PLUS_ONE_THRESHOLD', 10)) # same SQL this often per request
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0') == '1' # honour the X-Profile request header
+
+    # Group commit: transaction writes are queued to one writer thread per worker that
+    # commits them in batches (see backend/write_queue.py). Off by default
+    WRITE_QUEUE_ENABLED = os.environ.get('WRITE_QUEUE_ENABLED', '0') == '1'
+    WRITE_QUEUE_MAX_BATCH = int(os.environ.get('WRITE_QUEUE_MAX_BATCH', 256)) # writes per commit
+    WRITE_QUEUE_MAX_DELAY_MS = float(os.environ.get('WRITE_QUEUE_MAX_DELAY_MS', 2)) # wait for more writes after the first
+    WRITE_QUEUE_MAX_PENDING = int(os.environ.get('WRITE_QUEUE_MAX_PENDING', 5000)) # queued writes before backpressure
+    WRITE_QUEUE_ENQUEUE_TIMEOUT = float(os.environ.get('WRITE_QUEUE_ENQUEUE_TIMEOUT', 1)) # seconds to wait for room
+    WRITE_QUEUE_RESULT_TIMEOUT = float(os.environ.get('WRITE_QUEUE_RESULT_TIMEOUT', 30)) # seconds to wait for the commit
+
+    # Response cache for report/summary endpoints: 'memory', 'redis' or 'none'
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory')
+    RESPONSE_CACHE_URL = os.environ.get('RESPONSE_CACHE_URL') # e.g. redis://localhost:6379/0
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 300)) # seconds
+    # With the per-worker 'memory' backend, how long one worker may keep serving (or 304ing)
+    # data another worker has since changed; 0 disables. The Redis backend shares versions
+    RESPONSE_CACHE_VERSION_MAX_AGE = int(os.environ.get('RESPONSE_CACHE_VERSION_MAX_AGE', 30)) # seconds
@@ -1,3 +1,63 @@
+from flask import g, request, has_request_context
 from flask_sqlalchemy import SQLAlchemy # type: ignore
+from flask_sqlalchemy.session import Session # type: ignore
+from sqlalchemy import event
+from backend.sharding import shard_router
 
-db = SQLAlchemy()
\ No newline at end of file
+
+class RoutingSession(Session):
+    """
+    Sends statements on user-owned tables to the current user's shard (see
+    backend/sharding.py). Otherwise, queries made while handling GET/HEAD requests
+    go to the 'read' bind (a read-only connection or a replica) when one is
+    configured; flushes, and everything outside read requests, go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            engine = shard_router.bind_for(mapper, clause)
+            if engine is not None:
+                return engine
+        if bind is None and not self._flushing and has_request_context() and g.get('db_read_only'):
+            engine = self._db.engines.get('read')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Runs `PRAGMA name=value` for every pragma on each new connection of a (sync) engine."""
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def configure_database(app):
+    """Applies SQLite pragmas to every engine and routes read requests to the read bind."""
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite' or not pragmas:
+                continue
+            if key == 'read':
+                # Journal mode can only be changed by a writer; the primary sets it
+                apply_sqlite_pragmas(engine, {k: v for k, v in pragmas.items() if k != 'journal_mode'})
+            else:
+                apply_sqlite_pragmas(engine, pragmas)
+                # Connect once so WAL is enabled before any read-only connection opens
+                engine.connect().close()
+
+    @app.before_request
+    def route_reads():
+        g.db_read_only = request.method in ('GET', 'HEAD')
+
+
+def use_primary():
+    """Sends the rest of this read request's queries to the primary, e.g. for a GET that writes."""
+    g.db_read_only = False
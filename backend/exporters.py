@@ -0,0 +1,168 @@
+import csv
+import io
+from sqlalchemy import select
+from backend.database import db
+from backend.models import Transaction, Budget
+from backend.money import format_cents
+
+# Streaming exports.
+#
+# Rows are read from a server-side cursor in partitions of EXPORT_BATCH_SIZE plain
+# tuples and encoded partition by partition, so neither ORM objects nor per-row
+# dicts are ever built and memory stays constant however long the history is.
+# Arrow IPC and Parquet output need the optional `pyarrow` package.
+# Money stays in integer cents in the columnar formats; CSV writes decimal strings.
+
+EXPORT_BATCH_SIZE = 5000
+FORMATS = ('csv', 'arrow', 'parquet')
+MIMETYPES = {
+    'csv': 'text/csv',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+TRANSACTION_COLUMNS = ('id', 'date', 'description', 'amount_cents', 'type', 'category', 'timestamp')
+BUDGET_COLUMNS = ('id', 'category', 'amount_cents', 'start_date', 'end_date', 'timestamp')
+# Arrow type per column; anything not listed is a string
+ARROW_TYPES = {
+    'id': 'int64',
+    'amount_cents': 'int64',
+    'date': 'date32',
+    'start_date': 'date32',
+    'end_date': 'date32',
+    'timestamp': 'timestamp',
+}
+
+
+def transactions_statement(user_id, start_date=None, end_date=None):
+    statement = select(*[getattr(Transaction, c) for c in TRANSACTION_COLUMNS]).where(Transaction.user_id == user_id)
+    if start_date:
+        statement = statement.where(Transaction.date >= start_date)
+    if end_date:
+        statement = statement.where(Transaction.date <= end_date)
+    return statement.order_by(Transaction.timestamp, Transaction.id)
+
+
+def budgets_statement(user_id, start_date=None, end_date=None):
+    """Budgets overlapping [start_date, end_date]."""
+    statement = select(*[getattr(Budget, c) for c in BUDGET_COLUMNS]).where(Budget.user_id == user_id)
+    if start_date:
+        statement = statement.where(Budget.end_date >= start_date)
+    if end_date:
+        statement = statement.where(Budget.start_date <= end_date)
+    return statement.order_by(Budget.start_date, Budget.id)
+
+
+def partitions(statement):
+    """Yields lists of row tuples from a server-side cursor."""
+    result = db.session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    for partition in result.partitions():
+        yield partition
+
+
+def pyarrow_available():
+    try:
+        import pyarrow # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# --- Encoders ---
+
+def csv_chunks(columns, row_partitions):
+    money = columns.index('amount_cents')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['amount' if c == 'amount_cents' else c for c in columns])
+    for rows in row_partitions:
+        writer.writerows(row[:money] + (format_cents(row[money]),) + row[money + 1:] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+
+    types = {
+        'int64': pa.int64(), 'date32': pa.date32(),
+        'timestamp': pa.timestamp('us'), 'string': pa.string(),
+    }
+    return pa.schema([(c, types[ARROW_TYPES.get(c, 'string')]) for c in columns])
+
+
+def _record_batches(schema, row_partitions):
+    import pyarrow as pa
+
+    for rows in row_partitions:
+        # Transpose the partition into columns; no per-row dicts
+        arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+class _DrainSink:
+    """Write-only file object whose written bytes can be handed out incrementally."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def arrow_chunks(columns, row_partitions):
+    """Arrow IPC stream, one record batch per partition."""
+    import pyarrow as pa
+
+    schema = _arrow_schema(columns)
+    sink = _DrainSink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode='w'), schema)
+    for batch in _record_batches(schema, row_partitions):
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def parquet_chunks(columns, row_partitions):
+    """Parquet file, one row group per partition."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _arrow_schema(columns)
+    sink = _DrainSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode='w'), schema)
+    for batch in _record_batches(schema, row_partitions):
+        writer.write_table(pa.Table.from_batches([batch], schema=schema))
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+ENCODERS = {'csv': csv_chunks, 'arrow': arrow_chunks, 'parquet': parquet_chunks}
+
+
+def export_chunks(fmt, columns, statement):
+    return ENCODERS[fmt](columns, partitions(statement))
@@ -0,0 +1,276 @@
+import csv
+import io
+import re
+import time
+from collections import Counter
+from datetime import date, datetime
+from sqlalchemy import insert, select
+from backend.database import db
+from backend.models import Transaction
+from backend import rollups, timeseries, categorization, sync
+from backend.money import to_cents
+
+# Bulk statement import.
+#
+# Parsers stream (row_number, record) pairs out of an uploaded file, where a record
+# holds the raw string fields. `import_transactions` validates them with
+# pre-compiled patterns, skips rows already stored, and inserts the rest with one
+# executemany per batch, committing every few batches instead of once per row.
+# A row duplicates another with the same date, type, amount and description.
+# Stored rows are fetched per date through the (user_id, type, date) index and
+# counted in memory, so no extra index has to be maintained on every insert.
+# Duplicates are counted as a multiset: a file listing the same purchase twice
+# imports it twice (reported as duplicates_in_file), and importing that file again
+# skips both rows.
+
+IMPORT_BATCH_SIZE = 1000
+BATCHES_PER_COMMIT = 10
+MAX_REPORTED_ERRORS = 100
+DEFAULT_CATEGORY = categorization.UNCATEGORIZED # replaced by the user's categorizer where it is confident
+FORMATS = ('csv', 'ofx', 'qif')
+
+ISO_DATE = re.compile(r'^\s*(\d{4})-(\d{1,2})-(\d{1,2})\s*$')
+OFX_DATE = re.compile(r'^\s*(\d{4})(\d{2})(\d{2})')
+US_DATE = re.compile(r"^\s*(\d{1,2})/(\d{1,2})['/](\d{2,4})\s*$")
+AMOUNT_NOISE = re.compile(r'[\s$€£]')
+GROUPED_AMOUNT = re.compile(r'^[-+(]?\d{1,3}(,\d{3})+\)?$') # "1,234" or "(12,345,678)": thousands separators only
+OFX_TAG = re.compile(r'<(/?\w+)>([^<\r\n]*)')
+
+
+def detect_format(filename):
+    extension = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else 'csv'
+    return extension if extension in FORMATS else 'csv'
+
+
+# --- Parsers ---
+
+def parse_csv(stream):
+    """CSV with a header row: date, description, amount and optional type, category."""
+    reader = csv.DictReader(stream)
+    if reader.fieldnames:
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    for row in reader:
+        # DictReader counts the header as line 1
+        yield reader.line_num, row
+
+
+def parse_ofx(stream):
+    """OFX/SGML statements: one record per <STMTTRN> block."""
+    record = None
+    count = 0
+    for line in stream:
+        for tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == 'STMTTRN':
+                record = {}
+            elif tag == '/STMTTRN' and record is not None:
+                count += 1
+                yield count, {
+                    'date': record.get('DTPOSTED', ''),
+                    'amount': record.get('TRNAMT', ''),
+                    'description': record.get('NAME') or record.get('MEMO', ''),
+                }
+                record = None
+            elif record is not None and not tag.startswith('/'):
+                record[tag] = value.strip()
+
+
+QIF_FIELDS = {'D': 'date', 'T': 'amount', 'U': 'amount', 'P': 'description', 'M': 'memo', 'L': 'category'}
+
+def parse_qif(stream):
+    """QIF: one field per line keyed by its first letter, records terminated by '^'."""
+    record = {}
+    count = 0
+    for line in stream:
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('!'):
+            continue
+        if line.startswith('^'):
+            if record:
+                count += 1
+                if not record.get('description'):
+                    record['description'] = record.get('memo', '')
+                yield count, record
+            record = {}
+        elif line[0] in QIF_FIELDS:
+            record.setdefault(QIF_FIELDS[line[0]], line[1:].strip())
+
+
+PARSERS = {'csv': parse_csv, 'ofx': parse_ofx, 'qif': parse_qif}
+
+
+# --- Validation ---
+
+def parse_any_date(value):
+    match = ISO_DATE.match(value) or OFX_DATE.match(value)
+    if match:
+        return date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    match = US_DATE.match(value)
+    if match:
+        year = int(match.group(3))
+        if year < 100:
+            year += 2000
+        return date(year, int(match.group(1)), int(match.group(2)))
+    raise ValueError(f"Unrecognized date '{value}'")
+
+
+def normalize(record):
+    """
+    Turns a raw record into Transaction column values. Without a type column the
+    amount's sign decides: negative amounts are expenses, positive ones income.
+    Raises ValueError describing the first invalid field.
+    """
+    description = (record.get('description') or '').strip()
+    if not description:
+        raise ValueError("Missing description")
+    raw_amount = AMOUNT_NOISE.sub('', record.get('amount') or '')
+    if ',' in raw_amount:
+        # "1,234.50" and "1,234" have thousands separators; "12,50" may be a decimal comma, so refuse to guess
+        if '.' not in raw_amount and not GROUPED_AMOUNT.match(raw_amount):
+            raise ValueError(f"Ambiguous amount '{record.get('amount')}': use '.' as the decimal point")
+        raw_amount = raw_amount.replace(',', '')
+    if raw_amount.startswith('(') and raw_amount.endswith(')'):
+        raw_amount = '-' + raw_amount[1:-1]
+    try:
+        amount = to_cents(raw_amount)
+    except ValueError:
+        raise ValueError(f"Invalid amount '{record.get('amount')}'")
+
+    type_ = (record.get('type') or '').strip().lower()
+    if not type_:
+        type_ = 'expense' if amount < 0 else 'income'
+    elif type_ not in ('income', 'expense'):
+        raise ValueError(f"Invalid type '{type_}'")
+
+    return {
+        'description': description[:200],
+        'amount_cents': abs(amount),
+        'type': type_,
+        'category': (record.get('category') or '').strip()[:100] or DEFAULT_CATEGORY,
+        'date': parse_any_date(record.get('date') or ''),
+    }
+
+
+def dedup_key(values):
+    return (values['date'], values['type'], values['amount_cents'], values['description'])
+
+
+def _load_existing_keys(user_id, batch, stored, loaded_dates):
+    """
+    Counts the dedup keys of the user's stored rows into `stored` for every date in
+    the batch not loaded yet, so each date is fetched once per import through the
+    (user_id, type, date) index.
+    """
+    dates = {values['date'] for values in batch} - loaded_dates
+    if not dates:
+        return
+    existing = db.session.execute(select(
+        Transaction.date, Transaction.type, Transaction.amount_cents, Transaction.description
+    ).where(
+        Transaction.user_id == user_id,
+        Transaction.type.in_(('income', 'expense')),
+        Transaction.date.in_(dates)
+    ))
+    stored.update(tuple(row) for row in existing)
+    loaded_dates.update(dates)
+
+
+# --- Import ---
+
+def _flush(user_id, batch, stored, in_file, loaded_dates, result, dry_run):
+    _load_existing_keys(user_id, batch, stored, loaded_dates)
+    fresh = []
+    for values in batch:
+        key = dedup_key(values)
+        if in_file[key]:
+            result['duplicates_in_file'] += 1
+        in_file[key] += 1
+        if stored[key]:
+            # Each stored row absorbs one matching row of the file
+            stored[key] -= 1
+            result['duplicates'] += 1
+            continue
+        values['user_id'] = user_id
+        values['timestamp'] = datetime.utcnow()
+        fresh.append(values)
+    categorizer = categorization.for_user(user_id) if fresh else None
+    for values in fresh:
+        if values['category'] == DEFAULT_CATEGORY:
+            found = categorizer.categorize(values['description'])
+            if found is not None:
+                values['category'] = found[0]
+                result['categorized'] += 1
+    if not fresh or dry_run:
+        result['imported'] += len(fresh)
+        return
+
+    change_seq = sync.seq(user_id)
+    for values in fresh:
+        values['change_seq'] = change_seq
+    db.session.execute(insert(Transaction.__table__), fresh)
+
+    # One rollup upsert per touched bucket rather than per row
+    deltas = {}
+    for values in fresh:
+        bucket = (values['date'].replace(day=1), values['type'], values['category'])
+        total, count = deltas.get(bucket, (0, 0))
+        deltas[bucket] = (total + values['amount_cents'], count + 1)
+    for (month, type_, category), (total, count) in deltas.items():
+        rollups.apply_delta(user_id, month, type_, category, total, count)
+    for values in fresh:
+        timeseries.record_delta(user_id, values['date'], values['type'], values['amount_cents'])
+    result['imported'] += len(fresh)
+
+
+def import_transactions(user_id, stream, fmt='csv', dry_run=False):
+    """
+    Imports a statement from a text stream. Returns a report with imported,
+    duplicate (already stored), in-file repeat and error counts, per-row errors
+    and throughput.
+    Rows are committed every BATCHES_PER_COMMIT batches; on an unexpected error
+    the uncommitted batches are rolled back and the error propagates.
+    """
+    started = time.perf_counter()
+    result = {'format': fmt, 'rows': 0, 'imported': 0, 'duplicates': 0, 'duplicates_in_file': 0, 'categorized': 0,
+              'error_count': 0, 'errors': []}
+    stored = Counter() # dedup keys of rows stored before this import, loaded per date
+    in_file = Counter() # dedup keys of the rows read so far
+    loaded_dates = set()
+    batch = []
+    batches = 0
+
+    try:
+        for row_number, record in PARSERS[fmt](stream):
+            result['rows'] += 1
+            try:
+                batch.append(normalize(record))
+            except ValueError as e:
+                result['error_count'] += 1
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append({'row': row_number, 'message': str(e)})
+                continue
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                _flush(user_id, batch, stored, in_file, loaded_dates, result, dry_run)
+                batch = []
+                batches += 1
+                if batches % BATCHES_PER_COMMIT == 0 and not dry_run:
+                    db.session.commit()
+        if batch:
+            _flush(user_id, batch, stored, in_file, loaded_dates, result, dry_run)
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    elapsed = time.perf_counter() - started
+    result['elapsed_seconds'] = round(elapsed, 3)
+    result['rows_per_second'] = round(result['rows'] / elapsed, 1) if elapsed else None
+    return result
+
+
+def open_text(binary_stream):
+    """Wraps an uploaded binary file for line-by-line decoding (BOM-tolerant)."""
+    return io.TextIOWrapper(binary_stream, encoding='utf-8-sig', errors='replace', newline='')
@@ -0,0 +1,246 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
+from backend.database import db
+from backend.models import Transaction, User, UserInsights
+from backend.money import cents_to_float
+from backend.sharding import shard_router
+
+try:
+    import numpy as np
+except ImportError: # optional; insights need it, the rest of the app does not
+    np = None
+
+# Spending insights, computed per user with vectorized NumPy over their expenses.
+#
+# A year of a user's expense rows is loaded once as column arrays (day, category
+# code, cents). From those:
+# - a (category x month) matrix of totals from one bincount gives each category's
+#   rolling baseline (mean of the last BASELINE_MONTHS complete months) and its
+#   month-over-month trend (least-squares slope over TREND_MONTHS complete months);
+# - the end-of-month forecast adds the baseline daily rate for the days left to
+#   the month-to-date spend;
+# - unusual transactions are flagged with a modified z-score of log amounts
+#   against their category's median and MAD (robust to the skew of spending),
+#   using grouped medians from sorted arrays.
+# Results are stored as JSON in UserInsights: the batch job scores every user in
+# a process pool, and the endpoint computes on demand when a stored result is
+# missing or from a previous (UTC) day, on the primary bind.
+
+LOOKBACK_DAYS = 365
+BASELINE_MONTHS = 3
+TREND_MONTHS = 6
+ANOMALY_WINDOW_DAYS = 90 # Only recent transactions are reported as anomalies
+ANOMALY_THRESHOLD = 3.5 # Modified z-score above which a transaction is unusual
+MIN_CATEGORY_HISTORY = 8 # Transactions a category needs before outliers are flagged
+MAX_ANOMALIES = 50
+BATCH_CHUNK_SIZE = 50 # Users per process-pool task
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def numpy_available():
+    return np is not None
+
+
+def _months_since_epoch(days):
+    """Days since 1970-01-01 -> months since 1970-01."""
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+
+def load_expenses(user_id, start_date, end_date):
+    """A user's expenses from start_date to end_date as column arrays plus category names and descriptions."""
+    rows = db.session.execute(select(
+        Transaction.id, Transaction.date, Transaction.category, Transaction.amount_cents, Transaction.description
+    ).where(
+        Transaction.user_id == user_id,
+        Transaction.type == 'expense',
+        Transaction.date >= start_date,
+        Transaction.date <= end_date # future-dated rows would fall outside the month matrix
+    ).order_by(Transaction.date, Transaction.id)).all()
+
+    count = len(rows)
+    ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=count)
+    days = np.fromiter((r[1].toordinal() - EPOCH_ORDINAL for r in rows), dtype=np.int64, count=count)
+    names, codes = np.unique(np.array([r[2] for r in rows], dtype=object), return_inverse=True) \
+        if count else (np.array([], dtype=object), np.array([], dtype=np.int64))
+    cents = np.fromiter((r[3] for r in rows), dtype=np.int64, count=count)
+    descriptions = [r[4] for r in rows]
+    return ids, days, codes.astype(np.int64), names, cents, descriptions
+
+
+def _grouped_median(codes, values, n_groups):
+    """Median of `values` within each group code (NaN for empty groups), without a Python loop."""
+    order = np.lexsort((values, codes))
+    sorted_values = values[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    medians = np.full(n_groups, np.nan)
+    present = counts > 0
+    lo = starts[present] + (counts[present] - 1) // 2
+    hi = starts[present] + counts[present] // 2
+    medians[present] = (sorted_values[lo] + sorted_values[hi]) / 2
+    return medians, counts
+
+
+def _anomalies(ids, days, codes, names, cents, descriptions, today_days):
+    n_groups = len(names)
+    logs = np.log1p(cents.astype(np.float64))
+    median, counts = _grouped_median(codes, logs, n_groups)
+    deviation = np.abs(logs - median[codes])
+    mad, _ = _grouped_median(codes, deviation, n_groups)
+    # Where more than half the amounts are identical the MAD is 0; fall back to the mean deviation
+    mean_dev = np.bincount(codes, weights=deviation, minlength=n_groups) / np.maximum(counts, 1)
+    scale = np.where(mad > 0, mad / 0.6745, mean_dev * 1.2533)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = (logs - median[codes]) / scale[codes]
+    flagged = (
+        (counts[codes] >= MIN_CATEGORY_HISTORY) & (scale[codes] > 0)
+        & (score > ANOMALY_THRESHOLD) & (days > today_days - ANOMALY_WINDOW_DAYS)
+    )
+    picked = np.flatnonzero(flagged)
+    picked = picked[np.argsort(-score[picked], kind='stable')][:MAX_ANOMALIES]
+    return [{
+        "transaction_id": int(ids[i]),
+        "date": date.fromordinal(int(days[i]) + EPOCH_ORDINAL).isoformat(),
+        "description": descriptions[i],
+        "category": names[codes[i]],
+        "amount": cents_to_float(int(cents[i])),
+        "typical_amount": cents_to_float(int(round(np.expm1(median[codes[i]])))),
+        "score": round(float(score[i]), 2),
+    } for i in picked]
+
+
+def compute(user_id, today=None):
+    """The insights payload for one user as of `today`. Needs an app context and NumPy."""
+    today = today or datetime.utcnow().date()
+    ids, days, codes, names, cents, descriptions = load_expenses(user_id, today - timedelta(days=LOOKBACK_DAYS), today)
+    n_categories = len(names)
+    today_days = today.toordinal() - EPOCH_ORDINAL
+    months = TREND_MONTHS + 1 # the complete months plus the current one
+
+    # (category x month) totals; column -1 is the current month
+    age = _months_since_epoch(np.array([today_days]))[0] - _months_since_epoch(days)
+    recent = age < months
+    monthly = np.bincount(
+        codes[recent] * months + (months - 1 - age[recent]), weights=cents[recent], minlength=n_categories * months
+    ).reshape(n_categories, months)
+    complete, month_to_date = monthly[:, :-1], monthly[:, -1]
+
+    baseline = complete[:, -BASELINE_MONTHS:].mean(axis=1)
+    x = np.arange(TREND_MONTHS) - (TREND_MONTHS - 1) / 2
+    slope = (complete - complete.mean(axis=1, keepdims=True)) @ x / (x @ x)
+
+    month_start = today.replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    baseline_start = month_start
+    for _ in range(BASELINE_MONTHS):
+        baseline_start = (baseline_start - timedelta(days=1)).replace(day=1)
+    daily_rate = complete[:, -BASELINE_MONTHS:].sum(axis=1) / (month_start - baseline_start).days
+    days_left = (next_month - today).days - 1 # today's spending is already in month_to_date
+    forecast = month_to_date + daily_rate * days_left
+
+    def money(values):
+        return [cents_to_float(int(round(v))) for v in values]
+
+    categories = [{
+        "category": name,
+        "month_to_date": mtd,
+        "baseline": base,
+        "trend_per_month": trend,
+        "forecast": projected,
+        "forecast_vs_baseline": round(projected / base - 1, 3) if base else None,
+    } for name, mtd, base, trend, projected in zip(
+        names, money(month_to_date), money(baseline), money(slope), money(forecast)
+    )]
+    categories.sort(key=lambda c: (-c['baseline'], c['category']))
+
+    total_baseline = cents_to_float(int(round(baseline.sum())))
+    total_forecast = cents_to_float(int(round(forecast.sum())))
+    return {
+        "as_of": today.isoformat(),
+        "total": {
+            "month_to_date": cents_to_float(int(month_to_date.sum())),
+            "baseline": total_baseline,
+            "trend_per_month": cents_to_float(int(round(slope.sum()))),
+            "forecast": total_forecast,
+            "forecast_vs_baseline": round(total_forecast / total_baseline - 1, 3) if total_baseline else None,
+        },
+        "categories": categories,
+        "anomalies": _anomalies(ids, days, codes, names, cents, descriptions, today_days) if len(ids) else [],
+    }
+
+
+def encode(payload):
+    """Compact, key-sorted JSON: the bytes jsonify would produce, minus its trailing newline."""
+    return json.dumps(payload, sort_keys=True, separators=(',', ':'))
+
+
+def store(user_id, payload, computed_at=None):
+    """Saves a user's payload. Does not commit; the caller does."""
+    db.session.merge(UserInsights(
+        user_id=user_id, as_of=date.fromisoformat(payload['as_of']),
+        computed_at=computed_at or datetime.utcnow(), payload=encode(payload)
+    ))
+
+
+def refresh(user_id):
+    """Computes, stores and commits one user's insights. Returns the payload."""
+    payload = compute(user_id)
+    store(user_id, payload)
+    db.session.commit()
+    return payload
+
+
+# --- Batch mode ---
+
+def _compute_on_shard(user_id, today):
+    with shard_router.for_user(user_id):
+        return compute(user_id, today)
+
+
+_worker_app = None
+
+
+def _init_worker():
+    global _worker_app
+    from backend.app import create_app
+
+    _worker_app = create_app()
+
+
+def _compute_chunk(user_ids, today):
+    with _worker_app.app_context():
+        return [(user_id, _compute_on_shard(user_id, today)) for user_id in user_ids]
+
+
+def compute_all(user_ids=None, workers=None, today=None, progress=None):
+    """
+    Scores every user (or `user_ids`) in a pool of `workers` processes and stores the
+    results from this process, committing per chunk. Needs an app context.
+    Returns the number of users scored.
+    """
+    today = today or datetime.utcnow().date()
+    if user_ids is None:
+        user_ids = [user_id for (user_id,) in db.session.execute(select(User.id).order_by(User.id))]
+    chunks = [user_ids[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(user_ids), BATCH_CHUNK_SIZE)]
+
+    def save(results):
+        computed_at = datetime.utcnow()
+        for user_id, payload in results:
+            with shard_router.for_user(user_id):
+                store(user_id, payload, computed_at)
+                db.session.flush()
+        db.session.commit()
+        if progress:
+            progress(len(results))
+
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            save([(user_id, _compute_on_shard(user_id, today)) for user_id in chunk])
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for results in pool.map(_compute_chunk, chunks, [today] * len(chunks)):
+                save(results)
+    return len(user_ids)
@@ -0,0 +1,278 @@
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from flask import g, request, has_request_context
+from sqlalchemy import event
+
+# Request and SQL instrumentation, exposed in Prometheus text format at /metrics.
+#
+# Each request records its latency, status and response size under its endpoint.
+# SQLAlchemy cursor events time every statement; statements slower than
+# METRICS_SLOW_QUERY_MS and SQL repeated METRICS_N_PLUS_ONE_THRESHOLD or more
+# times in one request (the N+1 pattern: one query per row of an earlier result)
+# are counted and logged with the endpoint that issued them.
+#
+# With PROFILING_ENABLED set, a request carrying `X-Profile: 1` runs under
+# cProfile and its response is replaced by a plain-text report: the top functions
+# by cumulative time plus the SQL it ran. The original status is returned in
+# X-Profiled-Status. Streamed bodies are generated after the profiler stops.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10) # seconds
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000) # bytes
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+PROFILE_TOP = 40 # Functions listed in a profile report
+
+# The request the ASGI read path (backend/asgi.py) is serving in this context:
+# {'endpoint', 'started', 'statements'}. Flask requests keep theirs on `g`
+_async_request = ContextVar('metrics_async_request', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counters:
+
+    def __init__(self, name, help_text, label_names):
+        self.name, self.help_text, self.label_names = name, help_text, label_names
+        self.values = Counter()
+
+    def inc(self, labels, amount=1):
+        self.values[labels] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name, self.help_text, self.label_names, self.buckets = name, help_text, label_names, buckets
+        self.series = {} # labels -> [count per bucket..., sum, count]
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, series):
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {round(series[-2], 6)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """A value read when /metrics is rendered, e.g. a queue's current depth."""
+
+    def __init__(self, name, help_text, read):
+        self.name, self.help_text, self.read = name, help_text, read
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {self.read()}"]
+
+
+class Instrumentation:
+
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.slow_query_seconds = 0.1
+        self.n_plus_one_threshold = 10
+        self.profiling = False
+        self.logger = None
+        self.enabled = False
+        self.requests = Counters('pfm_http_requests_total', 'Requests by endpoint, method and status.',
+                                 ('endpoint', 'method', 'status'))
+        self.latency = Histogram('pfm_http_request_duration_seconds', 'Request latency until the response is returned.',
+                                 ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.size = Histogram('pfm_http_response_size_bytes', 'Response body size (unstreamed responses).',
+                              ('endpoint', 'method'), SIZE_BUCKETS)
+        self.queries = Histogram('pfm_db_queries_per_request', 'SQL statements executed per request.',
+                                 ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.query_latency = Histogram('pfm_db_query_duration_seconds', 'Duration of each SQL statement.',
+                                       ('endpoint',), LATENCY_BUCKETS)
+        self.slow_queries = Counters('pfm_db_slow_queries_total', 'Statements slower than the slow query threshold.',
+                                     ('endpoint',))
+        self.n_plus_one = Counters('pfm_db_n_plus_one_total', 'Requests that repeated one statement past the N+1 threshold.',
+                                   ('endpoint',))
+        self.extra = [] # metrics other modules publish through `register`
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Hooks into the app's requests and every engine, and adds the /metrics route. Needs `db.init_app` first."""
+        from backend.database import db
+
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        self.slow_query_seconds = app.config.get('METRICS_SLOW_QUERY_MS', 100) / 1000
+        self.n_plus_one_threshold = app.config.get('METRICS_N_PLUS_ONE_THRESHOLD', self.n_plus_one_threshold)
+        self.profiling = app.config.get('PROFILING_ENABLED', False)
+        self.logger = app.logger
+        self.enabled = True
+
+        with app.app_context():
+            for engine in db.engines.values():
+                self.instrument_engine(engine)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view, methods=['GET'])
+
+    def register(self, *metrics):
+        """Adds Counters, Histograms or Gauges to /metrics. Update them under `self.lock`."""
+        with self.lock:
+            self.extra.extend(metric for metric in metrics if metric not in self.extra)
+
+    # --- SQL ---
+
+    def instrument_engine(self, engine):
+        """Times every statement run on `engine` (for an async engine, pass its sync_engine)."""
+        event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(engine, 'handle_error', self._handle_error)
+
+    # Start times are keyed by execution context, so a statement that raises (and
+    # never reaches after_cursor_execute) is dropped in handle_error rather than
+    # left behind on the pooled connection.
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', {})[context] = time.perf_counter()
+
+    def _handle_error(self, exception_context):
+        conn = exception_context.connection
+        if conn is not None:
+            conn.info.get('query_started', {}).pop(exception_context.execution_context, None)
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_started'].pop(context)
+        in_request = has_request_context() and 'metrics_started' in g
+        async_request = None if in_request else _async_request.get()
+        if in_request:
+            endpoint = request.endpoint or 'unmatched'
+        else:
+            endpoint = async_request['endpoint'] if async_request is not None else 'none'
+        with self.lock:
+            self.query_latency.observe((endpoint,), elapsed)
+            if elapsed >= self.slow_query_seconds:
+                self.slow_queries.inc((endpoint,))
+        if elapsed >= self.slow_query_seconds:
+            self.logger.warning("Slow query (%.1f ms) in %s: %s", elapsed * 1000, endpoint, statement[:500])
+        if in_request:
+            g.metrics_statements[statement] += 1
+            g.metrics_sql_seconds += elapsed
+        elif async_request is not None:
+            async_request['statements'][statement] += 1
+
+    # --- Requests ---
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_statements = Counter()
+        g.metrics_sql_seconds = 0.0
+        if self.profiling and request.headers.get('X-Profile') in ('1', 'true'):
+            g.metrics_profiler = cProfile.Profile()
+            g.metrics_profiler.enable()
+
+    def _finish_request(self, response):
+        if 'metrics_started' not in g or request.endpoint == 'metrics':
+            return response
+        elapsed = time.perf_counter() - g.metrics_started
+        profiler = g.pop('metrics_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+        size = None if response.is_streamed else response.calculate_content_length()
+        self.observe_request(request.endpoint or 'unmatched', request.method, response.status_code,
+                             elapsed, size, g.metrics_statements)
+
+        if profiler is not None:
+            return self._profile_response(response, profiler, elapsed)
+        return response
+
+    def observe_request(self, endpoint, method, status, elapsed, size, statements):
+        """Records one finished request; `size` is None for streamed bodies, `statements` a Counter of its SQL."""
+        repeated = [(sql, count) for sql, count in statements.items() if count >= self.n_plus_one_threshold]
+        with self.lock:
+            self.requests.inc((endpoint, method, str(status)))
+            self.latency.observe((endpoint, method), elapsed)
+            if size is not None:
+                self.size.observe((endpoint, method), size)
+            self.queries.observe((endpoint,), sum(statements.values()))
+            if repeated:
+                self.n_plus_one.inc((endpoint,))
+        for sql, count in repeated:
+            self.logger.warning("Possible N+1 in %s: statement ran %d times: %s", endpoint, count, sql[:500])
+
+    def start_async_request(self, endpoint):
+        """Starts timing a request served outside Flask by the ASGI read path. Returns a token, or None when disabled."""
+        if not self.enabled:
+            return None
+        return _async_request.set({'endpoint': endpoint, 'started': time.perf_counter(), 'statements': Counter()})
+
+    def finish_async_request(self, token, method, status, size):
+        if token is None:
+            return
+        current = _async_request.get()
+        _async_request.reset(token)
+        self.observe_request(current['endpoint'], method, status, time.perf_counter() - current['started'],
+                             size, current['statements'])
+
+    def _profile_response(self, response, profiler, elapsed):
+        from flask import current_app
+
+        statements = g.metrics_statements
+        out = io.StringIO()
+        out.write(f"{request.method} {request.full_path.rstrip('?')} -> {response.status_code} "
+                  f"in {elapsed * 1000:.1f} ms; {sum(statements.values())} SQL statements "
+                  f"taking {g.metrics_sql_seconds * 1000:.1f} ms\n\n")
+        for sql, count in statements.most_common():
+            out.write(f"{count:>5} x {' '.join(sql.split())[:300]}\n")
+        out.write("\n")
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_TOP)
+
+        report = current_app.response_class(out.getvalue(), mimetype='text/plain')
+        report.headers['X-Profiled-Status'] = str(response.status_code)
+        return report
+
+    # --- Exposition ---
+
+    def render(self):
+        with self.lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.size, self.queries, self.query_latency,
+                           self.slow_queries, self.n_plus_one, *self.extra):
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        from flask import current_app
+
+        return current_app.response_class(self.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+instrumentation = Instrumentation()
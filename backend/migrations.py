@@ -0,0 +1,102 @@
+from sqlalchemy import inspect, text
+from backend.database import db
+from backend.money import to_cents
+
+# One-off schema migrations for databases created by earlier versions.
+
+MIGRATION_BATCH_SIZE = 5000
+
+
+def _convert_amounts(conn, table):
+    """Fills amount_cents from the legacy float amount column, in id-ordered batches."""
+    last_id = 0
+    converted = 0
+    while True:
+        rows = conn.execute(text(
+            f'SELECT id, amount FROM "{table}" WHERE id > :last_id ORDER BY id LIMIT :limit'
+        ), {'last_id': last_id, 'limit': MIGRATION_BATCH_SIZE}).fetchall()
+        if not rows:
+            return converted
+        conn.execute(text(f'UPDATE "{table}" SET amount_cents = :cents WHERE id = :id'),
+                     [{'cents': to_cents(amount), 'id': row_id} for row_id, amount in rows])
+        converted += len(rows)
+        last_id = rows[-1][0]
+
+
+def migrate_money_to_cents():
+    """
+    Converts the float `amount` columns of transaction and budget to integer
+    `amount_cents`, then recreates and rebuilds the monthly rollups in cents.
+    Safe to run again: already-migrated tables are skipped. Returns {table: rows}.
+    """
+    from backend import rollups
+
+    inspector = inspect(db.engine)
+    tables = inspector.get_table_names()
+    migrated = {}
+    with db.engine.begin() as conn:
+        for table in ('transaction', 'budget'):
+            if table not in tables:
+                continue
+            columns = {column['name'] for column in inspector.get_columns(table)}
+            if 'amount' not in columns:
+                continue
+            if 'amount_cents' not in columns:
+                conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN amount_cents BIGINT NOT NULL DEFAULT 0'))
+            migrated[table] = _convert_amounts(conn, table)
+            conn.execute(text(f'ALTER TABLE "{table}" DROP COLUMN amount'))
+
+        if 'monthly_rollup' in tables:
+            columns = {column['name'] for column in inspector.get_columns('monthly_rollup')}
+            if 'total' in columns:
+                conn.execute(text('DROP TABLE monthly_rollup'))
+
+    db.create_all()
+    rollups.rebuild()
+    return migrated
+
+
+def add_change_seq(engine):
+    """
+    Adds the change_seq columns and their (user_id, change_seq) indexes that
+    /api/sync reads to the transaction and budget tables of one database. Existing
+    rows get 0 and reach clients through their first full sync. Returns the tables altered.
+    """
+    from backend.models import Transaction, Budget
+
+    altered = []
+    with engine.begin() as conn:
+        tables = inspect(conn).get_table_names()
+        for model in (Transaction, Budget):
+            table = model.__table__
+            if table.name not in tables:
+                continue
+            if 'change_seq' not in {column['name'] for column in inspect(conn).get_columns(table.name)}:
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN change_seq BIGINT NOT NULL DEFAULT 0'))
+                altered.append(table.name)
+            for index in table.indexes:
+                if index.name.endswith('_change_seq'):
+                    index.create(conn, checkfirst=True)
+    return altered
+
+
+def backfill_transaction_timestamps(engine):
+    """
+    Gives transactions without a timestamp midnight of their date, so every row
+    has a position in the keyset-paged listing. PostgreSQL then gets the NOT NULL
+    constraint; SQLite cannot add it in place, so there it only holds for new
+    databases. Returns the rows backfilled.
+    """
+    with engine.begin() as conn:
+        if 'transaction' not in inspect(conn).get_table_names():
+            return 0
+        if conn.dialect.name == 'postgresql':
+            filled = conn.execute(text(
+                'UPDATE "transaction" SET timestamp = CAST(date AS TIMESTAMP) WHERE timestamp IS NULL'
+            )).rowcount
+            conn.execute(text('ALTER TABLE "transaction" ALTER COLUMN timestamp SET NOT NULL'))
+        else:
+            filled = conn.execute(text(
+                """UPDATE "transaction" SET timestamp = date || ' 00:00:00.000000' WHERE timestamp IS NULL"""
+            )).rowcount
+    return filled
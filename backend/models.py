@@ -1,4 +1,5 @@
 from backend.database import db
+from backend.money import format_cents, cents_to_float
 from datetime import datetime
 
 # Assuming User model is already here:
@@ -9,41 +10,71 @@ class User(db.Model):
     transactions = db.relationship('Transaction', backref='user', lazy=True)
     budgets = db.relationship('Budget', backref='user', lazy=True) # NEW: Relationship to Budgets
 
+    # Both hash on the bounded auth pool and may raise AuthBusyError when it is saturated
     def set_password(self, password):
         from werkzeug.security import generate_password_hash # Import here to avoid circular
-        self.password_hash = generate_password_hash(password)
+        from backend.auth import token_auth
+        self.password_hash = token_auth.run_hash(generate_password_hash, password)
 
     def check_password(self, password):
         from werkzeug.security import check_password_hash # Import here to avoid circular
-        return check_password_hash(self.password_hash, password)
+        from backend.auth import token_auth
+        return token_auth.run_hash(check_password_hash, self.password_hash, password)
 
     def __repr__(self):
         return f'<User {self.email}>'
 
+# Revoked auth tokens, by token id, kept until the token would have expired anyway
+class RevokedToken(db.Model):
+    jti = db.Column(db.String(32), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<RevokedToken {self.jti}>'
+
+# Which shard holds a user's data (backend/sharding.py). Kept on the primary;
+# users without a row predate sharding and live on the 'default' shard.
+class ShardAssignment(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    shard = db.Column(db.String(32), nullable=False, index=True)
+    moving = db.Column(db.Boolean, nullable=False, default=False) # Writes are refused while set
+
+    def __repr__(self):
+        return f'<ShardAssignment {self.user_id} -> {self.shard}>'
+
 # Assuming Transaction model is already here:
 class Transaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(200), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount_cents = db.Column(db.BigInteger, nullable=False) # Integer minor units
     type = db.Column(db.String(50), nullable=False)
     category = db.Column(db.String(100), nullable=False)
     date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
-    timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, index=True, nullable=False, default=datetime.utcnow) # Keyset paging position
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0, server_default='0') # See backend/sync.py
+
+    # Composite indexes for the per-user access paths: reports and the summary
+    # filter on (user_id, type, date range), the listing orders by (timestamp, id),
+    # /api/sync reads rows changed after a sequence number.
+    __table_args__ = (
+        db.Index('ix_transaction_user_type_date', 'user_id', 'type', 'date'),
+        db.Index('ix_transaction_user_timestamp_id', 'user_id', 'timestamp', 'id'),
+        db.Index('ix_transaction_user_change_seq', 'user_id', 'change_seq'),
+    )
 
     def __repr__(self):
-        return f'<Transaction {self.description} - {self.amount}>'
+        return f'<Transaction {self.description} - {format_cents(self.amount_cents)}>'
 
     def to_dict(self):
         return {
             'id': self.id,
             'description': self.description,
-            'amount': self.amount,
+            'amount': cents_to_float(self.amount_cents),
             'type': self.type,
             'category': self.category,
             'date': self.date.isoformat() if self.date else None,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
-            'user_id': self.user_id
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None
         }
 
 # NEW: Budget Model
@@ -51,25 +82,108 @@ class Budget(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     category = db.Column(db.String(100), nullable=False)
-    amount = db.Column(db.Float, nullable=False)
+    amount_cents = db.Column(db.BigInteger, nullable=False) # Integer minor units
     start_date = db.Column(db.Date, nullable=False)
     end_date = db.Column(db.Date, nullable=False)
     timestamp = db.Column(db.DateTime, index=True, default=datetime.utcnow)
 
     # Foreign Key to link budgets to users
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    change_seq = db.Column(db.BigInteger, nullable=False, default=0, server_default='0') # See backend/sync.py
+
+    __table_args__ = (
+        db.Index('ix_budget_user_start_date', 'user_id', 'start_date'),
+        db.Index('ix_budget_user_change_seq', 'user_id', 'change_seq'),
+    )
 
     def __repr__(self):
-        return f'<Budget {self.category}: {self.amount} from {self.start_date} to {self.end_date}>'
+        return f'<Budget {self.category}: {format_cents(self.amount_cents)} from {self.start_date} to {self.end_date}>'
 
     def to_dict(self):
 
         return {
             'id': self.id,
             'category': self.category,
-            'amount': self.amount,
+            'amount': cents_to_float(self.amount_cents),
             'start_date': self.start_date.isoformat() if self.start_date else None,
             'end_date': self.end_date.isoformat() if self.end_date else None,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
-            'user_id': self.user_id
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None
+        }
+
+# Monthly rollup of transactions, maintained alongside every transaction
+# mutation so reports can read pre-aggregated sums instead of raw rows.
+class MonthlyRollup(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(50), nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+    total_cents = db.Column(db.BigInteger, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'type', 'year', 'month', 'category', name='uq_monthly_rollup_key'),
+    )
+
+    def __repr__(self):
+        return f'<MonthlyRollup {self.user_id} {self.year}-{self.month:02d} {self.type}/{self.category}: {format_cents(self.total_cents)}>'
+
+# A user's categorization rule: descriptions containing `pattern` (whole words,
+# case and accents ignored) get `category`. Higher priority wins; see backend/categorization.py.
+class CategoryRule(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    pattern = db.Column(db.String(200), nullable=False)
+    category = db.Column(db.String(100), nullable=False)
+    priority = db.Column(db.Integer, nullable=False, default=0)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<CategoryRule {self.pattern!r} -> {self.category}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'pattern': self.pattern,
+            'category': self.category,
+            'priority': self.priority,
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None
         }
+
+# A user's change counter for /api/sync (backend/sync.py). `seq` is the last
+# sequence number handed out; tokens older than `floor` need a full resync.
+class SyncState(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    seq = db.Column(db.BigInteger, nullable=False, default=0)
+    floor = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<SyncState {self.user_id} at {self.seq}>'
+
+# A deleted transaction or budget, kept so clients syncing later can drop it.
+class SyncTombstone(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    kind = db.Column(db.String(20), nullable=False) # 'transaction' or 'budget'
+    row_id = db.Column(db.Integer, nullable=False)
+    change_seq = db.Column(db.BigInteger, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.Index('ix_sync_tombstone_user_change_seq', 'user_id', 'change_seq'),
+    )
+
+    def __repr__(self):
+        return f'<SyncTombstone {self.kind} {self.row_id} at {self.change_seq}>'
+
+# Spending insights precomputed per user by backend/insights.py (batch job or
+# first request of the day) and served as stored JSON.
+class UserInsights(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    as_of = db.Column(db.Date, nullable=False) # Day the insights describe
+    computed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    payload = db.Column(db.Text, nullable=False) # Compact JSON, as served
+
+    def __repr__(self):
+        return f'<UserInsights {self.user_id} as of {self.as_of}>'
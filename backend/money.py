@@ -0,0 +1,37 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Money is stored as 64-bit integer minor units (cents). Amounts are converted
+# from user input with `to_cents` and back to major units only when serialized
+# (JSON numbers for the API, two-place strings in exports), so sums in SQL are
+# exact integer arithmetic.
+
+def to_cents(value):
+    """
+    Converts an amount (str, int, float or Decimal, in major units) to integer cents,
+    rounding half up. Floats go through their shortest repr so 0.285 becomes 29.
+    Raises ValueError for anything that is not a finite number.
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Invalid amount '{value}'")
+    if isinstance(value, float):
+        value = repr(value)
+    try:
+        amount = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount '{value}'")
+    if not amount.is_finite():
+        raise ValueError(f"Invalid amount '{value}'")
+    return int((amount * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def format_cents(cents):
+    """Integer cents to a decimal string with two places, e.g. 1250 -> '12.50'."""
+    if cents is None:
+        return None
+    units, minor = divmod(abs(int(cents)), 100)
+    return f"{'-' if cents < 0 else ''}{units}.{minor:02d}"
+
+
+def cents_to_float(cents):
+    """Integer cents to a float in major units, for numeric JSON fields."""
+    return (cents or 0) / 100
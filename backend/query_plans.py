@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, extract
+from backend.database import db
+from backend.models import Transaction, Budget, User, MonthlyRollup, SyncTombstone
+from backend import search, timeseries, rollups, exporters, batch
+from backend.services import missing_timestamps_statement
+
+# Representative statements for every hot endpoint query, kept in step with the
+# routes. `check_query_plans` runs EXPLAIN QUERY PLAN on each one and reports any
+# that make SQLite fall back to a full table/index scan. Each statement is
+# explained on the engine the app would run it on, so under
+# `shard_router.for_user` queries on sharded tables go to that user's shard.
+
+def endpoint_queries(user_id=1):
+    end_date = datetime.utcnow().date()
+    start_date = end_date - timedelta(days=6 * 30)
+    month = (extract('year', Transaction.date), extract('month', Transaction.date))
+    rollup_month = MonthlyRollup.year * 12 + MonthlyRollup.month - 1
+
+    return {
+        'auth.login': User.query.filter_by(email='user@example.com'),
+        'transactions.list': Transaction.query.filter_by(user_id=user_id)
+            .order_by(Transaction.timestamp.desc(), Transaction.id.desc()),
+        'transactions.list_by_type': Transaction.query.filter_by(user_id=user_id)
+            .filter(Transaction.type == 'expense')
+            .order_by(Transaction.timestamp.desc(), Transaction.id.desc()),
+        'transactions.get': Transaction.query.filter_by(id=1, user_id=user_id),
+        'transactions.missing_timestamps': missing_timestamps_statement(user_id),
+        'transactions.search': search.search_statement(user_id, 'groceries', {}),
+        'transactions.search_truncated': search.truncated_statement(user_id, 'groceries', {}),
+        'transactions.export': exporters.transactions_statement(user_id, start_date, end_date),
+        'transactions.batch': batch.buckets_statement(
+            batch.transaction_conditions(user_id, None, {'category': 'food', 'start_date': start_date.isoformat()})
+        ),
+        'transactions.summary': db.session.query(MonthlyRollup.type, func.sum(MonthlyRollup.total_cents)).filter(
+            MonthlyRollup.user_id == user_id
+        ).group_by(MonthlyRollup.type),
+        'dashboard': rollups.dashboard_statement(user_id, start_date, end_date),
+        'reports.rollup_months': db.session.query(
+            MonthlyRollup.year, MonthlyRollup.month, func.sum(MonthlyRollup.total_cents)
+        ).filter(
+            MonthlyRollup.user_id == user_id,
+            MonthlyRollup.type == 'expense',
+            rollup_month >= 0,
+            rollup_month <= 1
+        ).group_by(MonthlyRollup.year, MonthlyRollup.month),
+        'reports.edge_days': db.session.query(*month, func.sum(Transaction.amount_cents)).filter(
+            Transaction.user_id == user_id,
+            Transaction.type == 'expense',
+            Transaction.date >= start_date,
+            Transaction.date <= end_date
+        ).group_by(*month),
+        'reports.timeseries_index': timeseries.flow_statement(user_id),
+        'sync.transactions': db.session.query(Transaction.id).filter(
+            Transaction.user_id == user_id, Transaction.change_seq > 0
+        ).order_by(Transaction.change_seq, Transaction.id),
+        'sync.budgets': db.session.query(Budget.id).filter(
+            Budget.user_id == user_id, Budget.change_seq > 0
+        ).order_by(Budget.change_seq, Budget.id),
+        'sync.tombstones': db.session.query(SyncTombstone.kind, SyncTombstone.row_id).filter(
+            SyncTombstone.user_id == user_id, SyncTombstone.change_seq > 0
+        ).order_by(SyncTombstone.change_seq, SyncTombstone.id),
+        'budgets.list': Budget.query.filter_by(user_id=user_id).order_by(Budget.start_date.desc()),
+        'budgets.get': Budget.query.filter_by(id=1, user_id=user_id),
+        'budgets.export': exporters.budgets_statement(user_id, start_date, end_date),
+        'budgets.batch': db.session.query(func.count(Budget.id)).filter(
+            *batch.budget_conditions(user_id, None, {'category': 'food'})
+        ),
+        'budgets.progress': db.session.query(
+            Transaction.category, Transaction.date, func.sum(Transaction.amount_cents)
+        ).filter(
+            Transaction.user_id == user_id,
+            Transaction.type == 'expense',
+            Transaction.date >= start_date,
+            Transaction.date <= end_date,
+            Transaction.category.in_(['food', 'rent'])
+        ).group_by(Transaction.category, Transaction.date).order_by(Transaction.category, Transaction.date),
+    }
+
+
+def explain(query):
+    """Returns the EXPLAIN QUERY PLAN detail lines for an ORM query or statement."""
+    statement = getattr(query, 'statement', query)
+    engine = db.session.get_bind(clause=statement) # the current shard's engine for sharded tables
+    compiled = statement.compile(dialect=engine.dialect, compile_kwargs={'render_postcompile': True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup or ())
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def check_query_plans(user_id=1):
+    """
+    Explains every endpoint query. Returns {name: (plan_lines, ok)} where ok is
+    False if any step of the plan is a SCAN rather than an index SEARCH. Scans of
+    an FTS index, of a query's own subqueries and of the constant row of a bare
+    SELECT (e.g. SELECT EXISTS (...)) don't count.
+    """
+    results = {}
+    for name, query in endpoint_queries(user_id).items():
+        plan = explain(query)
+        ok = not any(line.startswith('SCAN') and 'VIRTUAL TABLE INDEX' not in line
+                     and not line.startswith(('SCAN anon_', 'SCAN CONSTANT ROW')) for line in plan)
+        results[name] = (plan, ok)
+    return results
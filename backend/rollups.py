@@ -0,0 +1,275 @@
+from datetime import date, timedelta
+from sqlalchemy import func, extract, and_, or_, case, literal, select, union_all
+from backend.database import db
+from backend.models import Transaction, MonthlyRollup
+
+# Incremental maintenance of the MonthlyRollup table.
+#
+# Every transaction mutation calls `record` inside the same DB transaction as the
+# change itself: +1 for the row as it now is, -1 for the row as it was. An update
+# that moves a transaction to another month/type/category therefore subtracts it
+# from the old bucket and adds it to the new one.
+
+
+def _upsert_statement():
+    table = MonthlyRollup.__table__
+    dialect = db.session.get_bind(MonthlyRollup).dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    stmt = insert(table)
+    return stmt.on_conflict_do_update(
+        index_elements=['user_id', 'type', 'year', 'month', 'category'],
+        set_={
+            'total_cents': table.c.total_cents + stmt.excluded.total_cents,
+            'count': table.c.count + stmt.excluded.count
+        }
+    )
+
+
+def _upsert(user_id, year, month, type_, category, amount_cents, count):
+    db.session.execute(_upsert_statement(), {
+        'user_id': user_id, 'year': year, 'month': month, 'type': type_, 'category': category,
+        'total_cents': amount_cents, 'count': count
+    })
+
+
+def apply_delta(user_id, txn_date, type_, category, amount_cents, count):
+    """Adds (amount_cents, count) to the rollup bucket the given transaction fields fall into."""
+    _upsert(user_id, txn_date.year, txn_date.month, type_, category, amount_cents, count)
+    if count < 0:
+        # Drop buckets that no longer hold any transactions.
+        MonthlyRollup.query.filter_by(
+            user_id=user_id, year=txn_date.year, month=txn_date.month, type=type_, category=category
+        ).filter(MonthlyRollup.count <= 0).delete(synchronize_session=False)
+
+
+def apply_deltas(user_id, deltas):
+    """
+    Applies {(month_start, type, category): (amount_cents, count)} for one user with a
+    single batched upsert, then drops the user's buckets left without transactions.
+    """
+    params = [
+        {'user_id': user_id, 'year': month.year, 'month': month.month, 'type': type_, 'category': category,
+         'total_cents': amount_cents, 'count': count}
+        for (month, type_, category), (amount_cents, count) in deltas.items() if amount_cents or count
+    ]
+    if not params:
+        return
+    db.session.execute(_upsert_statement(), params)
+    if any(p['count'] < 0 for p in params):
+        MonthlyRollup.query.filter(
+            MonthlyRollup.user_id == user_id, MonthlyRollup.count <= 0
+        ).delete(synchronize_session=False)
+
+
+def record(transaction, sign):
+    """Adds (sign=+1) or removes (sign=-1) a Transaction's contribution to its rollup bucket."""
+    apply_delta(transaction.user_id, transaction.date, transaction.type, transaction.category,
+                sign * transaction.amount_cents, sign)
+
+
+# --- Reads ---
+
+def _month_index(d):
+    return d.year * 12 + d.month - 1
+
+
+def full_month_span(start_date, end_date):
+    """
+    Returns (first, last, edges): the first and last calendar months (as month
+    indexes) lying entirely inside [start_date, end_date], plus the partial-month
+    date ranges at either end that must still be summed from raw rows.
+    If no whole month fits, first > last and the single edge is the full range.
+    """
+    first = _month_index(start_date) + (0 if start_date.day == 1 else 1)
+    last = _month_index(end_date) - (0 if (end_date + timedelta(days=1)).day == 1 else 1)
+    if first > last:
+        return first, last, [(start_date, end_date)]
+
+    edges = []
+    first_day = date(first // 12, first % 12 + 1, 1)
+    if start_date < first_day:
+        edges.append((start_date, first_day - timedelta(days=1)))
+    after_last = last + 1
+    after_last_day = date(after_last // 12, after_last % 12 + 1, 1)
+    if end_date >= after_last_day:
+        edges.append((after_last_day, end_date))
+    return first, last, edges
+
+
+def window_sum_statements(user_id, type_, start_date, end_date, by):
+    """
+    The statements `window_sums` runs: whole months inside the window from the rollup
+    table, the partial months at its edges from raw rows. Each yields (*key, total_cents).
+    """
+    first, last, edges = full_month_span(start_date, end_date)
+    statements = []
+
+    if first <= last:
+        month_index = MonthlyRollup.year * 12 + MonthlyRollup.month - 1
+        rollup_key = (MonthlyRollup.year, MonthlyRollup.month) if by == 'month' else (MonthlyRollup.category,)
+        statements.append(select(*rollup_key, func.sum(MonthlyRollup.total_cents)).where(
+            MonthlyRollup.user_id == user_id,
+            MonthlyRollup.type == type_,
+            month_index >= first,
+            month_index <= last
+        ).group_by(*rollup_key))
+
+    if edges:
+        raw_key = (extract('year', Transaction.date), extract('month', Transaction.date)) \
+            if by == 'month' else (Transaction.category,)
+        statements.append(select(*raw_key, func.sum(Transaction.amount_cents)).where(
+            Transaction.user_id == user_id,
+            Transaction.type == type_,
+            or_(*[and_(Transaction.date >= lo, Transaction.date <= hi) for lo, hi in edges])
+        ).group_by(*raw_key))
+
+    return statements
+
+
+def merge_window_sums(results, by):
+    """Adds up the row sets of `window_sum_statements` into {key: total_cents}."""
+    sums = {}
+    for rows in results:
+        for *key, total in rows:
+            key = tuple(int(k) for k in key) if by == 'month' else key[0]
+            sums[key] = sums.get(key, 0) + total
+    return sums
+
+
+def window_sums(user_id, type_, start_date, end_date, by):
+    """
+    Sums transaction amounts (in cents) of one type over [start_date, end_date], grouped by
+    'month' (keys are (year, month)) or 'category'. Whole months inside the window
+    come from the rollup table; the partial months at its edges from raw rows.
+    """
+    statements = window_sum_statements(user_id, type_, start_date, end_date, by)
+    return merge_window_sums([db.session.execute(stmt).all() for stmt in statements], by)
+
+
+def totals_statement(user_id):
+    """(type, total_cents) rows of a user's all-time totals, from the rollups."""
+    return select(MonthlyRollup.type, func.sum(MonthlyRollup.total_cents)).where(
+        MonthlyRollup.user_id == user_id
+    ).group_by(MonthlyRollup.type)
+
+
+def totals_by_type(user_id):
+    """All-time {type: total_cents} for a user, read straight from the rollups."""
+    rows = db.session.execute(totals_statement(user_id)).all()
+    return {type_: total for type_, total in rows}
+
+
+def dashboard_statement(user_id, start_date, end_date):
+    """
+    Everything the dashboard shows, as ONE statement using conditional aggregation:
+    all rollup buckets of the user (for all-time totals) UNION ALL the raw expense
+    rows of the partial edge months of the window, grouped by (year, month, category).
+
+    Returns rows of (year, month, category, income, expense, window_expense, window_rows)
+    in cents, where income/expense are all-time and window_* cover [start_date, end_date].
+    """
+    first, last, edges = full_month_span(start_date, end_date)
+    month_index = MonthlyRollup.year * 12 + MonthlyRollup.month - 1
+    in_window = and_(month_index >= first, month_index <= last) if first <= last else literal(False)
+
+    parts = [select(
+        MonthlyRollup.year.label('year'),
+        MonthlyRollup.month.label('month'),
+        MonthlyRollup.category.label('category'),
+        MonthlyRollup.type.label('type'),
+        MonthlyRollup.total_cents.label('amount'),
+        case((in_window, 1), else_=0).label('in_window'),
+        literal(1).label('in_totals')
+    ).where(MonthlyRollup.user_id == user_id)]
+    if edges:
+        parts.append(select(
+            extract('year', Transaction.date),
+            extract('month', Transaction.date),
+            Transaction.category,
+            Transaction.type,
+            Transaction.amount_cents,
+            literal(1),
+            literal(0)
+        ).where(
+            Transaction.user_id == user_id,
+            Transaction.type == 'expense',
+            or_(*[and_(Transaction.date >= lo, Transaction.date <= hi) for lo, hi in edges])
+        ))
+    rows = union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+
+    is_income = rows.c.type == 'income'
+    is_expense = rows.c.type == 'expense'
+    window_expense = and_(rows.c.in_window == 1, is_expense)
+    return select(
+        rows.c.year,
+        rows.c.month,
+        rows.c.category,
+        func.sum(case((and_(rows.c.in_totals == 1, is_income), rows.c.amount), else_=0)),
+        func.sum(case((and_(rows.c.in_totals == 1, is_expense), rows.c.amount), else_=0)),
+        func.sum(case((window_expense, rows.c.amount), else_=0)),
+        func.sum(case((window_expense, 1), else_=0))
+    ).group_by(rows.c.year, rows.c.month, rows.c.category)
+
+
+def dashboard_aggregates(user_id, start_date, end_date):
+    """Runs `dashboard_statement`."""
+    return db.session.execute(dashboard_statement(user_id, start_date, end_date)).all()
+
+
+# --- Rebuild / verify ---
+
+def _recomputed(user_id=None):
+    """{key: (total_cents, count)} recomputed from raw transactions."""
+    year = extract('year', Transaction.date)
+    month = extract('month', Transaction.date)
+    query = db.session.query(
+        Transaction.user_id, year, month, Transaction.type, Transaction.category,
+        func.sum(Transaction.amount_cents), func.count(Transaction.id)
+    )
+    if user_id is not None:
+        query = query.filter(Transaction.user_id == user_id)
+    rows = query.group_by(Transaction.user_id, year, month, Transaction.type, Transaction.category).all()
+    return {(uid, int(y), int(m), t, c): (total, count) for uid, y, m, t, c, total, count in rows}
+
+
+def _stored(user_id=None):
+    query = MonthlyRollup.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    return {(r.user_id, r.year, r.month, r.type, r.category): (r.total_cents, r.count) for r in query}
+
+
+def verify(user_id=None):
+    """
+    Compares the stored rollups against a from-scratch recomputation.
+    Returns a list of (key, stored, expected) tuples for every bucket that drifted.
+    """
+    expected = _recomputed(user_id)
+    stored = _stored(user_id)
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=str):
+        want = expected.get(key, (0, 0))
+        have = stored.get(key, (0, 0))
+        if have != want:
+            drift.append((key, have, want))
+    return drift
+
+
+def rebuild(user_id=None):
+    """Replaces the stored rollups with a fresh recomputation. Returns the bucket count."""
+    query = MonthlyRollup.query
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    query.delete(synchronize_session=False)
+
+    buckets = _recomputed(user_id)
+    db.session.add_all([
+        MonthlyRollup(user_id=uid, year=y, month=m, type=t, category=c, total_cents=total, count=count)
+        for (uid, y, m, t, c), (total, count) in buckets.items()
+    ])
+    db.session.commit()
+    return len(buckets)
@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from ..models import User
 from ..database import db
+from ..auth import token_auth, request_token, AuthBusyError
+from ..sharding import shard_router
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -17,12 +19,16 @@ def register():
         return jsonify({"message": "User with that email already exists"}), 409 # Conflict
 
     new_user = User(email=email)
-    new_user.set_password(password) # Hash the password
+    try:
+        new_user.set_password(password) # Hash the password
+    except AuthBusyError as e:
+        return jsonify({"message": str(e)}), 503, {"Retry-After": "1"}
 
     db.session.add(new_user)
+    db.session.flush() # Assigns the id the shard is chosen by
+    shard_router.assign(new_user.id)
     db.session.commit()
 
-    # In a real app, you might generate a JWT here after registration
     return jsonify({"message": "User registered successfully", "user_id": new_user.id}), 201
 
 @auth_bp.route('/login', methods=['POST'])
@@ -36,10 +42,22 @@ def login():
 
     user = User.query.filter_by(email=email).first()
 
-    if user is None or not user.check_password(password):
-        return jsonify({"message": "Invalid email or password"}), 401 # Unauthorized
+    try:
+        if user is None or not user.check_password(password):
+            return jsonify({"message": "Invalid email or password"}), 401 # Unauthorized
+    except AuthBusyError as e:
+        return jsonify({"message": str(e)}), 503, {"Retry-After": "1"}
 
-    # In a real app, generate and return a JWT token here
-    # For now, we'll return a dummy token.
-    # Frontend's api.js expects a 'token' field.
-    return jsonify({"message": "Login successful", "token": "your-jwt-token-here", "user": {"email": user.email}}), 200
\ No newline at end of file
+    # Signed token; frontend's api.js sends it back as "Authorization: Bearer <token>"
+    token = token_auth.issue_token(user.id)
+    return jsonify({"message": "Login successful", "token": token, "user": {"email": user.email}}), 200
+
+@auth_bp.route('/logout', methods=['POST'])
+def logout():
+    token = request_token()
+    if not token_auth.verify_token(token):
+        return jsonify({"message": "Authentication required"}), 401
+
+    token_auth.revoke_token(token)
+    db.session.commit()
+    return jsonify({"message": "Logged out"}), 200
\ No newline at end of file
@@ -1,17 +1,22 @@
-from flask import Blueprint, request, jsonify, make_response
+from flask import Blueprint, request, jsonify, make_response, Response, stream_with_context
 from flask_cors import cross_origin
 from backend.database import db
 from backend.models import Budget, User # Import Budget and User models
+from backend.services import parse_date
+from backend import exporters, budget_progress, batch, sync
+from backend.cache import response_cache
+from backend.auth import get_current_user_id
+from backend.money import to_cents
+from backend.serializers import BUDGET_JSON, json_response
 from datetime import datetime
 
 budget_bp = Blueprint('budget', __name__, url_prefix='/api/budgets')
 
-def get_current_user_id_placeholder():
-
-    return 1 
-
 @budget_bp.route('/', methods=['OPTIONS'])
 @budget_bp.route('/<int:budget_id>', methods=['OPTIONS'])
+@budget_bp.route('/export', methods=['OPTIONS'])
+@budget_bp.route('/progress', methods=['OPTIONS'])
+@budget_bp.route('/batch', methods=['OPTIONS'])
 @cross_origin(origins="http://localhost:3000", methods=['GET', 'POST', 'PUT', 'DELETE'], headers=['Content-Type', 'Authorization'])
 def options_handler():
     response = make_response()
@@ -21,18 +26,77 @@ def options_handler():
 @cross_origin(origins="http://localhost:3000")
 def get_budgets():
 
-    current_user_id = get_current_user_id_placeholder()
+    current_user_id = get_current_user_id()
     if not current_user_id:
         return jsonify({"message": "Authentication required"}), 401
 
-    budgets = Budget.query.filter_by(user_id=current_user_id).order_by(Budget.start_date.desc()).all()
-    return jsonify([b.to_dict() for b in budgets]), 200
+    if request.args.get('progress') in ('1', 'true'):
+        # Adds spent/remaining/status to every budget, computed in one sweep
+        budgets = Budget.query.filter_by(user_id=current_user_id).order_by(Budget.start_date.desc()).all()
+        return jsonify(budget_progress.budget_progress(current_user_id, budgets)), 200
+    rows = db.session.query(*BUDGET_JSON.columns).filter(
+        Budget.user_id == current_user_id
+    ).order_by(Budget.start_date.desc()).all()
+    return json_response(BUDGET_JSON.encode(rows))
+
+# --- Budget Progress ---
+@budget_bp.route('/progress', methods=['GET'])
+@cross_origin(origins="http://localhost:3000")
+@response_cache.cached(get_current_user_id)
+def get_budget_progress():
+    """
+    Spend vs. budget for all of the user's budgets, plus alerts for budgets that are
+    over or past `alert_threshold` (a fraction, default 0.8) of their amount.
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    try:
+        threshold = float(request.args.get('alert_threshold', budget_progress.DEFAULT_ALERT_THRESHOLD))
+    except ValueError:
+        return jsonify({"message": "alert_threshold must be a number"}), 400
+
+    try:
+        budgets = Budget.query.filter_by(user_id=current_user_id).order_by(Budget.start_date.desc()).all()
+        progress = budget_progress.budget_progress(current_user_id, budgets, threshold)
+        return jsonify({"budgets": progress, "alerts": budget_progress.alerts(progress)}), 200
+    except Exception as e:
+        return jsonify({"message": f"Error calculating budget progress: {str(e)}"}), 500
+
+# --- Export Budgets ---
+@budget_bp.route('/export', methods=['GET'])
+@cross_origin(origins="http://localhost:3000")
+def export_budgets():
+    """
+    Streams the user's budgets as `format=csv` (default), `arrow` or `parquet`.
+    start_date/end_date keep only budgets overlapping that range.
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exporters.FORMATS:
+        return jsonify({"message": f"Unsupported format '{fmt}'. Use one of: {', '.join(exporters.FORMATS)}"}), 400
+    if fmt != 'csv' and not exporters.pyarrow_available():
+        return jsonify({"message": f"The {fmt} format requires pyarrow to be installed on the server"}), 501
+    try:
+        start_date = parse_date(request.args['start_date']) if request.args.get('start_date') else None
+        end_date = parse_date(request.args['end_date']) if request.args.get('end_date') else None
+    except ValueError:
+        return jsonify({"message": "Invalid date format. Dates should be YYYY-MM-DD."}), 400
+
+    statement = exporters.budgets_statement(current_user_id, start_date, end_date)
+    chunks = exporters.export_chunks(fmt, exporters.BUDGET_COLUMNS, statement)
+    return Response(stream_with_context(chunks), mimetype=exporters.MIMETYPES[fmt],
+                    headers={"Content-Disposition": f"attachment; filename=budgets.{fmt}"})
 
 # --- Add a New Budget ---
 @budget_bp.route('/', methods=['POST'])
 @cross_origin(origins="http://localhost:3000")
 def add_budget():
-    current_user_id = get_current_user_id_placeholder()
+    current_user_id = get_current_user_id()
     if not current_user_id:
         return jsonify({"message": "Authentication required"}), 401
 
@@ -45,7 +109,7 @@ def add_budget():
         return jsonify({"message": "Missing required budget fields (category, amount, start_date, end_date)"}), 400
 
     try:
-        amount_float = float(data['amount'])
+        amount_cents = to_cents(data['amount'])
         start_date_obj = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
         end_date_obj = datetime.strptime(data['end_date'], '%Y-%m-%d').date()
 
@@ -54,13 +118,15 @@ def add_budget():
 
         new_budget = Budget(
             category=data['category'],
-            amount=amount_float,
+            amount_cents=amount_cents,
             start_date=start_date_obj,
             end_date=end_date_obj,
-            user_id=current_user_id
+            user_id=current_user_id,
+            change_seq=sync.seq(current_user_id)
         )
         db.session.add(new_budget)
         db.session.commit()
+        response_cache.bump_version(current_user_id)
         return jsonify({"message": "Budget added successfully", "budget": new_budget.to_dict()}), 201
     except ValueError:
         return jsonify({"message": "Invalid amount or date format. Dates should be YYYY-MM-DD."}), 400
@@ -73,7 +139,7 @@ def add_budget():
 @cross_origin(origins="http://localhost:3000")
 def update_budget(budget_id):
 
-    current_user_id = get_current_user_id_placeholder()
+    current_user_id = get_current_user_id()
     if not current_user_id:
         return jsonify({"message": "Authentication required"}), 401
 
@@ -89,7 +155,7 @@ def update_budget(budget_id):
         if 'category' in data:
             budget.category = data['category']
         if 'amount' in data:
-            budget.amount = float(data['amount'])
+            budget.amount_cents = to_cents(data['amount'])
         if 'start_date' in data and data['start_date']:
             budget.start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date()
         if 'end_date' in data and data['end_date']:
@@ -98,7 +164,9 @@ def update_budget(budget_id):
         if budget.start_date > budget.end_date:
             return jsonify({"message": "Start date cannot be after end date"}), 400
 
+        budget.change_seq = sync.seq(current_user_id)
         db.session.commit()
+        response_cache.bump_version(current_user_id)
         return jsonify({"message": "Budget updated successfully", "budget": budget.to_dict()}), 200
     except ValueError:
         db.session.rollback()
@@ -112,7 +180,7 @@ def update_budget(budget_id):
 @cross_origin(origins="http://localhost:3000")
 def delete_budget(budget_id):
 
-    current_user_id = get_current_user_id_placeholder()
+    current_user_id = get_current_user_id()
     if not current_user_id:
         return jsonify({"message": "Authentication required"}), 401
 
@@ -121,9 +189,50 @@ def delete_budget(budget_id):
         return jsonify({"message": "Budget not found or not authorized"}), 404
 
     try:
+        sync.record_deletes('budget', current_user_id, Budget.id == budget_id)
         db.session.delete(budget)
         db.session.commit()
+        response_cache.bump_version(current_user_id)
         return jsonify({"message": "Budget deleted successfully"}), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({"message": f"Error deleting budget: {str(e)}"}), 500
+
+# --- Bulk Update or Delete ---
+@budget_bp.route('/batch', methods=['POST'])
+@cross_origin(origins="http://localhost:3000")
+def batch_budgets():
+    """
+    Updates or deletes many budgets with one set-based statement, all or nothing.
+
+    Body: {"operation": "update" | "delete", "ids": [...] or "filter": {...}, "set": {...}}
+    - filter: category, and start_date/end_date matching budgets that overlap them
+    - set (updates only): category, amount, start_date, end_date
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"message": "No data provided"}), 400
+
+    try:
+        operation, ids, filters, changes = batch.parse_request(data, batch.BUDGET_FIELDS, batch.BUDGET_FILTERS)
+        conditions = batch.budget_conditions(current_user_id, ids, filters)
+        affected = batch.apply_budgets(current_user_id, operation, ids, conditions, changes)
+        db.session.commit()
+        response_cache.bump_version(current_user_id)
+        return jsonify({"message": f"Batch {operation} applied", "operation": operation, "affected": affected}), 200
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({"message": f"Invalid batch: {str(e)}"}), 400
+    except batch.MissingIdsError as e:
+        db.session.rollback()
+        return jsonify({"message": str(e), "missing_ids": e.ids}), 404
+    except batch.BatchConflictError as e:
+        db.session.rollback()
+        return jsonify({"message": str(e)}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Error applying batch: {str(e)}"}), 500
@@ -0,0 +1,171 @@
+from flask import Blueprint, request, jsonify, make_response
+from flask_cors import cross_origin
+from backend.database import db
+from backend.models import CategoryRule
+from backend import categorization
+from backend.cache import response_cache
+from backend.auth import get_current_user_id
+
+category_bp = Blueprint('categories', __name__, url_prefix='/api/categories')
+
+MAX_SUGGESTIONS = 1000 # descriptions per /suggest request
+
+@category_bp.route('/rules', methods=['OPTIONS'])
+@category_bp.route('/rules/<int:rule_id>', methods=['OPTIONS'])
+@category_bp.route('/suggest', methods=['OPTIONS'])
+@category_bp.route('/recategorize', methods=['OPTIONS'])
+@cross_origin(origins="http://localhost:3000", methods=['GET', 'POST', 'PUT', 'DELETE'], headers=['Content-Type', 'Authorization'])
+def options_handler():
+    response = make_response()
+    return response, 200
+
+# --- Rules ---
+@category_bp.route('/rules', methods=['GET'])
+@cross_origin(origins="http://localhost:3000")
+def get_rules():
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    rules = CategoryRule.query.filter_by(user_id=current_user_id).order_by(
+        CategoryRule.priority.desc(), CategoryRule.id
+    ).all()
+    return jsonify([rule.to_dict() for rule in rules]), 200
+
+def _rule_fields(data, partial=False):
+    """Validated rule columns from a request body. Raises ValueError on bad input."""
+    fields = {}
+    for name in ('pattern', 'category'):
+        if name in data or not partial:
+            value = (data.get(name) or '').strip()
+            if not value:
+                raise ValueError(f"'{name}' is required")
+            fields[name] = value
+    if 'pattern' in fields and not categorization.words(fields['pattern']):
+        raise ValueError("'pattern' must contain at least one word")
+    if 'priority' in data:
+        if not isinstance(data['priority'], int) or isinstance(data['priority'], bool):
+            raise ValueError("'priority' must be an integer")
+        fields['priority'] = data['priority']
+    return fields
+
+@category_bp.route('/rules', methods=['POST'])
+@cross_origin(origins="http://localhost:3000")
+def add_rule():
+    """Adds a rule: {"pattern": "whole foods", "category": "Groceries", "priority": 0}."""
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"message": "No data provided"}), 400
+    try:
+        rule = CategoryRule(user_id=current_user_id, **_rule_fields(data))
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        db.session.add(rule)
+        db.session.commit()
+        categorization.invalidate(current_user_id)
+        return jsonify({"message": "Rule added successfully", "rule": rule.to_dict()}), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Error adding rule: {str(e)}"}), 500
+
+@category_bp.route('/rules/<int:rule_id>', methods=['PUT'])
+@cross_origin(origins="http://localhost:3000")
+def update_rule(rule_id):
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    rule = CategoryRule.query.filter_by(id=rule_id, user_id=current_user_id).first()
+    if not rule:
+        return jsonify({"message": "Rule not found or unauthorized"}), 404
+
+    data = request.get_json()
+    if not data:
+        return jsonify({"message": "No data provided for update"}), 400
+    try:
+        for name, value in _rule_fields(data, partial=True).items():
+            setattr(rule, name, value)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        db.session.commit()
+        categorization.invalidate(current_user_id)
+        return jsonify({"message": "Rule updated successfully", "rule": rule.to_dict()}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Error updating rule: {str(e)}"}), 500
+
+@category_bp.route('/rules/<int:rule_id>', methods=['DELETE'])
+@cross_origin(origins="http://localhost:3000")
+def delete_rule(rule_id):
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    rule = CategoryRule.query.filter_by(id=rule_id, user_id=current_user_id).first()
+    if not rule:
+        return jsonify({"message": "Rule not found or unauthorized"}), 404
+
+    try:
+        db.session.delete(rule)
+        db.session.commit()
+        categorization.invalidate(current_user_id)
+        return jsonify({"message": "Rule deleted successfully"}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Error deleting rule: {str(e)}"}), 500
+
+# --- Categorizing ---
+@category_bp.route('/suggest', methods=['POST'])
+@cross_origin(origins="http://localhost:3000")
+def suggest_categories():
+    """
+    Categorizes descriptions without saving anything: {"descriptions": [...]} ->
+    [{"category": ..., "source": "rule" | "learned" | "model", "confidence": ...} | null].
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    data = request.get_json() or {}
+    descriptions = data.get('descriptions')
+    if not isinstance(descriptions, list) or not all(isinstance(d, str) for d in descriptions):
+        return jsonify({"message": "'descriptions' must be a list of strings"}), 400
+    if len(descriptions) > MAX_SUGGESTIONS:
+        return jsonify({"message": f"At most {MAX_SUGGESTIONS} descriptions per request"}), 400
+
+    categorizer = categorization.for_user(current_user_id)
+    suggestions = []
+    for description in descriptions:
+        found = categorizer.categorize(description)
+        suggestions.append({"category": found[0], "source": found[1], "confidence": found[2]} if found else None)
+    return jsonify(suggestions), 200
+
+@category_bp.route('/recategorize', methods=['POST'])
+@cross_origin(origins="http://localhost:3000")
+def recategorize():
+    """
+    Categorizes the user's 'Uncategorized' transactions now. With {"all": true},
+    transactions a rule disagrees with are moved as well; {"dry_run": true} only counts.
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    data = request.get_json(silent=True) or {}
+    dry_run = bool(data.get('dry_run'))
+    try:
+        result = categorization.recategorize(current_user_id, bool(data.get('all')), dry_run)
+        if result['changed'] and not dry_run:
+            response_cache.bump_version(current_user_id)
+        return jsonify(result), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Error recategorizing transactions: {str(e)}"}), 500
@@ -0,0 +1,91 @@
+from flask import Blueprint, request, jsonify, make_response
+from flask_cors import cross_origin
+from backend.services import period_date_range, parse_date
+from backend import rollups
+from backend.cache import response_cache
+from backend.auth import get_current_user_id
+from backend.money import cents_to_float
+from datetime import datetime
+
+dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
+
+@dashboard_bp.route('', methods=['OPTIONS'])
+@cross_origin(origins="http://localhost:3000", methods=['GET'], headers=['Content-Type', 'Authorization'])
+def options_handler():
+    response = make_response()
+    return response, 200
+
+# --- Combined Dashboard ---
+@dashboard_bp.route('', methods=['GET'])
+@cross_origin(origins="http://localhost:3000")
+@response_cache.cached(get_current_user_id)
+def get_dashboard():
+    """
+    Returns the summary, spending patterns and category distribution in one response,
+    computed by a single aggregate query.
+    Window: `period` ('3months', '6months', '1year'), or explicit start_date/end_date.
+    The summary totals are all-time, as in /api/transactions/summary.
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    try:
+        start_date, end_date = dashboard_window(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        rows = rollups.dashboard_aggregates(current_user_id, start_date, end_date)
+        return jsonify(format_dashboard(rows, start_date, end_date)), 200
+
+    except Exception as e:
+        return jsonify({"message": f"Error building dashboard: {str(e)}"}), 500
+
+def dashboard_window(args):
+    """(start_date, end_date) from `period` or start_date/end_date; ValueError with the 400 message."""
+    try:
+        start_date, end_date = period_date_range(args.get('period', '6months'))
+        if args.get('start_date'):
+            start_date = parse_date(args['start_date'])
+        if args.get('end_date'):
+            end_date = parse_date(args['end_date'])
+    except ValueError:
+        raise ValueError("Invalid date format. Dates should be YYYY-MM-DD.")
+    if start_date > end_date:
+        raise ValueError("Start date cannot be after end date")
+    return start_date, end_date
+
+def format_dashboard(rows, start_date, end_date):
+    """Folds the rows of `rollups.dashboard_aggregates` into the dashboard payload."""
+    total_income = total_expenses = 0 # cents
+    monthly = {}
+    categories = {}
+    for year, month, category, income, expense, window_expense, window_rows in rows:
+        total_income += income
+        total_expenses += expense
+        if window_rows:
+            key = (int(year), int(month))
+            monthly[key] = monthly.get(key, 0) + window_expense
+            categories[category] = categories.get(category, 0) + window_expense
+
+    spending_patterns = [
+        {"name": f"{datetime(year, month, 1).strftime('%b')} {year}", "value": cents_to_float(total)}
+        for (year, month), total in sorted(monthly.items())
+    ]
+    category_distribution = [
+        {"name": category, "value": cents_to_float(total)}
+        for category, total in categories.items()
+    ]
+
+    return {
+        "summary": {
+            "total_income": cents_to_float(total_income),
+            "total_expenses": cents_to_float(total_expenses),
+            "total_balance": cents_to_float(total_income - total_expenses)
+        },
+        "spending_patterns": spending_patterns,
+        "category_distribution": category_distribution,
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat()
+    }
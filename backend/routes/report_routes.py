@@ -1,22 +1,21 @@
 from flask import Blueprint, request, jsonify, make_response
 from flask_cors import cross_origin
-from backend.database import db
-from backend.models import Transaction, User # Import Transaction and User models
+from backend.database import db, use_primary
+from backend.models import Transaction, User, UserInsights # Import Transaction and User models
+from backend.services import period_date_range, parse_date
+from backend import rollups, insights, timeseries
+from backend.cache import response_cache
+from backend.auth import get_current_user_id
+from backend.money import cents_to_float
+from backend.serializers import json_response
 from datetime import datetime, timedelta
-from sqlalchemy import func, extract # Import func for SUM, extract for month/year
 
 report_bp = Blueprint('reports', __name__, url_prefix='/api/reports')
 
-def get_current_user_id_placeholder():
-    """
-    TEMPORARY FUNCTION: Always returns user ID 1 for testing.
-    MUST BE REPLACED WITH SECURE JWT DECODING IN PRODUCTION.
-    """
-    return 1 
-
-
 @report_bp.route('/spending-patterns', methods=['OPTIONS'])
 @report_bp.route('/category-distribution', methods=['OPTIONS'])
+@report_bp.route('/insights', methods=['OPTIONS'])
+@report_bp.route('/timeseries', methods=['OPTIONS'])
 @cross_origin(origins="http://localhost:3000", methods=['GET'], headers=['Content-Type', 'Authorization'])
 def options_handler():
     """Handles CORS preflight requests for report routes."""
@@ -26,57 +25,25 @@ def options_handler():
 # --- Get Spending Patterns (e.g., monthly spending) ---
 @report_bp.route('/spending-patterns', methods=['GET'])
 @cross_origin(origins="http://localhost:3000")
+@response_cache.cached(get_current_user_id)
 def get_spending_patterns():
     """
     Calculates spending patterns over a specified period.
     Default period: last 6 months.
     """
-    current_user_id = get_current_user_id_placeholder()
+    current_user_id = get_current_user_id()
     if not current_user_id:
         return jsonify({"message": "Authentication required"}), 401
 
     # Get period from query parameters, default to 6 months
     period = request.args.get('period', '6months') # e.g., '3months', '6months', '1year'
-
-    end_date = datetime.utcnow().date()
-    start_date = end_date # Default to current day, then adjust
-    if period == '3months':
-        start_date = end_date - timedelta(days=3 * 30) # Approx 3 months
-    elif period == '1year':
-        start_date = end_date - timedelta(days=365)
-    else: # Default to 6 months
-        start_date = end_date - timedelta(days=6 * 30)
+    start_date, end_date = period_date_range(period)
 
     try:
-        # Query to get total expenses per month for the period
-        # We need to group by year and month.
-        spending_data = db.session.query(
-            extract('year', Transaction.date),
-            extract('month', Transaction.date),
-            func.sum(Transaction.amount)
-        ).filter(
-            Transaction.user_id == current_user_id,
-            Transaction.type == 'expense',
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).group_by(
-            extract('year', Transaction.date),
-            extract('month', Transaction.date)
-        ).order_by(
-            extract('year', Transaction.date),
-            extract('month', Transaction.date)
-        ).all()
-
-        # Format data for frontend (e.g., {name: "Jan 2025", value: 150.00})
-        formatted_spending = []
-        for year, month, total_expense in spending_data:
-            month_name = datetime(year, month, 1).strftime('%b') # e.g., Jan
-            formatted_spending.append({
-                "name": f"{month_name} {year}",
-                "value": round(total_expense, 2)
-            })
-
-        return jsonify(formatted_spending), 200
+        # Total expenses per (year, month) for the period, from the monthly rollups
+        spending_data = rollups.window_sums(current_user_id, 'expense', start_date, end_date, by='month')
+
+        return jsonify(format_spending_patterns(spending_data)), 200
 
     except Exception as e:
         return jsonify({"message": f"Error generating spending patterns: {str(e)}"}), 500
@@ -84,51 +51,131 @@ def get_spending_patterns():
 # --- Get Category Distribution ---
 @report_bp.route('/category-distribution', methods=['GET'])
 @cross_origin(origins="http://localhost:3000")
+@response_cache.cached(get_current_user_id)
 def get_category_distribution():
     """
     Calculates the distribution of expenses by category for a specified period.
     Default period: last 6 months.
     """
-    current_user_id = get_current_user_id_placeholder()
+    current_user_id = get_current_user_id()
     if not current_user_id:
         return jsonify({"message": "Authentication required"}), 401
 
     # Get period from query parameters, default to 'all' for now
     # You can add similar date filtering logic here as in spending-patterns if needed
     period = request.args.get('period', '6months')
-
-    end_date = datetime.utcnow().date()
-    start_date = end_date
-    if period == '3months':
-        start_date = end_date - timedelta(days=3 * 30)
-    elif period == '1year':
-        start_date = end_date - timedelta(days=365)
-    else: # Default to 6 months
-        start_date = end_date - timedelta(days=6 * 30)
+    start_date, end_date = period_date_range(period)
 
     try:
-        # Query to get total expenses per category for the period
-        category_data = db.session.query(
-            Transaction.category,
-            func.sum(Transaction.amount)
-        ).filter(
-            Transaction.user_id == current_user_id,
-            Transaction.type == 'expense', # Only consider expenses for category distribution
-            Transaction.date >= start_date,
-            Transaction.date <= end_date
-        ).group_by(
-            Transaction.category
-        ).all()
-
-        # Format data for frontend (e.g., {name: "Food", value: 300.00})
-        formatted_categories = []
-        for category, total_expense in category_data:
-            formatted_categories.append({
-                "name": category,
-                "value": round(total_expense, 2)
-            })
-
-        return jsonify(formatted_categories), 200
+        # Total expenses per category for the period, from the monthly rollups
+        category_data = rollups.window_sums(current_user_id, 'expense', start_date, end_date, by='category')
+
+        return jsonify(format_category_distribution(category_data)), 200
 
     except Exception as e:
         return jsonify({"message": f"Error generating category distribution: {str(e)}"}), 500
+
+# --- Get Time Series ---
+@report_bp.route('/timeseries', methods=['GET'])
+@cross_origin(origins="http://localhost:3000")
+@response_cache.cached(get_current_user_id)
+def get_timeseries():
+    """
+    Totals per day/week/month/year bucket for any date range, with the running
+    total at the end of each bucket (the balance, for type=net).
+    Query params: start, end (YYYY-MM-DD; default the year to today),
+    granularity (day, week, month, year; default month), type (net, income, expense; default net).
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    granularity = request.args.get('granularity', 'month')
+    type_ = request.args.get('type', 'net')
+    if granularity not in timeseries.GRANULARITIES:
+        return jsonify({"message": f"granularity must be one of: {', '.join(timeseries.GRANULARITIES)}"}), 400
+    if type_ not in timeseries.TYPES:
+        return jsonify({"message": f"type must be one of: {', '.join(timeseries.TYPES)}"}), 400
+    try:
+        end_date = parse_date(request.args['end']) if request.args.get('end') else datetime.utcnow().date()
+        start_date = parse_date(request.args['start']) if request.args.get('start') else None
+    except ValueError:
+        return jsonify({"message": "Invalid date format. Use YYYY-MM-DD."}), 400
+    if start_date is None:
+        # The year ending at end_date; from Feb 29 the year before has no such day, so use Feb 28
+        day = 28 if (end_date.month, end_date.day) == (2, 29) else end_date.day
+        start_date = end_date.replace(year=end_date.year - 1, day=day) + timedelta(days=1)
+    if start_date > end_date:
+        return jsonify({"message": "start must not be after end"}), 400
+
+    try:
+        opening, points = timeseries.series(timeseries.for_user(current_user_id), start_date, end_date, granularity, type_)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"message": f"Error generating time series: {str(e)}"}), 500
+
+    return jsonify({
+        "start": start_date.isoformat(),
+        "end": end_date.isoformat(),
+        "granularity": granularity,
+        "type": type_,
+        "opening": cents_to_float(opening),
+        "points": [{
+            "name": label,
+            "start": first.isoformat(),
+            "end": last.isoformat(),
+            "value": cents_to_float(value),
+            "cumulative": cents_to_float(cumulative),
+        } for label, first, last, value, cumulative in points]
+    }), 200
+
+# --- Get Spending Insights ---
+@report_bp.route('/insights', methods=['GET'])
+@cross_origin(origins="http://localhost:3000")
+def get_insights():
+    """
+    Returns the user's precomputed insights: per-category baselines, trends and
+    end-of-month forecasts, plus unusual transactions. Results come from the
+    `flask insights compute` batch job; when none is stored for today (UTC) they
+    are computed for this user now, reading and writing on the primary so a
+    lagging replica cannot hide the stored row.
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    use_primary()
+    stored = db.session.get(UserInsights, current_user_id)
+    if stored is not None and (stored.as_of == datetime.utcnow().date() or not insights.numpy_available()):
+        return json_response(stored.payload.encode())
+    if not insights.numpy_available():
+        return jsonify({"message": "Insights require numpy to be installed on the server"}), 501
+
+    try:
+        return jsonify(insights.refresh(current_user_id)), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Error computing insights: {str(e)}"}), 500
+
+# --- Response formatting (shared with the ASGI read path) ---
+def format_spending_patterns(spending_data):
+    """{(year, month): cents} to [{name: "Jan 2025", value: 150.00}, ...] in month order."""
+    formatted_spending = []
+    for (year, month), total_expense in sorted(spending_data.items()):
+        month_name = datetime(year, month, 1).strftime('%b') # e.g., Jan
+        formatted_spending.append({
+            "name": f"{month_name} {year}",
+            "value": cents_to_float(total_expense)
+        })
+    return formatted_spending
+
+def format_category_distribution(category_data):
+    """{category: cents} to [{name: "Food", value: 300.00}, ...]."""
+    formatted_categories = []
+    for category, total_expense in category_data.items():
+        formatted_categories.append({
+            "name": category,
+            "value": cents_to_float(total_expense)
+        })
+    return formatted_categories
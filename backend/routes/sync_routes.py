@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify, make_response
+from flask_cors import cross_origin
+from backend import sync
+from backend.cache import response_cache
+from backend.auth import get_current_user_id
+from backend.serializers import TRANSACTION_JSON, BUDGET_JSON, json_response, object_body, ids_body
+from json.encoder import encode_basestring_ascii
+
+sync_bp = Blueprint('sync', __name__, url_prefix='/api/sync')
+
+@sync_bp.route('', methods=['OPTIONS'])
+@cross_origin(origins="http://localhost:3000", methods=['GET'], headers=['Content-Type', 'Authorization'])
+def options_handler():
+    response = make_response()
+    return response, 200
+
+# --- Delta Sync ---
+@sync_bp.route('', methods=['GET'])
+@cross_origin(origins="http://localhost:3000")
+@response_cache.cached(get_current_user_id)
+def get_changes():
+    """
+    Transactions and budgets changed since `since` (the `token` of the previous
+    sync), plus the ids deleted since then. Without `since`, or when the token is
+    too old to answer incrementally, returns everything with "full": true and the
+    client should replace its copy. Apply `deleted` before the changed rows.
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    try:
+        since = sync.parse_token(request.args['since']) if request.args.get('since') else None
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    try:
+        result = sync.changes(current_user_id, since)
+        deleted = result['deleted']
+        return json_response(object_body({
+            'token': encode_basestring_ascii(result['token']).encode(),
+            'full': b'true' if result['full'] else b'false',
+            'transactions': TRANSACTION_JSON.encode(result['transactions']),
+            'budgets': BUDGET_JSON.encode(result['budgets']),
+            'deleted': object_body({kind: ids_body(ids) for kind, ids in deleted.items()}),
+        }))
+    except Exception as e:
+        return jsonify({"message": f"Error reading changes: {str(e)}"}), 500
@@ -1,21 +1,32 @@
-from flask import Blueprint, request, jsonify, make_response
+import json
+from flask import Blueprint, request, jsonify, make_response, Response, stream_with_context
 from flask_cors import cross_origin
 from backend.database import db
 from backend.models import Transaction, User
+from backend.services import apply_transaction_filters, apply_keyset, encode_cursor, parse_date, parse_limit, \
+    missing_timestamps_statement, MISSING_TIMESTAMPS
+from backend import rollups, timeseries, importers, exporters, search, categorization, batch, sync
+from backend.cache import response_cache
+from backend.write_queue import write_queue, WriteQueueFullError, WriteTimeoutError
+from backend.auth import get_current_user_id
+from backend.money import to_cents, cents_to_float
+from backend.serializers import TRANSACTION_JSON, json_response, page_body, object_body
 from datetime import datetime
 from sqlalchemy import func # Import func for SQL functions like sum
 
 transactions_bp = Blueprint('transactions', __name__, url_prefix='/api/transactions')
 
-# --- Helper function to get current user ID (TEMPORARY: Bypass for testing) ---
-def get_current_user_id_placeholder():
-    return 1 # For testing purposes, assume user ID 1 exists.
-
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 1000
 
 # --- CORS Preflight Handler ---
 @transactions_bp.route('/', methods=['OPTIONS'])
 @transactions_bp.route('/<int:transaction_id>', methods=['OPTIONS'])
 @transactions_bp.route('/summary', methods=['OPTIONS']) # Add OPTIONS for summary route
+@transactions_bp.route('/import', methods=['OPTIONS'])
+@transactions_bp.route('/export', methods=['OPTIONS'])
+@transactions_bp.route('/batch', methods=['OPTIONS'])
 @cross_origin(origins="http://localhost:3000", methods=['GET', 'POST', 'PUT', 'DELETE'], headers=['Content-Type', 'Authorization'])
 def options_handler():
     response = make_response()
@@ -25,18 +36,195 @@ def options_handler():
 @transactions_bp.route('/', methods=['GET'])
 @cross_origin(origins="http://localhost:3000")
 def get_transactions():
-    current_user_id = get_current_user_id_placeholder()
+    """
+    Lists the user's transactions, newest first.
+
+    Optional filters: start_date, end_date (YYYY-MM-DD), type, category.
+    - With `limit` and/or `cursor`, returns one keyset page:
+      {"transactions": [...], "next_cursor": "<token>" | null}
+    - With `stream=ndjson` or `stream=json`, streams every matching row from a
+      server-side cursor as newline-delimited JSON or a chunked JSON array.
+    - Otherwise returns the full list (the original contract).
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    # Plain column rows, serialized without building model instances
+    query = db.session.query(*TRANSACTION_JSON.columns).filter(Transaction.user_id == current_user_id)
+    try:
+        query = apply_transaction_filters(query, request.args)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid filter: {str(e)}"}), 400
+    try:
+        limit = parse_limit(request.args.get('limit'))
+        if request.args.get('cursor'):
+            query = apply_keyset(query, request.args['cursor'])
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    query = query.order_by(Transaction.timestamp.desc(), Transaction.id.desc())
+
+    stream = request.args.get('stream')
+    if stream:
+        if stream not in ('ndjson', 'json'):
+            return jsonify({"message": "stream must be 'ndjson' or 'json'"}), 400
+        if limit is not None:
+            query = query.limit(max(limit, 1)) # clamped like the paged branch
+        return stream_transactions(query, stream)
+
+    if limit is None and 'cursor' not in request.args:
+        return json_response(TRANSACTION_JSON.encode(query.all()))
+
+    if db.session.execute(missing_timestamps_statement(current_user_id)).scalar():
+        return jsonify({"message": MISSING_TIMESTAMPS}), 500 # the keyset would silently skip those rows
+    limit = min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    # Fetch one extra row to know whether another page follows.
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+    return json_response(page_body('transactions', TRANSACTION_JSON.encode(rows), next_cursor))
+
+def stream_transactions(query, fmt):
+    """Streams a transaction query in batches so memory stays flat for long histories."""
+    def generate():
+        first = True
+        if fmt == 'json':
+            yield '['
+        for row in query.yield_per(STREAM_BATCH_SIZE):
+            line = json.dumps(TRANSACTION_JSON.to_dict(row))
+            if fmt == 'ndjson':
+                yield line + '\n'
+            else:
+                yield line if first else ',' + line
+            first = False
+        if fmt == 'json':
+            yield ']'
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+# --- Full-Text Search ---
+@cross_origin(origins="http://localhost:3000")
+def search_transactions():
+    """
+    Searches descriptions and categories: `q` words match as prefixes, "quoted
+    phrases" exactly. Accepts the listing filters (start_date, end_date, type,
+    category, min_amount, max_amount). Returns best matches first, one page at a
+    time: {"transactions": [...], "next_cursor": "<token>" | null, "truncated": bool}.
+    `truncated` is true when only the newest search.RANK_WINDOW matches were ranked.
+    """
+    current_user_id = get_current_user_id()
     if not current_user_id:
         return jsonify({"message": "Authentication required"}), 401
 
-    transactions = Transaction.query.filter_by(user_id=current_user_id).order_by(Transaction.timestamp.desc()).all()
-    return jsonify([t.to_dict() for t in transactions]), 200
+    q = request.args.get('q', '')
+    try:
+        statement = search.search_statement(current_user_id, q, request.args)
+        limit = parse_limit(request.args.get('limit'), DEFAULT_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid search: {str(e)}"}), 400
+    cursor = request.args.get('cursor') or '0' # ranked results page by offset
+    if not cursor.isdigit():
+        return jsonify({"message": "Invalid cursor"}), 400
+    offset = int(cursor)
+
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    rows = db.session.execute(statement.limit(limit + 1).offset(offset)).all()
+    truncated = db.session.execute(search.truncated_statement(current_user_id, q, request.args)).first() is not None
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = str(offset + limit)
+    return json_response(object_body({
+        'next_cursor': b'null' if next_cursor is None else json.dumps(next_cursor).encode(),
+        'transactions': TRANSACTION_JSON.encode(rows),
+        'truncated': b'true' if truncated else b'false',
+    }))
+
+
+@transactions_bp.record
+def _register_search(state):
+    # Registered only where search_statement can run, see search.supported
+    if search.supported(state.app):
+        state.add_url_rule('/search', view_func=search_transactions, methods=['GET'])
+        state.add_url_rule('/search', view_func=options_handler, methods=['OPTIONS'])
+
+# --- Export Transactions ---
+@transactions_bp.route('/export', methods=['GET'])
+@cross_origin(origins="http://localhost:3000")
+def export_transactions():
+    """
+    Streams the user's transactions as `format=csv` (default), `arrow` (IPC stream)
+    or `parquet`, optionally limited by start_date/end_date.
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    fmt = request.args.get('format', 'csv')
+    if fmt not in exporters.FORMATS:
+        return jsonify({"message": f"Unsupported format '{fmt}'. Use one of: {', '.join(exporters.FORMATS)}"}), 400
+    if fmt != 'csv' and not exporters.pyarrow_available():
+        return jsonify({"message": f"The {fmt} format requires pyarrow to be installed on the server"}), 501
+    try:
+        start_date = parse_date(request.args['start_date']) if request.args.get('start_date') else None
+        end_date = parse_date(request.args['end_date']) if request.args.get('end_date') else None
+    except ValueError:
+        return jsonify({"message": "Invalid date format. Dates should be YYYY-MM-DD."}), 400
+
+    statement = exporters.transactions_statement(current_user_id, start_date, end_date)
+    chunks = exporters.export_chunks(fmt, exporters.TRANSACTION_COLUMNS, statement)
+    return Response(stream_with_context(chunks), mimetype=exporters.MIMETYPES[fmt],
+                    headers={"Content-Disposition": f"attachment; filename=transactions.{fmt}"})
+
+# --- Writes, applied by write_queue.run (inline or on the group-commit writer) ---
+def _insert_transaction(values):
+    transaction = Transaction(**values, change_seq=sync.seq(values['user_id']))
+    db.session.add(transaction)
+    db.session.flush() # Assigns the id
+    rollups.record(transaction, +1)
+    timeseries.record(transaction, +1)
+    return transaction.to_dict()
+
+def _update_transaction(user_id, transaction_id, changes):
+    """Returns the updated transaction as a dict, or None if the user has no such transaction."""
+    transaction = Transaction.query.filter_by(id=transaction_id, user_id=user_id).first()
+    if not transaction:
+        return None
+    # Take the old values out of the rollups before changing them
+    rollups.record(transaction, -1)
+    timeseries.record(transaction, -1)
+    for column, value in changes.items():
+        setattr(transaction, column, value)
+    transaction.change_seq = sync.seq(user_id)
+    rollups.record(transaction, +1)
+    timeseries.record(transaction, +1)
+    return transaction.to_dict()
+
+def _delete_transaction(user_id, transaction_id):
+    """Returns False if the user has no such transaction."""
+    transaction = Transaction.query.filter_by(id=transaction_id, user_id=user_id).first()
+    if not transaction:
+        return False
+    rollups.record(transaction, -1)
+    timeseries.record(transaction, -1)
+    sync.record_deletes('transaction', user_id, Transaction.id == transaction_id)
+    db.session.delete(transaction)
+    return True
+
+def _queue_error(e):
+    """The response for a write the queue did not take or did not confirm in time."""
+    if isinstance(e, WriteQueueFullError):
+        return jsonify({"message": str(e)}), 503, {"Retry-After": "1"}
+    return jsonify({"message": str(e)}), 504
 
 # --- Add a New Transaction ---
 @transactions_bp.route('/', methods=['POST'])
 @cross_origin(origins="http://localhost:3000")
 def add_transaction():
-    current_user_id = get_current_user_id_placeholder()
+    current_user_id = get_current_user_id()
     if not current_user_id:
         return jsonify({"message": "Authentication required"}), 401
 
@@ -44,36 +232,77 @@ def add_transaction():
     if not data:
         return jsonify({"message": "No data provided"}), 400
 
-    required_fields = ["description", "amount", "type", "category"]
+    required_fields = ["description", "amount", "type"]
     if not all(field in data for field in required_fields):
-        return jsonify({"message": "Missing required transaction fields (description, amount, type, category)"}), 400
+        return jsonify({"message": "Missing required transaction fields (description, amount, type)"}), 400
 
     try:
         transaction_date = datetime.strptime(data['date'], '%Y-%m-%d').date() if 'date' in data and data['date'] else datetime.utcnow().date()
-        amount_float = float(data['amount'])
-
-        new_transaction = Transaction(
-            description=data['description'],
-            amount=amount_float,
-            type=data['type'],
-            category=data['category'],
-            date=transaction_date,
-            user_id=current_user_id
-        )
-        db.session.add(new_transaction)
-        db.session.commit()
-        return jsonify({"message": "Transaction added successfully", "transaction": new_transaction.to_dict()}), 201
+        amount_cents = to_cents(data['amount'])
     except ValueError:
         return jsonify({"message": "Invalid amount or date format. Date should be YYYY-MM-DD."}), 400
+
+    try:
+        # Without a category, the user's rules and history pick one
+        auto_category = None
+        category = data.get('category')
+        if not category:
+            category, source, confidence = categorization.categorize(current_user_id, data['description'])
+            auto_category = {"source": source, "confidence": confidence}
+
+        transaction = write_queue.run(current_user_id, _insert_transaction, {
+            'description': data['description'],
+            'amount_cents': amount_cents,
+            'type': data['type'],
+            'category': category,
+            'date': transaction_date,
+            'user_id': current_user_id
+        })
+        body = {"message": "Transaction added successfully", "transaction": transaction}
+        if auto_category is not None:
+            body["categorization"] = auto_category
+        return jsonify(body), 201
+    except (WriteQueueFullError, WriteTimeoutError) as e:
+        return _queue_error(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({"message": f"Error adding transaction: {str(e)}"}), 500
 
+# --- Bulk Import from a Bank Statement ---
+@transactions_bp.route('/import', methods=['POST'])
+@cross_origin(origins="http://localhost:3000")
+def import_transactions():
+    """
+    Imports a CSV, OFX or QIF statement uploaded as multipart field `file`.
+    The format comes from `format` or the file extension; `dry_run=1` validates
+    and reports duplicates without writing anything.
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({"message": "No file provided"}), 400
+
+    fmt = (request.form.get('format') or request.args.get('format') or importers.detect_format(upload.filename)).lower()
+    if fmt not in importers.FORMATS:
+        return jsonify({"message": f"Unsupported format '{fmt}'. Use one of: {', '.join(importers.FORMATS)}"}), 400
+    dry_run = (request.form.get('dry_run') or request.args.get('dry_run')) in ('1', 'true')
+
+    try:
+        result = importers.import_transactions(current_user_id, importers.open_text(upload.stream), fmt, dry_run)
+        if result['imported'] and not dry_run:
+            response_cache.bump_version(current_user_id)
+        return jsonify(result), 200
+    except Exception as e:
+        return jsonify({"message": f"Error importing transactions: {str(e)}"}), 500
+
 # --- Update an Existing Transaction ---
 @transactions_bp.route('/<int:transaction_id>', methods=['PUT'])
 @cross_origin(origins="http://localhost:3000")
 def update_transaction(transaction_id):
-    current_user_id = get_current_user_id_placeholder()
+    current_user_id = get_current_user_id()
     if not current_user_id:
         return jsonify({"message": "Authentication required"}), 401
 
@@ -81,27 +310,28 @@ def update_transaction(transaction_id):
     if not data:
         return jsonify({"message": "No data provided for update"}), 400
 
-    transaction = Transaction.query.filter_by(id=transaction_id, user_id=current_user_id).first()
-    if not transaction:
-        return jsonify({"message": "Transaction not found or not authorized"}), 404
-
+    changes = {}
     try:
         if 'description' in data:
-            transaction.description = data['description']
+            changes['description'] = data['description']
         if 'amount' in data:
-            transaction.amount = float(data['amount'])
+            changes['amount_cents'] = to_cents(data['amount'])
         if 'type' in data:
-            transaction.type = data['type']
+            changes['type'] = data['type']
         if 'category' in data:
-            transaction.category = data['category']
+            changes['category'] = data['category']
         if 'date' in data and data['date']:
-            transaction.date = datetime.strptime(data['date'], '%Y-%m-%d').date()
-
-        db.session.commit()
-        return jsonify({"message": "Transaction updated successfully", "transaction": transaction.to_dict()}), 200
+            changes['date'] = datetime.strptime(data['date'], '%Y-%m-%d').date()
     except ValueError:
-        db.session.rollback()
         return jsonify({"message": "Invalid amount or date format. Date should be YYYY-MM-DD."}), 400
+
+    try:
+        transaction = write_queue.run(current_user_id, _update_transaction, current_user_id, transaction_id, changes)
+        if transaction is None:
+            return jsonify({"message": "Transaction not found or not authorized"}), 404
+        return jsonify({"message": "Transaction updated successfully", "transaction": transaction}), 200
+    except (WriteQueueFullError, WriteTimeoutError) as e:
+        return _queue_error(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({"message": f"Error updating transaction: {str(e)}"}), 500
@@ -110,54 +340,93 @@ def update_transaction(transaction_id):
 @transactions_bp.route('/<int:transaction_id>', methods=['DELETE'])
 @cross_origin(origins="http://localhost:3000")
 def delete_transaction(transaction_id):
-    current_user_id = get_current_user_id_placeholder()
+    current_user_id = get_current_user_id()
     if not current_user_id:
         return jsonify({"message": "Authentication required"}), 401
 
-    transaction = Transaction.query.filter_by(id=transaction_id, user_id=current_user_id).first()
-    if not transaction:
-        return jsonify({"message": "Transaction not found or not authorized"}), 404
-
     try:
-        db.session.delete(transaction)
-        db.session.commit()
+        if not write_queue.run(current_user_id, _delete_transaction, current_user_id, transaction_id):
+            return jsonify({"message": "Transaction not found or not authorized"}), 404
         return jsonify({"message": "Transaction deleted successfully"}), 200
+    except (WriteQueueFullError, WriteTimeoutError) as e:
+        return _queue_error(e)
     except Exception as e:
         db.session.rollback()
         return jsonify({"message": f"Error deleting transaction: {str(e)}"}), 500
 
+# --- Bulk Update or Delete ---
+@transactions_bp.route('/batch', methods=['POST'])
+@cross_origin(origins="http://localhost:3000")
+def batch_transactions():
+    """
+    Updates or deletes many transactions with one set-based statement, all or nothing.
+
+    Body: {"operation": "update" | "delete", "ids": [...] or "filter": {...}, "set": {...}}
+    - filter: start_date, end_date, type, category, min_amount, max_amount and
+      description (case-insensitive substring)
+    - set (updates only): description, amount, type, category, date
+    Unknown ids fail the whole batch with 404 and the missing ids.
+    """
+    current_user_id = get_current_user_id()
+    if not current_user_id:
+        return jsonify({"message": "Authentication required"}), 401
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"message": "No data provided"}), 400
+
+    try:
+        operation, ids, filters, changes = batch.parse_request(data, batch.TRANSACTION_FIELDS, batch.TRANSACTION_FILTERS)
+        conditions = batch.transaction_conditions(current_user_id, ids, filters)
+    except ValueError as e:
+        return jsonify({"message": f"Invalid batch: {str(e)}"}), 400
+
+    try:
+        affected = write_queue.run(current_user_id, batch.apply_transactions,
+                                   current_user_id, operation, ids, conditions, changes)
+        return jsonify({"message": f"Batch {operation} applied", "operation": operation, "affected": affected}), 200
+    except ValueError as e:
+        return jsonify({"message": f"Invalid batch: {str(e)}"}), 400
+    except batch.MissingIdsError as e:
+        return jsonify({"message": str(e), "missing_ids": e.ids}), 404
+    except batch.BatchConflictError as e:
+        return jsonify({"message": str(e)}), 409
+    except (WriteQueueFullError, WriteTimeoutError) as e:
+        return _queue_error(e)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"message": f"Error applying batch: {str(e)}"}), 500
+
 # --- NEW: Dashboard Summary Endpoint ---
 @transactions_bp.route('/summary', methods=['GET'])
 @cross_origin(origins="http://localhost:3000")
+@response_cache.cached(get_current_user_id)
 def get_dashboard_summary():
     """
     Calculates and returns summary statistics (total income, total expenses, net balance)
     for the current user.
     """
-    current_user_id = get_current_user_id_placeholder()
+    current_user_id = get_current_user_id()
     if not current_user_id:
         return jsonify({"message": "Authentication required"}), 401
 
     try:
-        # Calculate total income
-        total_income = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == current_user_id,
-            Transaction.type == 'income'
-        ).scalar() or 0.0
-
-        # Calculate total expenses
-        total_expenses = db.session.query(func.sum(Transaction.amount)).filter(
-            Transaction.user_id == current_user_id,
-            Transaction.type == 'expense'
-        ).scalar() or 0.0
-
-        total_balance = total_income - total_expenses
-
-        return jsonify({
-            "total_income": round(total_income, 2),
-            "total_expenses": round(total_expenses, 2),
-            "total_balance": round(total_balance, 2)
-        }), 200
+        # All-time totals per type, read from the monthly rollups
+        totals = rollups.totals_by_type(current_user_id)
+        return jsonify(format_summary(totals)), 200
 
     except Exception as e:
         return jsonify({"message": f"Error calculating summary: {str(e)}"}), 500
+
+def format_summary(totals):
+    """{type: cents} to the summary payload (also used by the ASGI read path)."""
+    total_income = totals.get('income') or 0
+    total_expenses = totals.get('expense') or 0
+
+    total_balance = total_income - total_expenses
+
+    return {
+        "total_income": cents_to_float(total_income),
+        "total_expenses": cents_to_float(total_expenses),
+        "total_balance": cents_to_float(total_balance)
+    }
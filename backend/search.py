@@ -0,0 +1,219 @@
+import re
+import unicodedata
+from sqlalchemy import event, func, inspect, literal_column, select, text, table, column
+from backend.database import db
+from backend.models import Transaction
+from backend.serializers import TRANSACTION_JSON
+from backend.services import apply_transaction_filters
+
+# Full-text search over transaction descriptions and categories.
+#
+# SQLite: an FTS5 table keyed by transaction id. Its tokens are scoped to their
+# owner: "Amazon Prime" of user 42 is indexed as `42xamazon 42xprime`, so each
+# term's posting list holds one user's rows and a search never walks (or ranks)
+# other users' matches, however common the word. The scoped text is produced by
+# the SQL function pfm_search_terms, registered on every connection by init_app,
+# and triggers on the transaction table keep the index in sync inside the same
+# database transaction as every write: the add/update/delete routes, statement
+# imports and shard moves alike. Words are lower-cased and stripped of accents
+# before indexing, and the same normalization is applied to queries.
+# PostgreSQL: a generated tsvector column with a GIN index, which the database
+# maintains itself.
+#
+# Query syntax: words are ANDed and each matches as a prefix ("amaz" finds
+# "Amazon"); "quoted phrases" match consecutive words exactly. Results are ranked
+# with bm25 / ts_rank, description matches weighing more than category matches.
+# Only the RANK_WINDOW most recent matches are scored: a word that occurs in most
+# of a user's history would otherwise cost a ranking pass over all of it. When
+# a query has more matches than that, the search route says so with
+# "truncated": true, so clients can ask the user to narrow the query or the dates.
+#
+# Other databases have no search index. `supported(app)` is checked when the
+# transactions blueprint is registered, and the search route only exists where
+# every bind that holds transactions supports it.
+
+FTS_TABLE = 'transaction_fts'
+TERMS_FUNCTION = 'pfm_search_terms'
+MAX_TERMS = 16
+RANK_WINDOW = 2000 # Newest matching rows that are ranked; older matches are not returned
+SUPPORTED_DIALECTS = ('sqlite', 'postgresql')
+
+_TERMS = re.compile(r'"([^"]*)"|([^\s"]+)')
+_WORDS = re.compile(r'[^\W_]+')
+
+_fts = table(FTS_TABLE, column('rowid'))
+
+SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(description, category, tokenize='unicode61')""",
+    f"""CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON "transaction" BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, description, category) VALUES (
+            new.id, {TERMS_FUNCTION}(new.user_id, new.description), {TERMS_FUNCTION}(new.user_id, new.category)
+        );
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON "transaction" BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF description, category, user_id ON "transaction" BEGIN
+        UPDATE {FTS_TABLE} SET
+            description = {TERMS_FUNCTION}(new.user_id, new.description),
+            category = {TERMS_FUNCTION}(new.user_id, new.category)
+        WHERE rowid = new.id;
+    END""",
+]
+
+SQLITE_REBUILD = [
+    f"DELETE FROM {FTS_TABLE}",
+    f'INSERT INTO {FTS_TABLE}(rowid, description, category) '
+    f'SELECT id, {TERMS_FUNCTION}(user_id, description), {TERMS_FUNCTION}(user_id, category) FROM "transaction"',
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')",
+]
+
+POSTGRES_DDL = [
+    """ALTER TABLE "transaction" ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(description, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(category, '')), 'B')
+    ) STORED""",
+    'CREATE INDEX IF NOT EXISTS ix_transaction_search ON "transaction" USING gin (search_vector)',
+]
+
+
+def words(text):
+    """Lower-cased, accent-free words of `text`."""
+    if text is None or text.isascii():
+        return _WORDS.findall((text or '').lower())
+    decomposed = unicodedata.normalize('NFKD', text or '')
+    return _WORDS.findall(''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower())
+
+
+def search_terms(user_id, text):
+    """The indexed form of `text`: each word prefixed with its owner, e.g. '42xamazon 42xprime'."""
+    return ' '.join(f'{user_id}x{word}' for word in words(text))
+
+
+def _register_functions(dbapi_connection, connection_record):
+    dbapi_connection.create_function(TERMS_FUNCTION, 2, search_terms, deterministic=True)
+
+
+def init_app(app):
+    """Registers pfm_search_terms on every SQLite engine. Call before anything connects."""
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'connect', _register_functions)
+
+
+def supported(app):
+    """True if every database of `app` (primary, shards and replicas) can run search_statement."""
+    with app.app_context():
+        return all(engine.dialect.name in SUPPORTED_DIALECTS for engine in db.engines.values())
+
+
+def create_index(connection, rebuild=False):
+    """
+    Creates the search index on the connection's database if it is missing and
+    fills it from existing rows. With `rebuild`, reindexes every row even if it
+    exists. Returns True if anything was (re)built.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        exists = inspect(connection).has_table(FTS_TABLE)
+        if not exists:
+            for statement in SQLITE_DDL:
+                connection.exec_driver_sql(statement)
+        if rebuild or not exists:
+            for statement in SQLITE_REBUILD:
+                connection.exec_driver_sql(statement)
+            return True
+        return False
+    if dialect == 'postgresql':
+        exists = any(c['name'] == 'search_vector' for c in inspect(connection).get_columns('transaction'))
+        for statement in POSTGRES_DDL:
+            connection.exec_driver_sql(statement)
+        if rebuild:
+            connection.exec_driver_sql('REINDEX INDEX ix_transaction_search')
+        return rebuild or not exists
+    return False
+
+
+@event.listens_for(Transaction.__table__, 'after_create')
+def _create_with_table(target, connection, **kw):
+    create_index(connection)
+
+
+# --- Queries ---
+
+def parse_query(q):
+    """Search box text -> [(words, is_phrase)], normalized like the indexed text."""
+    terms = []
+    for phrase, word in _TERMS.findall(q or ''):
+        found = words(phrase or word)
+        if found:
+            terms.append((found, bool(phrase)))
+    return terms[:MAX_TERMS]
+
+
+def fts5_expression(terms, user_id):
+    """FTS5 MATCH expression requiring every term, scoped to the user's tokens."""
+    scope = f'{int(user_id)}x'
+    parts = []
+    for found, is_phrase in terms:
+        if is_phrase:
+            parts.append('"' + ' '.join(scope + word for word in found) + '"')
+        else:
+            parts.extend(f'"{scope}{word}"*' for word in found)
+    return ' AND '.join(parts)
+
+
+def tsquery_expression(terms):
+    parts = []
+    for found, is_phrase in terms:
+        if is_phrase:
+            parts.append('(' + ' <-> '.join(f"'{word}'" for word in found) + ')')
+        else:
+            parts.extend(f"'{word}':*" for word in found)
+    return ' & '.join(parts)
+
+
+def _candidates(columns, user_id, terms, args):
+    """Select of `columns` and the score for the user's matches of `terms`, newest first."""
+    dialect = db.session.get_bind(Transaction).dialect.name
+    if dialect == 'sqlite':
+        score = literal_column(f'bm25({FTS_TABLE}, 10.0, 5.0)') # lower is better
+        candidates = select(*columns, score.label('score')).join_from(
+            Transaction, _fts, _fts.c.rowid == Transaction.id
+        ).where(
+            text(f'{FTS_TABLE} MATCH :search_expression').bindparams(search_expression=fts5_expression(terms, user_id)),
+            Transaction.user_id == user_id
+        ).order_by(_fts.c.rowid.desc()) # FTS5 walks the matches newest first and stops at the window
+    else: # postgresql, see supported()
+        vector = literal_column('"transaction".search_vector')
+        tsquery = func.to_tsquery('simple', tsquery_expression(terms))
+        score = -func.ts_rank(vector, tsquery)
+        candidates = select(*columns, score.label('score')).where(
+            vector.op('@@')(tsquery), Transaction.user_id == user_id
+        ).order_by(Transaction.id.desc())
+    return apply_transaction_filters(candidates, args)
+
+
+def _parse_terms(q):
+    terms = parse_query(q)
+    if not terms:
+        raise ValueError("Search query must contain at least one word")
+    return terms
+
+
+def search_statement(user_id, q, args):
+    """
+    Ranked select of TRANSACTION_JSON columns for the user's transactions matching
+    `q`, narrowed by the listing filters in `args`. Only the RANK_WINDOW newest
+    matches are ranked. Raises ValueError for an empty query or a malformed filter.
+    """
+    candidates = _candidates(TRANSACTION_JSON.columns, user_id, _parse_terms(q), args).limit(RANK_WINDOW).subquery()
+    return select(*[candidates.c[column.key] for column in TRANSACTION_JSON.columns]).order_by(
+        candidates.c.score, candidates.c.timestamp.desc(), candidates.c.id.desc()
+    )
+
+
+def truncated_statement(user_id, q, args):
+    """Select of the id of the first match past RANK_WINDOW, if any: its row means search_statement dropped matches."""
+    return _candidates([Transaction.id], user_id, _parse_terms(q), args).limit(1).offset(RANK_WINDOW)
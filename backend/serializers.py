@@ -0,0 +1,122 @@
+import re
+from json.encoder import encode_basestring_ascii
+from flask import Response
+from backend.models import Transaction, Budget
+from backend.money import cents_to_float
+
+try:
+    import orjson
+except ImportError: # optional; the template encoder below is used instead
+    orjson = None
+
+# ORM-free JSON for the list endpoints.
+#
+# A RowSerializer selects only the columns a payload needs and turns the plain
+# row tuples straight into the bytes `jsonify` would produce for the equivalent
+# dicts: keys sorted, compact separators, non-ASCII escaped. No model instances,
+# per-row to_dict() or intermediate JSON tree are built. With orjson installed the
+# rows are encoded by it; its output is identical whenever it is pure 7-bit ASCII
+# (orjson leaves DEL and non-ASCII characters unescaped), and anything else goes
+# through the precompiled template, which escapes exactly like the json module.
+
+_NEEDS_ESCAPE = re.compile(rb'[\x7f-\xff]')
+
+
+def _iso(value):
+    return 'null' if value is None else '"' + value.isoformat() + '"'
+
+
+_ENCODERS = {
+    'int': lambda value: 'null' if value is None else str(value),
+    'str': lambda value: 'null' if value is None else encode_basestring_ascii(value),
+    'cents': lambda value: 'null' if value is None else repr(cents_to_float(value)), # as json.dumps writes floats
+    'date': _iso,
+    'datetime': _iso,
+}
+
+
+class RowSerializer:
+
+    def __init__(self, fields):
+        """`fields` is [(json key, column, kind)] in the order to_dict() lists them."""
+        self.dict_order = [key for key, _, _ in fields]
+        # Rows are selected in sorted key order, which is also the JSON key order
+        fields = sorted(fields, key=lambda field: field[0])
+        self.keys = [key for key, _, _ in fields]
+        self.columns = [column for _, column, _ in fields]
+        self.kinds = [kind for _, _, kind in fields]
+        self.cents_positions = [i for i, kind in enumerate(self.kinds) if kind == 'cents']
+        self.template = '{' + ','.join(f'"{key}":%s' for key in self.keys) + '}'
+        self.encoders = [_ENCODERS[kind] for kind in self.kinds]
+
+    def _plain(self, row):
+        """Row -> list of JSON-ready values in key order (dates stay date objects)."""
+        values = list(row)
+        for i in self.cents_positions:
+            if values[i] is not None:
+                values[i] = cents_to_float(values[i])
+        return values
+
+    def to_dict(self, row):
+        """One row as the dict the model's to_dict() returns."""
+        values = dict(zip(self.keys, self._plain(row)))
+        for key, kind in zip(self.keys, self.kinds):
+            if kind in ('date', 'datetime') and values[key] is not None:
+                values[key] = values[key].isoformat()
+        return {key: values[key] for key in self.dict_order}
+
+    def encode(self, rows):
+        """JSON array bytes for a list of rows."""
+        if orjson is not None:
+            keys = self.keys
+            body = orjson.dumps([dict(zip(keys, self._plain(row))) for row in rows])
+            if not _NEEDS_ESCAPE.search(body):
+                return body
+        template, encoders = self.template, self.encoders
+        return ('[' + ','.join(
+            template % tuple(encode(value) for encode, value in zip(encoders, row)) for row in rows
+        ) + ']').encode()
+
+
+def json_response(body, status=200):
+    """A response carrying already-encoded JSON, newline-terminated like jsonify's."""
+    return Response(body + b'\n', status=status, mimetype='application/json')
+
+
+def page_body(items_key, items_body, next_cursor):
+    """Bytes of {"next_cursor": ..., items_key: [...]} with jsonify's key order."""
+    cursor = 'null' if next_cursor is None else encode_basestring_ascii(next_cursor)
+    return b'{"next_cursor":' + cursor.encode() + b',"' + items_key.encode() + b'":' + items_body + b'}'
+
+
+def object_body(members):
+    """Bytes of a JSON object from {key: already-encoded value bytes}, keys sorted as jsonify sorts them."""
+    return b'{' + b','.join(
+        encode_basestring_ascii(key).encode() + b':' + members[key] for key in sorted(members)
+    ) + b'}'
+
+
+def ids_body(ids):
+    """JSON array bytes for a list of integer ids."""
+    return ('[' + ','.join(map(str, ids)) + ']').encode()
+
+
+# user_id is left out: every row in a listing belongs to the requesting user
+TRANSACTION_JSON = RowSerializer([
+    ('id', Transaction.id, 'int'),
+    ('description', Transaction.description, 'str'),
+    ('amount', Transaction.amount_cents, 'cents'),
+    ('type', Transaction.type, 'str'),
+    ('category', Transaction.category, 'str'),
+    ('date', Transaction.date, 'date'),
+    ('timestamp', Transaction.timestamp, 'datetime'),
+])
+
+BUDGET_JSON = RowSerializer([
+    ('id', Budget.id, 'int'),
+    ('category', Budget.category, 'str'),
+    ('amount', Budget.amount_cents, 'cents'),
+    ('start_date', Budget.start_date, 'date'),
+    ('end_date', Budget.end_date, 'date'),
+    ('timestamp', Budget.timestamp, 'datetime'),
+])
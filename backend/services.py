@@ -0,0 +1,107 @@
+import base64
+from datetime import datetime, timedelta
+from sqlalchemy import and_, exists, or_, select
+from backend.models import Transaction
+from backend.money import to_cents
+
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def parse_date(value):
+    """Parses a YYYY-MM-DD string into a date. Raises ValueError on bad input."""
+    return datetime.strptime(value, DATE_FORMAT).date()
+
+
+def period_date_range(period):
+    """
+    Maps a report period ('3months', '6months', '1year') to a (start_date, end_date)
+    range ending today. Unknown periods fall back to 6 months.
+    """
+    end_date = datetime.utcnow().date()
+    if period == '3months':
+        start_date = end_date - timedelta(days=3 * 30) # Approx 3 months
+    elif period == '1year':
+        start_date = end_date - timedelta(days=365)
+    else: # Default to 6 months
+        start_date = end_date - timedelta(days=6 * 30)
+    return start_date, end_date
+
+
+def transaction_filter_conditions(args):
+    """
+    The optional listing filters (start_date, end_date, type, category,
+    min_amount, max_amount) in `args` as a list of Transaction conditions.
+    Raises ValueError if a date or amount filter is malformed.
+    """
+    conditions = []
+    if args.get('start_date'):
+        conditions.append(Transaction.date >= parse_date(args['start_date']))
+    if args.get('end_date'):
+        conditions.append(Transaction.date <= parse_date(args['end_date']))
+    if args.get('type'):
+        conditions.append(Transaction.type == args['type'])
+    if args.get('category'):
+        conditions.append(Transaction.category == args['category'])
+    if args.get('min_amount'):
+        conditions.append(Transaction.amount_cents >= to_cents(args['min_amount']))
+    if args.get('max_amount'):
+        conditions.append(Transaction.amount_cents <= to_cents(args['max_amount']))
+    return conditions
+
+
+def apply_transaction_filters(query, args):
+    """
+    Applies the listing filters from a request's query parameters to a Transaction
+    query (see transaction_filter_conditions). Raises ValueError if one is malformed.
+    """
+    conditions = transaction_filter_conditions(args)
+    return query.filter(*conditions) if conditions else query
+
+
+# --- Keyset pagination cursors ---
+# A cursor is the (timestamp, id) of the last row of a page, encoded as an
+# opaque url-safe token. The next page continues strictly after that row in
+# the (timestamp DESC, id DESC) listing order. Rows without a timestamp have no
+# place in that order, so paging refuses to run while a user has any (see
+# missing_timestamps_statement) until `flask migrate-timestamps` backfills them.
+
+MISSING_TIMESTAMPS = "Some transactions have no timestamp and cannot be paged; run `flask migrate-timestamps`"
+
+
+def parse_limit(value, default=None):
+    """A page size query parameter as an int, or `default` when absent. Raises ValueError if malformed."""
+    if not value:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError("Invalid limit: must be an integer") from None
+
+
+def encode_cursor(timestamp, row_id):
+    raw = f"{timestamp.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(token):
+    """Returns (timestamp, id) for a cursor token. Raises ValueError("Invalid cursor") if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(token.encode()).decode()
+        timestamp, row_id = raw.split('|')
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (TypeError, ValueError): # includes binascii.Error and UnicodeDecodeError
+        raise ValueError("Invalid cursor") from None
+
+
+def apply_keyset(query, cursor):
+    """Restricts an ordered Transaction query to the rows after the given cursor token."""
+    timestamp, row_id = decode_cursor(cursor)
+    return query.filter(or_(
+        Transaction.timestamp < timestamp,
+        and_(Transaction.timestamp == timestamp, Transaction.id < row_id)
+    ))
+
+
+def missing_timestamps_statement(user_id):
+    """Whether any of the user's transactions lacks a timestamp; one seek on (user_id, timestamp, id)."""
+    return select(exists().where(Transaction.user_id == user_id, Transaction.timestamp.is_(None)))
@@ -0,0 +1,344 @@
+import bisect
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, request, jsonify, has_request_context
+from sqlalchemy import select, insert, delete, func, inspect
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.sql.util import find_tables
+
+# User-sharded storage.
+#
+# Accounts (User, RevokedToken, ShardAssignment) always live on the primary
+# database. Everything owned by a user (transactions, budgets, rollups, insights,
+# category rules, sync state) lives on exactly one shard: the primary itself ('default') or
+# one of the extra databases in SHARD_DATABASE_URLS, registered as binds 'shard1',
+# 'shard2', ...
+# New users are placed by a consistent-hash ring over the shard names; the choice
+# is recorded in ShardAssignment, and users without a row (those that predate
+# sharding) stay on 'default'. Adding a shard only changes the ring target of
+# roughly 1/N of the users, and `flask shards rebalance` moves exactly those.
+#
+# Each request looks up its user's shard once (cached per process for
+# SHARD_ASSIGNMENT_TTL seconds) and RoutingSession sends every statement touching a
+# sharded table to that shard's engine, so route code is unchanged. Outside
+# requests, `shard_router.use(shard)` / `shard_router.for_user(user_id)` select the
+# shard instead. Pending ORM objects are flushed to whichever shard is current at
+# flush time, so flush inside the block.
+#
+# Moving a user is online: their rows are flagged as moving, and once every
+# worker has seen the flag (one TTL) their writes get a 503 with Retry-After while
+# reads continue from the old shard. The rows are copied, the assignment flips to
+# the new shard, and after another TTL the old copies are deleted.
+
+DEFAULT_SHARD = 'default'
+SHARDED_TABLES = ('transaction', 'budget', 'monthly_rollup', 'user_insights', 'category_rule',
+                  'sync_state', 'sync_tombstone')
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+COPY_BATCH_SIZE = 5000 # Rows per INSERT when copying a user between shards
+MOVE_BATCH_SIZE = 100 # Users flagged as moving together during a rebalance
+
+_current_shard = ContextVar('pfm_current_shard', default=None)
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.sha1(str(value).encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hashing with `vnodes` points per shard on a 64-bit ring."""
+
+    def __init__(self, shards, vnodes=64):
+        points = sorted((_hash(f'{shard}#{i}'), shard) for shard in shards for i in range(vnodes))
+        self.keys = [key for key, _ in points]
+        self.shards = [shard for _, shard in points]
+
+    def shard_for(self, key):
+        index = bisect.bisect(self.keys, _hash(key)) % len(self.keys)
+        return self.shards[index]
+
+
+class ShardRouter:
+
+    def __init__(self, app=None):
+        self.shards = [DEFAULT_SHARD]
+        self.ring = HashRing(self.shards)
+        self.assignment_ttl = 5.0
+        self.cache_size = 10000
+        self.assignments = OrderedDict() # user_id -> (shard, moving, loaded_at)
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Builds the ring from the configured shard binds. Without any, sharding stays off."""
+        self.shards = [DEFAULT_SHARD] + list(app.config.get('SHARD_BINDS', []))
+        self.ring = HashRing(self.shards, app.config.get('SHARD_VIRTUAL_NODES', 64))
+        self.assignment_ttl = app.config.get('SHARD_ASSIGNMENT_TTL', self.assignment_ttl)
+        self.cache_size = app.config.get('SHARD_LOOKUP_CACHE_SIZE', self.cache_size)
+        if self.enabled:
+            app.before_request(self._bind_request)
+
+    @property
+    def enabled(self):
+        return len(self.shards) > 1
+
+    def engine(self, shard):
+        from backend.database import db
+
+        return db.engine if shard == DEFAULT_SHARD else db.engines[shard]
+
+    def tables(self):
+        from backend.database import db
+
+        return [db.metadata.tables[name] for name in SHARDED_TABLES]
+
+    # --- Lookup ---
+
+    def target(self, user_id):
+        """The shard the ring places a user on."""
+        return self.ring.shard_for(user_id) if self.enabled else DEFAULT_SHARD
+
+    def lookup(self, user_id, fresh=False):
+        """(shard, moving) for a user, from the per-process cache unless it is stale or `fresh`."""
+        from backend.database import db
+        from backend.models import ShardAssignment
+
+        if not self.enabled:
+            return DEFAULT_SHARD, False
+        now = time.monotonic()
+        with self.lock:
+            entry = self.assignments.get(user_id)
+        if entry is not None and not fresh and now - entry[2] < self.assignment_ttl:
+            return entry[0], entry[1]
+
+        row = db.session.execute(
+            select(ShardAssignment.shard, ShardAssignment.moving).where(ShardAssignment.user_id == user_id)
+        ).first()
+        shard, moving = (row.shard, row.moving) if row else (DEFAULT_SHARD, False)
+        if shard not in self.shards:
+            raise RuntimeError(f"User {user_id} is assigned to shard '{shard}', which is not configured")
+        self._remember(user_id, shard, moving)
+        return shard, moving
+
+    def _remember(self, user_id, shard, moving):
+        with self.lock:
+            self.assignments[user_id] = (shard, moving, time.monotonic())
+            self.assignments.move_to_end(user_id)
+            while len(self.assignments) > self.cache_size:
+                self.assignments.popitem(last=False)
+
+    def assign(self, user_id):
+        """Places a new user on their ring shard. Does not commit; the caller does."""
+        from backend.database import db
+        from backend.models import ShardAssignment
+
+        if not self.enabled:
+            return DEFAULT_SHARD
+        shard = self.target(user_id)
+        db.session.add(ShardAssignment(user_id=user_id, shard=shard, moving=False))
+        self._remember(user_id, shard, False)
+        return shard
+
+    # --- Session binding ---
+
+    def current(self):
+        """The shard selected by `use()`, else the current request's, else None."""
+        shard = _current_shard.get()
+        if shard is None and has_request_context():
+            shard = g.get('db_shard')
+        return shard
+
+    @contextmanager
+    def use(self, shard):
+        token = _current_shard.set(shard)
+        try:
+            yield shard
+        finally:
+            _current_shard.reset(token)
+
+    def for_user(self, user_id):
+        return self.use(self.lookup(user_id)[0])
+
+    def bind_for(self, mapper=None, clause=None):
+        """Engine for a statement on a sharded table while a non-default shard is current, else None."""
+        shard = self.current()
+        if shard is None or shard == DEFAULT_SHARD:
+            return None
+        if mapper is not None:
+            table = getattr(mapper, 'local_table', None)
+            if table is None:
+                table = getattr(mapper, '__table__', None) # a mapped class rather than its mapper
+            sharded = table is not None and table.name in SHARDED_TABLES
+        elif clause is not None:
+            sharded = any(getattr(table, 'name', None) in SHARDED_TABLES
+                          for table in find_tables(clause, include_crud=True))
+        else:
+            sharded = False
+        return self.engine(shard) if sharded else None
+
+    def _bind_request(self):
+        from backend.auth import get_current_user_id
+
+        user_id = get_current_user_id()
+        if not user_id:
+            return None # Unauthenticated requests only touch the primary
+        shard, moving = self.lookup(user_id)
+        g.db_shard = shard
+        if moving and request.method not in READ_METHODS:
+            return jsonify({"message": "Your data is being moved, please retry shortly"}), 503, \
+                {"Retry-After": str(max(int(self.assignment_ttl), 1))}
+        return None
+
+    # --- Maintenance ---
+
+    def create_tables(self):
+        """
+        Creates the sharded tables, their indexes and the search index on every
+        extra shard (without foreign keys to user).
+        """
+        from backend import search
+
+        for shard in self.shards[1:]:
+            with self.engine(shard).begin() as conn:
+                existing = set(inspect(conn).get_table_names())
+                for table in self.tables():
+                    if table.name not in existing:
+                        conn.execute(CreateTable(table, include_foreign_key_constraints=[]))
+                    for index in table.indexes:
+                        index.create(conn, checkfirst=True)
+                search.create_index(conn)
+
+    def user_counts(self):
+        """{shard: users assigned to it}; users without an assignment count towards 'default'."""
+        from backend.database import db
+        from backend.models import User, ShardAssignment
+
+        counts = dict.fromkeys(self.shards, 0)
+        rows = db.session.execute(
+            select(ShardAssignment.shard, func.count()).group_by(ShardAssignment.shard)
+        ).all()
+        for shard, count in rows:
+            counts[shard] = count
+        unassigned = db.session.execute(select(func.count(User.id)).where(
+            ~User.id.in_(select(ShardAssignment.user_id))
+        )).scalar()
+        counts[DEFAULT_SHARD] += unassigned
+        return counts
+
+    def misplaced(self):
+        """[(user_id, current shard, ring target)] for every user not on their ring shard."""
+        from backend.database import db
+        from backend.models import User, ShardAssignment
+
+        rows = db.session.execute(
+            select(User.id, ShardAssignment.shard).outerjoin(ShardAssignment, ShardAssignment.user_id == User.id)
+            .order_by(User.id)
+        ).all()
+        moves = []
+        for user_id, shard in rows:
+            shard = shard or DEFAULT_SHARD
+            target = self.target(user_id)
+            if shard != target:
+                moves.append((user_id, shard, target))
+        return moves
+
+    def _set_assignments(self, placements, moving):
+        from backend.database import db
+        from backend.models import ShardAssignment
+
+        for user_id, shard in placements:
+            db.session.merge(ShardAssignment(user_id=user_id, shard=shard, moving=moving))
+        db.session.commit()
+        for user_id, shard in placements:
+            self._remember(user_id, shard, moving)
+
+    def _copy_user(self, user_id, source, target):
+        """Copies a user's rows in one target transaction. Returns (rows copied, rows given new ids)."""
+        copied = renumbered = 0
+        with self.engine(source).connect() as src, self.engine(target).begin() as dst:
+            for table in self.tables():
+                # Leftovers of an earlier, interrupted move
+                dst.execute(delete(table).where(table.c.user_id == user_id))
+                result = src.execution_options(stream_results=True).execute(
+                    select(table).where(table.c.user_id == user_id)
+                )
+                for batch in result.mappings().partitions(COPY_BATCH_SIZE):
+                    rows = [dict(row) for row in batch]
+                    if 'id' in table.c:
+                        # Ids are per-database sequences; keep each row's id unless the target already uses it
+                        taken = set(dst.execute(
+                            select(table.c.id).where(table.c.id.in_([row['id'] for row in rows]))
+                        ).scalars())
+                        kept = [row for row in rows if row['id'] not in taken]
+                        moved = [{k: v for k, v in row.items() if k != 'id'} for row in rows if row['id'] in taken]
+                        for group in (kept, moved):
+                            if group:
+                                dst.execute(insert(table), group)
+                        renumbered += len(moved)
+                    else:
+                        dst.execute(insert(table), rows)
+                    copied += len(rows)
+            if renumbered:
+                # Clients hold the old ids; their next sync must be a full one
+                from backend import sync
+                sync.require_full_resync(dst, user_id)
+        return copied, renumbered
+
+    def _delete_user(self, user_id, shard):
+        with self.engine(shard).begin() as conn:
+            for table in reversed(self.tables()):
+                conn.execute(delete(table).where(table.c.user_id == user_id))
+
+    def move_users(self, moves, grace=None, progress=None):
+        """
+        Moves each (user_id, target shard) online, MOVE_BATCH_SIZE users at a time.
+        `grace` is how long to wait for other workers to see an assignment change
+        (default: SHARD_ASSIGNMENT_TTL). Returns [(user_id, source, target, copied, renumbered)].
+        Needs an app context.
+        """
+        from backend.cache import response_cache
+
+        grace = self.assignment_ttl if grace is None else grace
+        for shard in {target for _, target in moves}:
+            if shard not in self.shards:
+                raise ValueError(f"Unknown shard '{shard}'")
+        done = []
+        for i in range(0, len(moves), MOVE_BATCH_SIZE):
+            batch = [(user_id, self.lookup(user_id, fresh=True)[0], target)
+                     for user_id, target in moves[i:i + MOVE_BATCH_SIZE]]
+            batch = [move for move in batch if move[1] != move[2]]
+            if not batch:
+                continue
+
+            self._set_assignments([(user_id, source) for user_id, source, _ in batch], moving=True)
+            time.sleep(grace) # every worker now rejects these users' writes
+            copies = []
+            try:
+                for user_id, source, target in batch:
+                    copies.append(self._copy_user(user_id, source, target))
+            except Exception:
+                for (user_id, _, target), _ in zip(batch, copies):
+                    self._delete_user(user_id, target)
+                self._set_assignments([(user_id, source) for user_id, source, _ in batch], moving=False)
+                raise
+            self._set_assignments([(user_id, target) for user_id, _, target in batch], moving=False)
+            time.sleep(grace) # no worker reads the old copies any more
+
+            for (user_id, source, target), (copied, renumbered) in zip(batch, copies):
+                self._delete_user(user_id, source)
+                response_cache.bump_version(user_id) # renumbered rows change cached bodies
+                done.append((user_id, source, target, copied, renumbered))
+                if progress:
+                    progress(done[-1])
+        return done
+
+    def rebalance(self, grace=None, progress=None):
+        """Moves every user that is not on their ring shard (after shards were added)."""
+        return self.move_users([(user_id, target) for user_id, _, target in self.misplaced()], grace, progress)
+
+
+shard_router = ShardRouter()
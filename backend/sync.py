@@ -0,0 +1,137 @@
+from datetime import datetime
+from sqlalchemy import event, func, literal, select, insert, update, delete
+from backend.database import db, RoutingSession
+from backend.models import Transaction, Budget, SyncState, SyncTombstone
+from backend.serializers import TRANSACTION_JSON, BUDGET_JSON
+
+# Change feed behind /api/sync, so clients can keep a local copy of their
+# transactions and budgets and fetch only what changed since their last sync.
+#
+# Every user has a counter (SyncState.seq). A write stamps the rows it inserts or
+# updates with `seq(user_id)`, the counter's next value, reserved once per DB
+# transaction, and a delete leaves a SyncTombstone with that value. The counter is
+# bumped with an upsert whose row lock is held until commit, so a user's sequence
+# numbers become visible in order and reading the counter before the rows never
+# misses a change. A sync token is the counter value a client has seen; changes
+# since then are read from the (user_id, change_seq) indexes in O(changes).
+#
+# Clients apply `deleted` before the changed rows (SQLite can reuse the id of a
+# deleted row). Tombstones older than TOMBSTONE_RETENTION_DAYS are pruned by
+# `flask sync prune`, which raises the user's `floor`: a token below it, one
+# ahead of the counter, or none at all gets a full snapshot with "full": true.
+
+TOMBSTONE_RETENTION_DAYS = 90
+KINDS = {'transaction': Transaction, 'budget': Budget}
+
+_RESERVED = 'sync_seq' # session.info key: {user_id: sequence number of this transaction's changes}
+
+
+def _insert_for(dialect_name):
+    if dialect_name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert
+
+
+def seq(user_id):
+    """The sequence number to stamp on this transaction's changes for `user_id`, reserved on first use."""
+    reserved = db.session.info.setdefault(_RESERVED, {})
+    if user_id not in reserved:
+        table = SyncState.__table__
+        stmt = _insert_for(db.session.get_bind(SyncState).dialect.name)(table).values(user_id=user_id, seq=1, floor=0)
+        stmt = stmt.on_conflict_do_update(index_elements=['user_id'], set_={'seq': table.c.seq + 1})
+        reserved[user_id] = db.session.execute(stmt.returning(table.c.seq)).scalar_one()
+    return reserved[user_id]
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _release(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_RESERVED, None)
+
+
+def record_deletes(kind, user_id, *conditions):
+    """Leaves tombstones for the user's rows of `kind` matching `conditions`. Call before deleting them."""
+    model = KINDS[kind]
+    rows = select(
+        model.user_id, literal(kind), model.id, literal(seq(user_id)),
+        literal(datetime.utcnow(), SyncTombstone.deleted_at.type)
+    ).where(model.user_id == user_id, *conditions)
+    db.session.execute(insert(SyncTombstone).from_select(
+        ['user_id', 'kind', 'row_id', 'change_seq', 'deleted_at'], rows
+    ))
+
+
+def require_full_resync(connection, user_id):
+    """Invalidates every token the user holds, e.g. after their row ids changed. Runs on a Core connection."""
+    table = SyncState.__table__
+    stmt = _insert_for(connection.dialect.name)(table).values(user_id=user_id, seq=1, floor=1)
+    connection.execute(stmt.on_conflict_do_update(
+        index_elements=['user_id'], set_={'seq': table.c.seq + 1, 'floor': table.c.seq + 1}
+    ))
+
+
+# --- Reads ---
+
+def changes(user_id, since=None):
+    """
+    The user's changes after token `since` (an int, or None for everything):
+    {'token', 'full', 'transactions', 'budgets', 'deleted'}, with the rows as
+    TRANSACTION_JSON / BUDGET_JSON tuples and `deleted` as {'transactions': ids, 'budgets': ids}.
+    """
+    # The counter first: every change it covers has committed, so none is missed
+    state = db.session.execute(
+        select(SyncState.seq, SyncState.floor).where(SyncState.user_id == user_id)
+    ).first()
+    current, floor = state if state is not None else (0, 0)
+    full = since is None or since < floor or since > current
+
+    def rows(serializer, model):
+        query = select(*serializer.columns).where(model.user_id == user_id)
+        if not full:
+            query = query.where(model.change_seq > since)
+        return db.session.execute(query.order_by(model.change_seq, model.id)).all()
+
+    deleted = {'transactions': [], 'budgets': []}
+    if not full:
+        tombstones = db.session.execute(
+            select(SyncTombstone.kind, SyncTombstone.row_id)
+            .where(SyncTombstone.user_id == user_id, SyncTombstone.change_seq > since)
+            .order_by(SyncTombstone.change_seq, SyncTombstone.id)
+        )
+        for kind, row_id in tombstones:
+            deleted[kind + 's'].append(row_id)
+    return {
+        'token': str(current),
+        'full': full,
+        'transactions': rows(TRANSACTION_JSON, Transaction),
+        'budgets': rows(BUDGET_JSON, Budget),
+        'deleted': deleted,
+    }
+
+
+def parse_token(token):
+    """The sequence number in a sync token. Raises ValueError if it is invalid."""
+    if not token.isdigit():
+        raise ValueError(f"Invalid sync token: {token}")
+    return int(token)
+
+
+# --- Maintenance ---
+
+def prune(older_than):
+    """
+    Drops tombstones of deletes before `older_than`, first raising each affected
+    user's floor to the newest of them. Returns (tombstones dropped, user ids).
+    """
+    floors = db.session.execute(
+        select(SyncTombstone.user_id, func.max(SyncTombstone.change_seq))
+        .where(SyncTombstone.deleted_at < older_than).group_by(SyncTombstone.user_id)
+    ).all()
+    for user_id, newest in floors:
+        db.session.execute(update(SyncState).where(
+            SyncState.user_id == user_id, SyncState.floor < newest
+        ).values(floor=newest))
+    dropped = db.session.execute(delete(SyncTombstone).where(SyncTombstone.deleted_at < older_than)).rowcount
+    return dropped, [user_id for user_id, _ in floors]
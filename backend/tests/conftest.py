@@ -0,0 +1,64 @@
+import os
+import tempfile
+import uuid
+import pytest
+
+# backend.config reads the environment when first imported, so the test settings
+# are in place before the app is. All tests share one temporary SQLite database;
+# each one registers its own user, so nothing needs resetting between them.
+
+_DB_DIR = tempfile.mkdtemp(prefix='pfm-tests-')
+os.environ.update({
+    'DATABASE_URL': 'sqlite:///' + os.path.join(_DB_DIR, 'test.db'),
+    'SECRET_KEY': 'test-secret-key',
+    'DB_PROFILE': 'default',
+    'SHARD_DATABASE_URLS': '',
+    'READ_DATABASE_URL': '',
+    'RESPONSE_CACHE_BACKEND': 'memory',
+    'WRITE_QUEUE_ENABLED': '0',
+})
+
+from backend.app import create_app # noqa: E402
+from backend.auth import token_auth # noqa: E402
+from backend.database import db # noqa: E402
+from backend import search # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.app_context():
+        db.create_all()
+        with db.engine.begin() as conn:
+            search.create_index(conn)
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(client):
+    """A newly registered user: (user_id, request headers carrying their token)."""
+    response = client.post('/api/auth/register', json={'email': f'{uuid.uuid4().hex}@example.com', 'password': 'pw'})
+    user_id = response.get_json()['user_id']
+    return user_id, {'Authorization': 'Bearer ' + token_auth.issue_token(user_id)}
+
+
+@pytest.fixture
+def add_transaction(client, user):
+    """Posts a transaction for `user` and returns its JSON."""
+    _, headers = user
+
+    def add(description='Groceries', amount='10.00', type='expense', category='Food', date=None):
+        body = {'description': description, 'amount': amount, 'type': type, 'category': category}
+        if date is not None:
+            body['date'] = date.isoformat()
+        response = client.post('/api/transactions/', json=body, headers=headers)
+        assert response.status_code == 201, response.get_json()
+        return response.get_json()['transaction']
+
+    return add
@@ -0,0 +1,96 @@
+import asyncio
+import time
+import pytest
+
+pytest.importorskip('asgiref')
+pytest.importorskip('aiosqlite')
+
+from backend.asgi import create_asgi_app, CORS_ORIGIN # noqa: E402
+from backend.auth import token_auth # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def asgi(app):
+    return create_asgi_app(app)
+
+
+def call(asgi, path, headers=None):
+    """Runs one GET through the ASGI app. Returns (status, {header: value}, body)."""
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+        'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        'http_version': '1.1', 'scheme': 'http', 'server': ('test', 80), 'client': ('test', 1), 'root_path': '',
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(asgi(scope, receive, send))
+    start, body = messages[0], messages[1]
+    return start['status'], {name.decode(): value.decode() for name, value in start['headers']}, body['body']
+
+
+def _cors(headers):
+    return {name.lower(): value for name, value in headers.items()
+            if name.lower().startswith('access-control-') or name.lower() == 'vary'}
+
+
+@pytest.mark.parametrize('origin', [CORS_ORIGIN, 'http://elsewhere.example', None])
+def test_cors_headers_match_flask(asgi, client, user, origin):
+    _, headers = user
+    if origin:
+        headers = {**headers, 'Origin': origin}
+    status, asgi_headers, _ = call(asgi, '/api/dashboard', headers)
+    flask_response = client.get('/api/dashboard', headers=headers)
+    assert status == flask_response.status_code == 200
+    assert _cors(asgi_headers) == _cors(dict(flask_response.headers))
+
+
+def test_requests_are_counted_in_metrics(asgi, client, user):
+    _, headers = user
+    assert call(asgi, '/api/budgets/', headers)[0] == 200
+    metrics = client.get('/metrics').get_data(as_text=True)
+    assert 'pfm_http_requests_total{endpoint="budget.get_budgets",method="GET",status="200"}' in metrics
+    assert 'pfm_db_query_duration_seconds_count{endpoint="budget.get_budgets"}' in metrics
+
+
+def test_blocking_auth_does_not_stall_the_event_loop(asgi, user, monkeypatch):
+    _, headers = user
+    verify = token_auth.verify_token
+
+    def slow_verify(token):
+        time.sleep(0.2) # e.g. reloading the revocation list from a slow database
+        return verify(token)
+
+    monkeypatch.setattr(token_auth, 'verify_token', slow_verify)
+    ticks = []
+
+    async def ticker():
+        for _ in range(10):
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/api/budgets/', 'raw_path': b'/api/budgets/',
+                 'query_string': b'', 'headers': [(b'authorization', headers['Authorization'].encode())]}
+        async def request():
+            await asyncio.sleep(0.005) # let the ticker start first
+            await asgi(scope, receive, send)
+
+        await asyncio.gather(ticker(), request())
+        return messages[0]['status']
+
+    assert asyncio.run(main()) == 200
+    assert len(ticks) == 10 and ticks[-1] - ticks[0] < 0.19
@@ -0,0 +1,46 @@
+from sqlalchemy import delete
+from backend.database import db
+from backend.models import Transaction
+from backend import rollups, sync
+
+
+def listing_ids(client, headers):
+    return sorted(t['id'] for t in client.get('/api/transactions/', headers=headers).get_json())
+
+
+def test_unknown_ids_fail_the_whole_batch(client, user, add_transaction):
+    _, headers = user
+    ids = [add_transaction()['id'] for _ in range(3)]
+
+    response = client.post('/api/transactions/batch', json={'operation': 'delete', 'ids': ids + [10 ** 9]},
+                           headers=headers)
+    assert response.status_code == 404
+    assert response.get_json()['missing_ids'] == [10 ** 9]
+    assert listing_ids(client, headers) == ids
+
+
+def test_rows_changing_underneath_conflict(app, client, user, add_transaction, monkeypatch):
+    user_id, headers = user
+    ids = [add_transaction()['id'] for _ in range(3)]
+
+    record_deletes = sync.record_deletes
+
+    def concurrent_delete(kind, user_id, *conditions):
+        record_deletes(kind, user_id, *conditions)
+        # Another writer removes a selected row after the batch counted its selection
+        db.session.execute(delete(Transaction).where(Transaction.id == ids[0]))
+
+    monkeypatch.setattr(sync, 'record_deletes', concurrent_delete)
+    response = client.post('/api/transactions/batch', json={'operation': 'delete', 'ids': ids}, headers=headers)
+    assert response.status_code == 409
+    assert response.get_json() == {"message": "The selected rows changed while the batch ran; please retry"}
+
+    assert listing_ids(client, headers) == ids # all or nothing
+    with app.app_context():
+        assert rollups.verify(user_id) == []
+
+    monkeypatch.setattr(sync, 'record_deletes', record_deletes)
+    response = client.post('/api/transactions/batch', json={'operation': 'delete', 'ids': ids}, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['affected'] == 3
+    assert listing_ids(client, headers) == []
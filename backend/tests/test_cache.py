@@ -0,0 +1,52 @@
+from werkzeug.datastructures import MultiDict
+from backend.cache import LRUCacheBackend, ResponseCache
+
+
+class _App:
+    def __init__(self, **config):
+        self.config = config
+
+
+def test_memory_backend_keys_expire_with_the_version_slot(monkeypatch):
+    cache = ResponseCache()
+    cache.init_app(_App(RESPONSE_CACHE_VERSION_MAX_AGE=30))
+    monkeypatch.setattr('backend.cache.time.time', lambda: 1000.0)
+    key = cache.make_key(1, 'dashboard.get_dashboard', MultiDict())
+    monkeypatch.setattr('backend.cache.time.time', lambda: 1010.0)
+    assert cache.make_key(1, 'dashboard.get_dashboard', MultiDict()) == key
+    monkeypatch.setattr('backend.cache.time.time', lambda: 1031.0)
+    assert cache.make_key(1, 'dashboard.get_dashboard', MultiDict()) != key
+
+
+def test_shared_backend_keys_do_not_expire(monkeypatch):
+    class SharedBackend(LRUCacheBackend):
+        shared = True
+
+    cache = ResponseCache()
+    cache.init_app(_App(), backend=SharedBackend())
+    monkeypatch.setattr('backend.cache.time.time', lambda: 1000.0)
+    key = cache.make_key(1, 'dashboard.get_dashboard', MultiDict())
+    monkeypatch.setattr('backend.cache.time.time', lambda: 99999.0)
+    assert cache.make_key(1, 'dashboard.get_dashboard', MultiDict()) == key
+
+
+def test_counters_are_separate_from_user_versions():
+    cache = ResponseCache()
+    cache.init_app(_App())
+    cache.bump_counter('category-rules:1')
+    assert cache.get_counter('category-rules:1') == 1
+    assert cache.get_version(1) == 0
+    cache.bump_version(1)
+    assert cache.get_counter('category-rules:1') == 1
+
+
+def test_write_changes_etag(client, user, add_transaction):
+    _, headers = user
+    first = client.get('/api/transactions/summary', headers=headers)
+    assert client.get('/api/transactions/summary', headers={
+        **headers, 'If-None-Match': first.headers['ETag']
+    }).status_code == 304
+    add_transaction(amount='5.00')
+    after = client.get('/api/transactions/summary', headers={**headers, 'If-None-Match': first.headers['ETag']})
+    assert after.status_code == 200
+    assert after.get_json()['total_expenses'] == 5.0
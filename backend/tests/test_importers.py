@@ -0,0 +1,67 @@
+import io
+import pytest
+from backend import importers
+
+
+def upload(client, headers, text, **form):
+    data = {'file': (io.BytesIO(text.encode()), 'statement.csv'), **form}
+    response = client.post('/api/transactions/import', data=data, headers=headers, content_type='multipart/form-data')
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+@pytest.mark.parametrize('raw, cents', [
+    ('12.50', 1250), ('$1,234.56', 123456), ('1,234', 123400), ('-1,234,567', -123456700), ('(2,000)', -200000),
+])
+def test_amounts(raw, cents):
+    values = importers.normalize({'description': 'x', 'amount': raw, 'date': '2024-01-02'})
+    assert values['amount_cents'] == abs(cents)
+    assert values['type'] == ('expense' if cents < 0 else 'income')
+
+
+@pytest.mark.parametrize('raw', ['12,50', '1,5', '1,2345', '12,345,67'])
+def test_decimal_comma_is_rejected(raw):
+    with pytest.raises(ValueError, match='Ambiguous amount'):
+        importers.normalize({'description': 'x', 'amount': raw, 'date': '2024-01-02'})
+
+
+def test_errors_are_reported_per_row(client, user):
+    _, headers = user
+    result = upload(client, headers, 'date,description,amount\n'
+                                     '2024-01-02,Coffee,-3.50\n'
+                                     '2024-13-02,Bad date,-1.00\n'
+                                     '2024-01-03,,-2.00\n'
+                                     '2024-01-04,Lunch,"12,50"\n'
+                                     '2024-01-05,Salary,"1,234"\n')
+    assert result['imported'] == 2
+    assert result['error_count'] == 3
+    assert [error['row'] for error in result['errors']] == [3, 4, 5]
+    assert 'Ambiguous amount' in result['errors'][2]['message']
+
+
+def test_reimport_skips_stored_rows_and_keeps_in_file_repeats(client, user):
+    _, headers = user
+    statement = ('date,description,amount\n'
+                 '2024-02-01,Coffee,-3.50\n'
+                 '2024-02-01,Coffee,-3.50\n'
+                 '2024-02-02,Rent,-900.00\n')
+    first = upload(client, headers, statement)
+    assert (first['imported'], first['duplicates'], first['duplicates_in_file']) == (3, 0, 1)
+
+    second = upload(client, headers, statement + '2024-02-03,Book,-20.00\n')
+    assert (second['imported'], second['duplicates'], second['duplicates_in_file']) == (1, 3, 1)
+    assert len(client.get('/api/transactions/', headers=headers).get_json()) == 4
+
+
+def test_income_and_expense_with_the_same_fields_are_distinct(client, user):
+    _, headers = user
+    upload(client, headers, 'date,description,amount,type\n2024-03-01,Transfer,50.00,expense\n')
+    result = upload(client, headers, 'date,description,amount,type\n2024-03-01,Transfer,50.00,income\n')
+    assert (result['imported'], result['duplicates']) == (1, 0)
+
+
+def test_dry_run_writes_nothing(client, user):
+    _, headers = user
+    result = upload(client, headers, 'date,description,amount\n2024-04-01,Tea,-2.00\n', dry_run='1')
+    assert result['imported'] == 1
+    assert client.get('/api/transactions/', headers=headers).get_json() == []
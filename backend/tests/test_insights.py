@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta
+import pytest
+from backend import insights
+
+pytestmark = pytest.mark.skipif(not insights.numpy_available(), reason='insights need numpy')
+
+
+def test_future_dated_expense_in_last_category(app, client, user, add_transaction):
+    user_id, headers = user
+    today = datetime.utcnow().date()
+    add_transaction(category='Food', amount='20.00', date=today)
+    add_transaction(category='Zoo', amount='5.00', date=today - timedelta(days=40))
+    add_transaction(category='Zoo', amount='999.00', date=today + timedelta(days=45))
+
+    response = client.get('/api/reports/insights', headers=headers)
+    assert response.status_code == 200
+    categories = {c['category']: c for c in response.get_json()['categories']}
+    assert categories['Food']['month_to_date'] == 20.0
+    assert categories['Zoo']['month_to_date'] == 0.0
+
+
+def test_future_expense_does_not_leak_into_next_category(app, user, add_transaction):
+    user_id, _ = user
+    today = datetime.utcnow().date()
+    add_transaction(category='Books', amount='50.00', date=today + timedelta(days=60))
+    add_transaction(category='Cafe', amount='3.00', date=today)
+
+    with app.app_context():
+        payload = insights.compute(user_id, today)
+    categories = {c['category']: c for c in payload['categories']}
+    assert 'Books' not in categories
+    assert categories['Cafe']['baseline'] == 0.0
+    assert payload['total']['month_to_date'] == 3.0
@@ -0,0 +1,35 @@
+import pytest
+from backend.query_plans import endpoint_queries, explain, check_query_plans
+
+
+# EXPLAIN QUERY PLAN of every statement in query_plans.endpoint_queries, on a
+# database built from the models: a full table scan fails the test.
+
+QUERIES = [
+    'auth.login', 'transactions.list', 'transactions.list_by_type', 'transactions.get', 'transactions.missing_timestamps',
+    'transactions.search',
+    'transactions.search_truncated',
+    'transactions.export', 'transactions.batch', 'transactions.summary', 'dashboard', 'reports.rollup_months',
+    'reports.edge_days', 'reports.timeseries_index', 'sync.transactions', 'sync.budgets', 'sync.tombstones',
+    'budgets.list', 'budgets.get', 'budgets.export', 'budgets.batch', 'budgets.progress',
+]
+
+
+def test_every_endpoint_query_is_checked(app):
+    with app.app_context():
+        assert set(endpoint_queries()) == set(QUERIES)
+
+
+@pytest.mark.parametrize('name', QUERIES)
+def test_query_uses_an_index(app, name):
+    with app.app_context():
+        plan, ok = check_query_plans()[name]
+    assert ok, f"{name} scans a table:\n" + '\n'.join(plan)
+
+
+def test_unindexed_query_is_reported(app):
+    from backend.models import Transaction
+
+    with app.app_context():
+        plan = explain(Transaction.query.filter(Transaction.description == 'x'))
+    assert any(line.startswith('SCAN') for line in plan)
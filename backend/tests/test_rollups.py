@@ -0,0 +1,41 @@
+import io
+from datetime import date
+from sqlalchemy import update
+from backend.database import db
+from backend.models import MonthlyRollup
+from backend import rollups
+
+
+def test_writes_keep_rollups_in_step(app, client, user, add_transaction):
+    user_id, headers = user
+    ids = [add_transaction(description=f'Shop {i}', amount=f'{i + 1}.25', date=date(2024, 1 + i % 3, 10))['id']
+           for i in range(6)]
+    add_transaction(type='income', category='Pay', amount='100.00', date=date(2024, 2, 1))
+
+    client.put(f'/api/transactions/{ids[0]}', json={'amount': '7.00', 'date': '2024-03-31', 'category': 'Fun'},
+               headers=headers)
+    client.delete(f'/api/transactions/{ids[1]}', headers=headers)
+    client.post('/api/transactions/batch', json={'operation': 'update', 'ids': ids[2:4], 'set': {'type': 'income'}},
+                headers=headers)
+    client.post('/api/transactions/batch', json={'operation': 'delete', 'filter': {'description': 'shop 5'}},
+                headers=headers)
+    csv = b'date,description,amount,type,category\n2024-01-05,Imported,12.00,expense,Food\n'
+    client.post('/api/transactions/import', data={'file': (io.BytesIO(csv), 'statement.csv')}, headers=headers)
+
+    with app.app_context():
+        assert rollups.verify(user_id) == []
+        assert rollups.totals_by_type(user_id) == {'expense': 700 + 525 + 1200, 'income': 10000 + 325 + 425}
+
+
+def test_verify_reports_drift_and_rebuild_repairs_it(app, user, add_transaction):
+    user_id, _ = user
+    add_transaction(amount='5.00', date=date(2024, 4, 1))
+    with app.app_context():
+        db.session.execute(update(MonthlyRollup).where(MonthlyRollup.user_id == user_id)
+                           .values(total_cents=MonthlyRollup.total_cents + 1))
+        db.session.commit()
+
+        drift = rollups.verify(user_id)
+        assert drift == [((user_id, 2024, 4, 'expense', 'Food'), (501, 1), (500, 1))]
+        rollups.rebuild(user_id)
+        assert rollups.verify(user_id) == []
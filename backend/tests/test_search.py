@@ -0,0 +1,55 @@
+from backend.app import create_app
+from backend import search
+
+
+def test_search_ranks_and_pages(client, user, add_transaction):
+    _, headers = user
+    add_transaction(description='Coffee beans', category='Food')
+    add_transaction(description='Café au lait', category='Coffee')
+    add_transaction(description='Rent', category='Housing')
+
+    body = client.get('/api/transactions/search', query_string={'q': 'cafe'}, headers=headers).get_json()
+    assert [t['description'] for t in body['transactions']] == ['Café au lait']
+
+    response = client.get('/api/transactions/search', query_string={'q': 'coffee', 'limit': 1}, headers=headers)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [t['description'] for t in body['transactions']] == ['Coffee beans'] # description matches rank first
+    assert body['next_cursor'] == '1'
+    assert body['truncated'] is False
+
+    body = client.get('/api/transactions/search', query_string={'q': 'coffee', 'cursor': '1'}, headers=headers).get_json()
+    assert [t['description'] for t in body['transactions']] == ['Café au lait']
+    assert body['next_cursor'] is None
+
+
+def test_search_reports_truncation(client, user, add_transaction, monkeypatch):
+    _, headers = user
+    for i in range(4):
+        add_transaction(description=f'Taxi {i}')
+    monkeypatch.setattr(search, 'RANK_WINDOW', 3)
+
+    body = client.get('/api/transactions/search', query_string={'q': 'taxi'}, headers=headers).get_json()
+    assert sorted(t['description'] for t in body['transactions']) == ['Taxi 1', 'Taxi 2', 'Taxi 3']
+    assert body['truncated'] is True
+
+    body = client.get('/api/transactions/search', query_string={'q': 'taxi 3'}, headers=headers).get_json()
+    assert body['truncated'] is False
+
+
+def test_search_rejects_bad_input(client, user):
+    _, headers = user
+    for params, message in [({'q': '  '}, "Invalid search: Search query must contain at least one word"),
+                            ({'q': 'x', 'cursor': '-1'}, "Invalid cursor"),
+                            ({'q': 'x', 'cursor': 'abc'}, "Invalid cursor")]:
+        response = client.get('/api/transactions/search', query_string=params, headers=headers)
+        assert response.status_code == 400
+        assert response.get_json() == {"message": message}
+
+
+def test_search_route_needs_a_supported_database(monkeypatch):
+    monkeypatch.setattr(search, 'SUPPORTED_DIALECTS', ('postgresql',))
+    app = create_app()
+    rules = {rule.rule for rule in app.url_map.iter_rules()}
+    assert '/api/transactions/search' not in rules
+    assert '/api/transactions/export' in rules
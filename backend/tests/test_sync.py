@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from backend.database import db
+from backend import sync
+
+
+def changes(client, headers, since=None):
+    response = client.get('/api/sync', query_string={'since': since} if since is not None else {}, headers=headers)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_deletes_reach_clients_as_tombstones(client, user, add_transaction):
+    _, headers = user
+    ids = [add_transaction(description='Coffee')['id'] for _ in range(4)]
+    token = changes(client, headers)['token']
+
+    client.put(f'/api/transactions/{ids[0]}', json={'amount': '9.00'}, headers=headers)
+    client.delete(f'/api/transactions/{ids[1]}', headers=headers)
+    client.post('/api/transactions/batch', json={'operation': 'delete', 'ids': ids[2:]}, headers=headers)
+
+    delta = changes(client, headers, token)
+    assert delta['full'] is False
+    assert [t['id'] for t in delta['transactions']] == [ids[0]]
+    assert delta['deleted'] == {'transactions': ids[1:], 'budgets': []}
+
+    assert changes(client, headers, delta['token'])['deleted'] == {'transactions': [], 'budgets': []}
+
+
+def test_pruned_tombstones_force_a_full_resync(app, client, user, add_transaction):
+    _, headers = user
+    ids = [add_transaction()['id'] for _ in range(2)]
+    before_delete = changes(client, headers)['token']
+    client.delete(f'/api/transactions/{ids[0]}', headers=headers)
+    after_delete = changes(client, headers)['token']
+
+    with app.app_context():
+        sync.prune(datetime.utcnow() + timedelta(seconds=5))
+        db.session.commit()
+
+    # The tombstone a client at `before_delete` needs is gone, so it gets everything
+    snapshot = changes(client, headers, before_delete)
+    assert snapshot['full'] is True
+    assert [t['id'] for t in snapshot['transactions']] == [ids[1]]
+    assert changes(client, headers, after_delete)['full'] is False
@@ -0,0 +1,50 @@
+from datetime import date
+from sqlalchemy import insert
+from backend import timeseries
+from backend.database import db
+from backend.models import Transaction
+
+
+def test_default_start_on_leap_day(client, user, add_transaction):
+    _, headers = user
+    add_transaction(type='income', amount='100.00', date=date(2023, 3, 1))
+    add_transaction(type='income', amount='7.00', date=date(2023, 2, 28))
+
+    response = client.get('/api/reports/timeseries', query_string={
+        'granularity': 'year', 'type': 'income', 'end': '2024-02-29'
+    }, headers=headers)
+    assert response.status_code == 200
+    points = response.get_json()['points']
+    assert points[0]['start'] == '2023-03-01'
+    assert sum(point['value'] for point in points) == 100.0
+
+
+def _insert_elsewhere(user_id, amount_cents):
+    """A write made by another worker: it reaches the database but not this process's caches."""
+    db.session.execute(insert(Transaction).values(
+        user_id=user_id, description='Other worker', amount_cents=amount_cents, type='income',
+        category='Salary', date=date(2024, 1, 2)
+    ))
+    db.session.commit()
+
+
+def test_index_is_rebuilt_after_ttl(app, user, add_transaction, monkeypatch):
+    user_id, _ = user
+    add_transaction(type='income', amount='10.00', date=date(2024, 1, 1))
+    with app.app_context():
+        assert timeseries.for_user(user_id).through(date(2024, 12, 31).toordinal()) == (1000, 0)
+        _insert_elsewhere(user_id, 500)
+        assert timeseries.for_user(user_id).through(date(2024, 12, 31).toordinal()) == (1000, 0)
+
+        monkeypatch.setattr(timeseries, 'INDEX_TTL', 0)
+        assert timeseries.for_user(user_id).through(date(2024, 12, 31).toordinal()) == (1500, 0)
+
+
+def test_index_follows_own_writes(app, user, add_transaction):
+    user_id, _ = user
+    add_transaction(type='expense', amount='4.00', date=date(2024, 5, 1))
+    with app.app_context():
+        assert timeseries.for_user(user_id).through(date(2024, 5, 1).toordinal()) == (0, 400)
+    add_transaction(type='expense', amount='6.00', date=date(2024, 4, 1))
+    with app.app_context():
+        assert timeseries.for_user(user_id).through(date(2024, 5, 1).toordinal()) == (0, 1000)
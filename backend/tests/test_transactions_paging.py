@@ -0,0 +1,58 @@
+import base64
+from datetime import date, datetime
+from sqlalchemy import update
+from backend.database import db
+from backend.models import Transaction
+
+
+def pages(client, headers, **params):
+    """Follows next_cursor from the first page to the last. Returns the pages' id lists."""
+    result, cursor = [], None
+    while True:
+        query = dict(params, **({'cursor': cursor} if cursor else {}))
+        response = client.get('/api/transactions/', query_string=query, headers=headers)
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        result.append([t['id'] for t in body['transactions']])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return result
+
+
+def test_pages_cover_the_listing_once(app, client, user, add_transaction):
+    user_id, headers = user
+    ids = [add_transaction(description=f'T{i}', date=date(2024, 1, 1 + i % 5))['id'] for i in range(23)]
+    with app.app_context():
+        # Shared timestamps exercise the id tie-break
+        db.session.execute(update(Transaction).where(Transaction.id.in_(ids[:10]))
+                           .values(timestamp=datetime(2024, 6, 1, 12, 0)))
+        db.session.commit()
+
+    listing = [t['id'] for t in client.get('/api/transactions/', headers=headers).get_json()]
+    paged = pages(client, headers, limit=5)
+    assert [len(page) for page in paged] == [5, 5, 5, 5, 3]
+    assert sum(paged, []) == listing
+    assert sorted(listing) == sorted(ids)
+
+
+def test_pages_respect_filters(client, user, add_transaction):
+    _, headers = user
+    for i in range(7):
+        add_transaction(type='income' if i % 2 else 'expense', category='Pay' if i % 2 else 'Food')
+    paged = pages(client, headers, limit=2, type='expense')
+    assert [len(page) for page in paged] == [2, 2]
+
+
+def test_malformed_cursor_and_limit(client, user):
+    _, headers = user
+    bad_cursors = ['not base64!', base64.urlsafe_b64encode(b'no-separator').decode(),
+                   base64.urlsafe_b64encode(b'2024-01-01T00:00:00|x').decode(),
+                   base64.urlsafe_b64encode(b'|5').decode()]
+    for cursor in bad_cursors:
+        response = client.get('/api/transactions/', query_string={'cursor': cursor}, headers=headers)
+        assert response.status_code == 400
+        assert response.get_json() == {"message": "Invalid cursor"}
+
+    response = client.get('/api/transactions/', query_string={'limit': 'ten'}, headers=headers)
+    assert response.status_code == 400
+    assert response.get_json() == {"message": "Invalid limit: must be an integer"}
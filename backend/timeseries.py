@@ -0,0 +1,221 @@
+import copy
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import timedelta
+from sqlalchemy import event, func, select
+from backend.database import db, RoutingSession
+from backend.models import Transaction
+from backend.cache import response_cache
+
+# Balance-over-time series from a per-user prefix-sum index of daily net flow.
+#
+# A user's index holds, for each day they have transactions on, the cumulative
+# income and expense in cents up to and including that day. The total of any
+# date range is then the difference of two cumulative values (two binary
+# searches), and the running balance at any date is a single lookup, so a series
+# of N buckets costs O(N log D) for D active days whatever the size of the
+# history, with no scan of transactions after the index is built.
+#
+# Indexes are built lazily from one grouped query and kept in a per-process LRU.
+# Mutations call `record` next to `rollups.record`; the deltas are held on the
+# session and folded into the cached index only after the commit succeeds
+# (dropped on rollback). Writes made by other workers never reach this process's
+# index, so an index is rebuilt after INDEX_TTL seconds, and sooner when the
+# user's response-cache version moves on from the one it was built at. That
+# version is only shared between workers with the Redis backend; with the
+# in-process one (or none) a write on another worker shows up here within
+# INDEX_TTL.
+
+GRANULARITIES = ('day', 'week', 'month', 'year')
+TYPES = ('net', 'income', 'expense')
+MAX_POINTS = 3700 # about ten years of daily buckets
+CACHE_SIZE = 1000 # users whose indexes are kept in memory
+INDEX_TTL = 300 # seconds an index is reused before it is rebuilt
+
+_PENDING = 'timeseries_deltas' # session.info key: {user_id: {day_ordinal: [income, expense]}}
+
+
+class FlowIndex:
+
+    def __init__(self, rows=(), version=None):
+        """`rows` is [(day_ordinal, income_cents, expense_cents)] sorted by day."""
+        days, incomes, expenses = [], [], []
+        income = expense = 0
+        for day, day_income, day_expense in rows:
+            income += day_income
+            expense += day_expense
+            days.append(day)
+            incomes.append(income)
+            expenses.append(expense)
+        # Replaced as a whole by `add`, so readers never see a half-updated index
+        self.state = (days, incomes, expenses)
+        self.version = version
+        self.built_at = time.monotonic()
+
+    def add(self, day, income, expense):
+        """Adds to one day's flow, shifting every later cumulative value. O(D)."""
+        days, incomes, expenses = self.state
+        i = bisect_left(days, day)
+        if i == len(days) or days[i] != day:
+            days = days[:i] + [day] + days[i:]
+            incomes = incomes[:i] + [incomes[i - 1] if i else 0] + incomes[i:]
+            expenses = expenses[:i] + [expenses[i - 1] if i else 0] + expenses[i:]
+        self.state = (days, incomes[:i] + [value + income for value in incomes[i:]],
+                      expenses[:i] + [value + expense for value in expenses[i:]])
+
+    def through(self, day):
+        """(income, expense) cumulated over every day up to and including `day`."""
+        days, incomes, expenses = self.state
+        i = bisect_right(days, day) - 1
+        return (incomes[i], expenses[i]) if i >= 0 else (0, 0)
+
+
+def flow_statement(user_id):
+    """(date, type, total_cents) rows of a user's daily income and expense."""
+    return select(Transaction.date, Transaction.type, func.sum(Transaction.amount_cents)).where(
+        Transaction.user_id == user_id, Transaction.type.in_(('income', 'expense'))
+    ).group_by(Transaction.date, Transaction.type)
+
+
+def build(user_id, version=None):
+    """A user's index from their transactions. Needs an app context."""
+    rows = db.session.execute(flow_statement(user_id)).all()
+    flows = {}
+    for day, type_, total in rows:
+        flow = flows.setdefault(day.toordinal(), [0, 0])
+        flow[0 if type_ == 'income' else 1] += total
+    return FlowIndex(((day, *flows[day]) for day in sorted(flows)), version)
+
+
+# --- Per-user indexes ---
+
+_cache = OrderedDict() # user_id -> FlowIndex
+_lock = threading.Lock()
+
+
+def for_user(user_id):
+    """The user's cached index, rebuilt when it is missing, older than INDEX_TTL or behind their data version."""
+    version = response_cache.get_version(user_id)
+    with _lock:
+        index = _cache.get(user_id)
+        if index is not None and index.version == version and time.monotonic() - index.built_at < INDEX_TTL:
+            _cache.move_to_end(user_id)
+            return index
+    index = build(user_id, version)
+    if user_id in db.session.info.get(_PENDING, ()):
+        return index # built from uncommitted rows that _apply_pending would count again
+    with _lock:
+        _cache[user_id] = index
+        _cache.move_to_end(user_id)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return index
+
+
+def invalidate(user_id):
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+def record_delta(user_id, txn_date, type_, amount_cents):
+    """Queues a change of a day's flow on the current session; applied after it commits."""
+    if type_ not in ('income', 'expense'):
+        return
+    days = db.session.info.setdefault(_PENDING, {}).setdefault(user_id, {})
+    flow = days.setdefault(txn_date.toordinal(), [0, 0])
+    flow[0 if type_ == 'income' else 1] += amount_cents
+
+
+def record(transaction, sign):
+    """Adds (sign=+1) or removes (sign=-1) a Transaction's contribution to its day."""
+    record_delta(transaction.user_id, transaction.date, transaction.type, sign * transaction.amount_cents)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _apply_pending(session):
+    pending = session.info.pop(_PENDING, None)
+    if not pending:
+        return
+    with _lock:
+        for user_id, days in pending.items():
+            index = _cache.get(user_id)
+            if index is None:
+                continue
+            for day, (income, expense) in days.items():
+                index.add(day, income, expense)
+            if index.version is not None:
+                # The mutation bumps the user's version once it has committed
+                index.version += 1
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def _discard_pending(session, previous_transaction):
+    session.info.pop(_PENDING, None)
+
+
+# --- Series ---
+
+def bucket_start(d, granularity):
+    if granularity == 'week':
+        return d - timedelta(days=d.weekday()) # ISO weeks start on Monday
+    if granularity == 'month':
+        return d.replace(day=1)
+    if granularity == 'year':
+        return d.replace(month=1, day=1)
+    return d
+
+
+def next_bucket(start, granularity):
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    if granularity == 'month':
+        return (start + timedelta(days=32)).replace(day=1)
+    if granularity == 'year':
+        return start.replace(year=start.year + 1)
+    return start + timedelta(days=1)
+
+
+def bucket_label(start, granularity):
+    if granularity == 'week':
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02d}"
+    if granularity == 'month':
+        return start.strftime('%Y-%m')
+    if granularity == 'year':
+        return str(start.year)
+    return start.isoformat()
+
+
+def buckets(start_date, end_date, granularity):
+    """[(label, first_day, last_day)] covering [start_date, end_date], the ends clipped to it."""
+    result = []
+    lo = bucket_start(start_date, granularity)
+    while lo <= end_date:
+        hi = next_bucket(lo, granularity)
+        if len(result) == MAX_POINTS:
+            raise ValueError(f"Range has more than {MAX_POINTS} {granularity} buckets; use a coarser granularity")
+        result.append((bucket_label(lo, granularity), max(lo, start_date), min(hi - timedelta(days=1), end_date)))
+        lo = hi
+    return result
+
+
+def series(index, start_date, end_date, granularity='month', type_='net'):
+    """
+    Per-bucket totals of `type_` over [start_date, end_date] plus its running total
+    at the end of each bucket (for 'net', the balance). Amounts are in cents.
+    """
+    def value(cumulative):
+        income, expense = cumulative
+        return income if type_ == 'income' else expense if type_ == 'expense' else income - expense
+
+    index = copy.copy(index) # a snapshot: concurrent `add`s replace the original's state
+    opening = value(index.through(start_date.toordinal() - 1))
+    previous = opening
+    points = []
+    for label, first, last in buckets(start_date, end_date, granularity):
+        cumulative = value(index.through(last.toordinal()))
+        points.append((label, first, last, cumulative - previous, cumulative))
+        previous = cumulative
+    return opening, points
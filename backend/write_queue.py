@@ -0,0 +1,205 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from backend.database import db
+from backend.cache import response_cache
+from backend.sharding import shard_router
+from backend.instrumentation import instrumentation, Counters, Histogram, Gauge
+
+# Group commit for transaction writes.
+#
+# Every write normally commits on its own, and on SQLite each commit takes the
+# database's single writer lock and syncs the journal, which caps throughput at a
+# few hundred writes per second however many workers there are. With
+# WRITE_QUEUE_ENABLED, routes hand their write to `run`, which queues it for one
+# writer thread per process. The writer takes whatever is queued (up to
+# WRITE_QUEUE_MAX_BATCH, waiting at most WRITE_QUEUE_MAX_DELAY_MS for more after
+# the first), applies the writes of each shard in one session and commits them
+# together. Each request blocks until its batch has committed and then gets its
+# own result or exception. If a batch fails, its writes are retried one commit each,
+# so one bad write fails alone.
+#
+# At most WRITE_QUEUE_MAX_PENDING writes wait in the queue. When the writer falls
+# behind, requests wait up to WRITE_QUEUE_ENQUEUE_TIMEOUT for room and then get
+# WriteQueueFullError (a 503 with Retry-After). Depth, batch sizes, latency and
+# outcomes are published on /metrics.
+#
+# A write is a function applied to db.session that must not commit. It runs on
+# the writer thread, so it gets its arguments already parsed and validated, and
+# returns plain data (e.g. `to_dict()` after a flush) rather than ORM objects.
+# Without the queue, `run` applies and commits the write inline.
+
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+_STOP = object()
+
+
+class WriteQueueFullError(Exception):
+    """Raised when the write queue stays full for longer than WRITE_QUEUE_ENQUEUE_TIMEOUT."""
+
+
+class WriteTimeoutError(Exception):
+    """Raised when a queued write is not durable after WRITE_QUEUE_RESULT_TIMEOUT; it may still commit."""
+
+
+class WriteQueue:
+
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.max_batch = 256
+        self.max_delay = 0.002
+        self.enqueue_timeout = 1.0
+        self.result_timeout = 30.0
+        self.queue = None
+        self.thread = None
+        self.pid = None
+        self.lock = threading.Lock()
+        self.batches = Histogram('pfm_write_queue_batch_size', 'Writes committed together per group commit.',
+                                 ('outcome',), BATCH_SIZE_BUCKETS)
+        self.latency = Histogram('pfm_write_queue_latency_seconds', 'Time from queueing a write until it is durable.',
+                                 (), LATENCY_BUCKETS)
+        self.writes = Counters('pfm_write_queue_writes_total', 'Queued writes by outcome.', ('outcome',))
+        self.depth = Gauge('pfm_write_queue_depth', 'Writes waiting for the writer thread.',
+                           lambda: self.queue.qsize() if self.queue is not None else 0)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Reads the WRITE_QUEUE_* settings. The writer thread starts with the first queued write."""
+        self.stop() # a writer serving a previous app would never see the new queue
+        self.app = app
+        self.enabled = app.config.get('WRITE_QUEUE_ENABLED', False)
+        if not self.enabled:
+            return
+        self.max_batch = app.config.get('WRITE_QUEUE_MAX_BATCH', self.max_batch)
+        self.max_delay = app.config.get('WRITE_QUEUE_MAX_DELAY_MS', 2) / 1000
+        self.enqueue_timeout = app.config.get('WRITE_QUEUE_ENQUEUE_TIMEOUT', self.enqueue_timeout)
+        self.result_timeout = app.config.get('WRITE_QUEUE_RESULT_TIMEOUT', self.result_timeout)
+        self.queue = queue.Queue(maxsize=app.config.get('WRITE_QUEUE_MAX_PENDING', 5000))
+        instrumentation.register(self.depth, self.batches, self.latency, self.writes)
+
+    def run(self, user_id, write, *args):
+        """
+        Applies write(*args) to db.session for `user_id` and returns its result once
+        committed. Exceptions raised by the write (or the commit) propagate. Queued
+        writes may also raise WriteQueueFullError or WriteTimeoutError.
+        """
+        if not self.enabled:
+            try:
+                result = write(*args)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            response_cache.bump_version(user_id)
+            return result
+
+        # End this request's own transaction first: a read lock held while waiting
+        # could keep the writer from committing
+        db.session.rollback()
+        self._ensure_writer()
+        future = Future()
+        try:
+            self.queue.put((user_id, shard_router.current(), write, args, future, time.perf_counter()),
+                           timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._count('rejected')
+            raise WriteQueueFullError("Too many writes in progress, please retry shortly")
+        try:
+            return future.result(timeout=self.result_timeout)
+        except FutureTimeoutError:
+            raise WriteTimeoutError("The write is still queued; check whether it was saved before retrying")
+
+    # --- Writer thread ---
+
+    def _ensure_writer(self):
+        # Threads do not survive a fork, so a pre-forked worker starts its own
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive() or self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.thread = threading.Thread(target=self._writer, name='write-queue', daemon=True)
+                self.thread.start()
+
+    def stop(self, timeout=None):
+        """Commits everything already queued, then stops the writer thread."""
+        with self.lock:
+            thread = self.thread
+            self.thread = None
+        if thread is not None and thread.is_alive():
+            self.queue.put(_STOP)
+            thread.join(timeout)
+
+    def _next_batch(self):
+        """Blocks for one write, then gathers more until the batch is full or max_delay has passed."""
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch and batch[-1] is not _STOP:
+            try:
+                remaining = deadline - time.perf_counter()
+                batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _writer(self):
+        while True:
+            batch = self._next_batch()
+            stop = batch[-1] is _STOP
+            if stop:
+                batch.pop()
+            by_shard = {}
+            for item in batch:
+                by_shard.setdefault(item[1], []).append(item)
+            with self.app.app_context():
+                for shard, items in by_shard.items():
+                    try:
+                        with shard_router.use(shard):
+                            self._commit_group(items)
+                    except Exception as e: # keep the writer alive; nobody may be left waiting
+                        self.app.logger.exception("Write queue failed a batch")
+                        self._finish([item for item in items if not item[4].done()], error=e)
+            if stop:
+                return
+
+    def _commit_group(self, items):
+        """Applies and commits `items` together; on failure, each one again on its own."""
+        try:
+            results = [write(*args) for _, _, write, args, _, _ in items]
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            if len(items) == 1:
+                self._finish(items, error=e)
+            else:
+                for item in items:
+                    self._commit_group([item])
+            return
+        self._finish(items, results)
+
+    def _finish(self, items, results=None, error=None):
+        if error is None:
+            for user_id in {item[0] for item in items}:
+                response_cache.bump_version(user_id)
+        now = time.perf_counter()
+        outcome = 'committed' if error is None else 'failed'
+        with instrumentation.lock:
+            self.batches.observe((outcome,), len(items))
+            self.writes.inc((outcome,), len(items))
+            for item in items:
+                self.latency.observe((), now - item[5])
+        for i, (_, _, _, _, future, _) in enumerate(items):
+            if error is None:
+                future.set_result(results[i])
+            else:
+                future.set_exception(error)
+
+    def _count(self, outcome):
+        with instrumentation.lock:
+            self.writes.inc((outcome,))
+
+
+write_queue = WriteQueue()
@@ -14,6 +14,7 @@ async function callApi(endpoint, method = 'GET', data = null, token = null) {
         'Content-Type': 'application/json',
     };
 
+    token = token || localStorage.getItem('token');
     if (token) {
         headers['Authorization'] = `Bearer ${token}`;
     }